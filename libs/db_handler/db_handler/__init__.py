@@ -1,5 +1,42 @@
+from ._cache import *
+from ._changes import *
+from ._coalescing import *
 from ._connection import *
+from ._counting import *
+from ._indexes import *
+from ._memory import *
+from ._monitoring import *
+from ._profiling import *
+from ._resilience import *
+from ._rollups import *
 from ._utils import *
 
 
-__all__ = ["DocumentNotFound", "MongoConnection", "ModelMetaclass", "SchemaMetaclass", "PyObjectId"]
+__all__ = [
+    "advise_indexes",
+    "encode_json",
+    "query_combinations",
+    "ApproximateCount",
+    "BreakerState",
+    "BulkStatus",
+    "ChangeNotifier",
+    "CircuitBreaker",
+    "CircuitOpen",
+    "DailyCount",
+    "DocumentNotFound",
+    "ExactCount",
+    "GroupSummary",
+    "IndexAdvice",
+    "InMemoryConnection",
+    "InvalidCursor",
+    "MongoConnection",
+    "OperationMonitor",
+    "ModelMetaclass",
+    "PoolMonitor",
+    "SchemaMetaclass",
+    "PyObjectId",
+    "QueryProfiler",
+    "QueryCache",
+    "ReadCoalescer",
+    "RetryPolicy",
+]
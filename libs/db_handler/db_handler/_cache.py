@@ -0,0 +1,62 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+from bson import json_util
+from pymongo.read_preferences import _ServerMode
+
+
+class QueryCache:
+    """Cache for the results of read queries, bounded both in size and time.
+
+    Entries are identified by the collection and a canonical hash of the aggregation pipeline (and the
+    read preference, since secondaries can give results older than the primary).
+    At most `maxsize` entries are kept, discarding the least recently used first, and entries are
+    discarded `ttl` seconds after being stored.
+
+    Writes must invalidate all the entries for their collection. To prevent a query started before
+    a write from storing outdated results after the invalidation, each collection has a generation
+    that must be captured before running the query and given when storing its results.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 10):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+
+    @staticmethod
+    def key(collection: str, pipeline: list[dict], raw: bool = False, read_preference: _ServerMode = None) -> tuple[str, str]:
+        """Generates key for the results of a pipeline over a collection (as `RawBSONDocument` if `raw`), read
+        with the given preference (the default of the client if not given)"""
+        mode = read_preference.document if read_preference is not None else None
+        canonical = json_util.dumps([pipeline, raw, mode], json_options=json_util.CANONICAL_JSON_OPTIONS)
+        return collection, hashlib.sha256(canonical.encode()).hexdigest()
+
+    def generation(self, collection: str) -> int:
+        """Current generation of the collection, which changes with every invalidation"""
+        return self._generations.get(collection, 0)
+
+    def get(self, key: tuple[str, str]) -> list | None:
+        """Stored results for the key (`None` if missing or expired)"""
+        expires, value = self._entries.get(key, (0, None))
+        if expires <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: tuple[str, str], value: list, generation: int):
+        """Stores results for the key, unless the collection was invalidated after `generation`"""
+        if generation != self.generation(key[0]):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, collection: str):
+        """Discards all entries for the collection"""
+        self._generations[collection] = self.generation(collection) + 1
+        for key in [key for key in self._entries if key[0] == collection]:
+            del self._entries[key]
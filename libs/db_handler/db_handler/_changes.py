@@ -0,0 +1,20 @@
+from typing import Callable
+
+
+class ChangeNotifier:
+    """Dispatches notifications of changes in collections to registered listeners.
+
+    Listeners are callables that receive the name of the modified collection, e.g., the `invalidate`
+    method of `QueryCache`. Notifications can come from writes done through the local connection
+    or from a change stream over the database, which includes writes done by other processes.
+    """
+
+    def __init__(self):
+        self._listeners = []
+
+    def add_listener(self, listener: Callable[[str], None]):
+        self._listeners.append(listener)
+
+    def notify(self, collection: str):
+        for listener in self._listeners:
+            listener(collection)
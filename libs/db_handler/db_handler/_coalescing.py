@@ -0,0 +1,52 @@
+import asyncio
+import functools
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class ReadCoalescer:
+    """Coalesces identical reads running at the same time, so that only one of them reaches the database.
+
+    Reads are identified by keys starting with the collection name (e.g., as generated by `QueryCache.key`).
+    A read with the same key as one still running awaits the result of the latter, which is shared by
+    all of them and must not be modified.
+
+    Writes must invalidate the reads running for their collection, so that reads arriving after the write
+    do not get results from before it (reads already waiting still get those results).
+
+    Attributes:
+        reads (int): Total number of reads
+        coalesced (int): Number of reads that awaited another one instead of reaching the database
+    """
+
+    def __init__(self):
+        self.reads = 0
+        self.coalesced = 0
+        self._running = {}
+
+    @property
+    def ratio(self) -> float:
+        """Fraction of the reads that were coalesced"""
+        return self.coalesced / self.reads if self.reads else 0
+
+    async def run(self, key: tuple[Hashable, ...], read: Callable[[], Awaitable[T]]) -> T:
+        self.reads += 1
+        task = self._running.get(key)
+        if task is None:
+            task = asyncio.ensure_future(read())
+            self._running[key] = task
+            task.add_done_callback(functools.partial(self._finished, key))
+        else:
+            self.coalesced += 1
+        # Cancelling one of the reads must not cancel the rest
+        return await asyncio.shield(task)
+
+    def _finished(self, key: tuple[Hashable, ...], task: asyncio.Future):
+        if self._running.get(key) is task:  # Might have been invalidated and replaced by a later read
+            del self._running[key]
+
+    def invalidate(self, collection: str):
+        """Stops sharing the reads running for the collection with later reads"""
+        for key in [key for key in self._running if key[0] == collection]:
+            del self._running[key]
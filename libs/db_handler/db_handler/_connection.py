@@ -1,11 +1,32 @@
+import asyncio
+import functools
+import logging
+import time
 from collections import UserDict
-from typing import Any
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable
 
+from bson import ObjectId
+from bson.codec_options import CodecOptions
 from bson.errors import InvalidId
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from bson.raw_bson import RawBSONDocument
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pydantic import ValidationError
+from pymongo import DeleteOne, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+from pymongo.read_preferences import _ServerMode
 from query import BaseQuery, BasePaginatedQuery
 
-from ._utils import DocumentNotFound, ModelMetaclass, PyObjectId
+from ._cache import QueryCache
+from ._changes import ChangeNotifier
+from ._coalescing import ReadCoalescer
+from ._counting import ExactCount
+from ._monitoring import OperationMonitor, PoolMonitor
+from ._profiling import QueryProfiler
+from ._resilience import CircuitBreaker, RetryPolicy
+from ._rollups import Rollup
+from ._utils import BulkStatus, CircuitOpen, DocumentNotFound, ModelMetaclass, PyObjectId, decode_cursor, encode_cursor
 
 
 class _MongoConfig(UserDict):
@@ -40,17 +61,225 @@ class _MongoConfig(UserDict):
         super().__setitem__("".join(klist), value)
 
 
+_RAW_CODEC = CodecOptions(document_class=RawBSONDocument)
+
+
+def _cast_id(oid: str) -> PyObjectId | str:
+    """Cast input to BSON ObjectId if possible"""
+    try:
+        return PyObjectId(oid)
+    except InvalidId:
+        return oid
+
+
 class MongoConnection:
-    def __init__(self, config: dict):
+    def __init__(
+        self,
+        config: dict,
+        counter: ExactCount = None,
+        cache: QueryCache = None,
+        profiler: QueryProfiler = None,
+        retry: RetryPolicy = None,
+        breaker: CircuitBreaker = None,
+        coalescer: ReadCoalescer = None,
+        disabled_rollups: Iterable[Rollup] = (),
+    ):
         self._config = _MongoConfig(config)
         self._client = None
+        self._counter = counter or ExactCount()
+        self._cache = cache
+        self._profiler = profiler
+        self._retry = retry
+        self.breaker = breaker
+        self.coalescer = coalescer
+        self.pool_monitor = PoolMonitor()
+        self.operation_monitor = OperationMonitor()
+        self.notifier = ChangeNotifier()
+        self._rebuilding = {}  # Rollups not built yet, and whether documents were written since marking them
+        self._disabled = {rollup.__tablename__ for rollup in disabled_rollups}  # Neither built nor updated
+        if cache is not None:
+            self.notifier.add_listener(cache.invalidate)
+        if coalescer is not None:
+            self.notifier.add_listener(coalescer.invalidate)
 
     @property
     def db(self) -> AsyncIOMotorDatabase:
         return self._client[self._config.db]
 
+    def _collection(
+        self, model: ModelMetaclass, read_preference: _ServerMode = None, raw: bool = False
+    ) -> AsyncIOMotorCollection:
+        """Collection for the model. Uses the default read preference of the client if not given.
+        With `raw`, documents are returned as `RawBSONDocument`, decoded only when accessed"""
+        collection = self.db[model.__tablename__]
+        options = {"read_preference": read_preference, "codec_options": _RAW_CODEC if raw else None}
+        options = {k: v for k, v in options.items() if v is not None}
+        return collection.with_options(**options) if options else collection
+
     async def connect(self):
-        self._client = AsyncIOMotorClient(connect=True, **self._config)
+        self._client = AsyncIOMotorClient(connect=True, event_listeners=[self.pool_monitor], **self._config)
+
+    @asynccontextmanager
+    async def _track(self, operation: str, model: ModelMetaclass, q: BaseQuery = None, command: dict = None):
+        """Times the database operation inside the context and reports it to the operation monitor, even
+        if it fails. The number of documents returned must be set in the `documents` attribute of the
+        yielded object, and time spent inside the context without waiting for the database (e.g., by the
+        consumer of a stream) can be excluded by adding it to its `idle` attribute.
+
+        Successful operations are also reported to the profiler (if any) when described as a database
+        command, so that they can be explained (in the background).
+        """
+        stats, start = SimpleNamespace(documents=0, idle=0.0), time.perf_counter()
+        try:
+            yield stats
+        finally:
+            elapsed = time.perf_counter() - start - stats.idle
+            query = type(q).__name__ if q is not None else ""
+            self.operation_monitor.record(operation, model.__tablename__, query, elapsed, stats.documents)
+        if self._profiler is not None and command is not None:
+            self._profiler.record(self.db, command, elapsed, q)
+
+    async def _resilient(self, operation: Callable[[], Awaitable], idempotent: bool = False):
+        """Runs the database operation through the circuit breaker (if any). Idempotent operations are
+        also retried following the retry policy (if any), going through the breaker on every attempt
+        (which counts attempts running out of time as failures)"""
+        guard = self.breaker.call if self.breaker is not None else None
+        if idempotent and self._retry is not None:
+            return await self._retry.call(operation, guard)
+        return await (operation() if guard is None else guard(operation))
+
+    async def _aggregate(
+        self,
+        model: ModelMetaclass,
+        pipeline: list[dict],
+        length: int = None,
+        read_preference: _ServerMode = None,
+        q: BaseQuery = None,
+        operation: str = "aggregate",
+        raw: bool = False,
+    ) -> list[dict]:
+        """Results of the pipeline (at most `length` if given), from the query cache when possible.
+        With `raw`, results are given as `RawBSONDocument`. Identical aggregations running at the same
+        time are coalesced (if the connection has a coalescer).
+
+        Cached or coalesced results are shared among callers and must not be modified.
+        """
+        key = QueryCache.key(model.__tablename__, pipeline, raw, read_preference)
+        run = functools.partial(self._run_aggregate, model, pipeline, length, read_preference, q, operation, raw)
+        if self.coalescer is not None:
+            run = functools.partial(self.coalescer.run, key + (length,), run)
+        if self._cache is None:
+            return await run()
+        results = self._cache.get(key)
+        if results is None:
+            generation = self._cache.generation(model.__tablename__)
+            results = await run()
+            self._cache.set(key, results, generation)
+        return results
+
+    async def _run_aggregate(
+        self,
+        model: ModelMetaclass,
+        pipeline: list[dict],
+        length: int | None,
+        read_preference: _ServerMode | None,
+        q: BaseQuery | None,
+        operation: str,
+        raw: bool = False,
+    ) -> list[dict]:
+        async def aggregate():
+            cursor = self._collection(model, read_preference, raw).aggregate(pipeline)
+            return [_ async for _ in cursor] if length is None else await cursor.to_list(length)
+
+        command = {"aggregate": model.__tablename__, "pipeline": pipeline, "cursor": {}}
+        async with self._track(operation, model, q, command) as stats:
+            results = await self._resilient(aggregate, idempotent=True)
+            stats.documents = len(results)
+        return results
+
+    async def _find_one(self, model: ModelMetaclass, match: dict, read_preference: _ServerMode = None) -> dict | None:
+        command = {"find": model.__tablename__, "filter": match, "limit": 1}
+        async with self._track("read", model, command=command) as stats:
+            collection = self._collection(model, read_preference)
+            document = await self._resilient(lambda: collection.find_one(match), idempotent=True)
+            stats.documents = int(document is not None)
+        return document
+
+    def _rollups(self, model: ModelMetaclass) -> list[Rollup]:
+        """Rollups of the model kept by the connection (i.e., not disabled)"""
+        return [rollup for rollup in getattr(model, "__rollups__", []) if rollup.__tablename__ not in self._disabled]
+
+    def _invalidate(self, model: ModelMetaclass):
+        """Notifies listeners of changes in the collection of the model, must be called after every write"""
+        self.notifier.notify(model.__tablename__)
+
+    async def _refresh(self, model: ModelMetaclass, pipeline: list[dict]) -> list[dict]:
+        """Results of the pipeline straight from the database (i.e., neither cached nor coalesced with
+        aggregations started before a write)"""
+        async with self._track("refresh", model) as stats:
+            cursor = self.db[model.__tablename__].aggregate(pipeline)
+            results = await self._resilient(lambda: cursor.to_list(None))
+            stats.documents = len(results)
+        return results
+
+    async def _update_rollups(self, model: ModelMetaclass, before: Iterable[dict], after: Iterable[dict]):
+        """Updates the rollups of the model after replacing documents `before` with `after`.
+
+        The write of the documents already succeeded, so failures are logged instead of raised. The rollups
+        are then out of date until they are rebuilt. Rollups being rebuilt are not updated, but rebuilt again
+        once the running rebuild finishes, since it might have missed the documents.
+        """
+        before, after = list(before), list(after)
+        for rollup in self._rollups(model):
+            if rollup.__tablename__ in self._rebuilding:
+                self._rebuilding[rollup.__tablename__] = True
+                continue
+            try:
+                collection = self.db[rollup.__tablename__]
+                version = ObjectId()  # Only the last write claiming a part of the rollup replaces it
+                claims = rollup.claims(before, after, version)
+                if claims:
+                    async with self._track("update", rollup):
+                        await self._resilient(lambda: collection.bulk_write(claims, ordered=False))
+                pipeline = rollup.refresh_pipeline(before, after)
+                refreshed = await self._refresh(model, pipeline) if pipeline is not None else None
+                requests = rollup.updates(before, after, refreshed, version)
+                if not requests:
+                    continue
+                async with self._track("update", rollup):
+                    await self._resilient(lambda: collection.bulk_write(requests, ordered=False))
+            except (PyMongoError, CircuitOpen) as err:
+                logging.getLogger("db_handler").warning("Rollup %s is out of date: %s", rollup.__tablename__, err)
+            finally:
+                self.notifier.notify(rollup.__tablename__)
+
+    async def watch_changes(self, model: ModelMetaclass, retry_after: float = 5):
+        """Notifies listeners of every change in the collection of the model, including those made by
+        other processes. Runs until cancelled, so it is meant to be used as a background task.
+
+        Requires a replica set (or sharded cluster), otherwise returns immediately. If the change
+        stream is interrupted, listeners are notified (as changes might have been missed) and the
+        stream is reopened after `retry_after` seconds. The rollups of the model are notified as well,
+        since other processes update them along with the documents.
+        """
+
+        def invalidate():
+            self._invalidate(model)
+            for rollup in self._rollups(model):
+                self.notifier.notify(rollup.__tablename__)
+
+        while True:
+            try:
+                async with self.db[model.__tablename__].watch() as stream:
+                    async for _ in stream:
+                        invalidate()
+            except OperationFailure as err:
+                if err.code == 40573:  # Change streams are not supported by standalone servers
+                    return
+                invalidate()
+            except PyMongoError:
+                invalidate()
+            await asyncio.sleep(retry_after)
 
     async def close(self):
         self._client.close()
@@ -63,10 +292,76 @@ class MongoConnection:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.close()
 
+    async def ping(self, timeout: float = 1) -> bool:
+        """Whether the database answers within `timeout` seconds"""
+        if self._client is None:
+            return False
+        try:
+            await asyncio.wait_for(self._client.admin.command("ping"), timeout)
+        except (asyncio.TimeoutError, PyMongoError):
+            return False
+        return True
+
+    async def _missing_indexes(self, model: ModelMetaclass) -> list[IndexModel]:
+        """Indexes of the model not in the database yet (compared by name)"""
+        existing = {index["name"] async for index in self.db[model.__tablename__].list_indexes()}
+        return [index for index in model.__indexes__ if index.document["name"] not in existing]
+
+    async def _create_indexes(self, model: ModelMetaclass):
+        missing = await self._missing_indexes(model)
+        if missing:
+            await self.db[model.__tablename__].create_indexes(missing)
+
+    def rollup_ready(self, rollup: Rollup) -> bool:
+        """Whether the rollup can be read, i.e., it is neither disabled, being rebuilt nor waiting to be checked by
+        `create_db`"""
+        return rollup.__tablename__ not in self._rebuilding and rollup.__tablename__ not in self._disabled
+
+    async def _finish_rebuild(self, model: ModelMetaclass, rollup: Rollup):
+        """Rebuilds the rollup as long as documents were written since the previous rebuild started (or since
+        it was marked as not built, if this is the first)"""
+        try:
+            while self._rebuilding[rollup.__tablename__]:
+                self._rebuilding[rollup.__tablename__] = False
+                async with self._track("rollup", model):
+                    cursor = self.db[model.__tablename__].aggregate(rollup.rebuild_pipeline())
+                    await self._resilient(lambda: cursor.to_list(None))
+        finally:
+            del self._rebuilding[rollup.__tablename__]
+            self.notifier.notify(rollup.__tablename__)
+
+    async def rebuild_rollups(self, model: ModelMetaclass):
+        """Replaces the contents of the rollups of the model with those of the documents in the database.
+        The rollups are not ready (see `rollup_ready`) until then"""
+        for rollup in self._rollups(model):
+            if rollup.__tablename__ in self._rebuilding:  # Already running, so it is repeated after it finishes
+                self._rebuilding[rollup.__tablename__] = True
+                continue
+            self._rebuilding[rollup.__tablename__] = True
+            await self._finish_rebuild(model, rollup)
+
+    async def _create_rollups(self, model: ModelMetaclass):
+        # Rollups are neither read nor updated until they are known to be built (e.g., while `create_db` runs
+        # in the background), and writes meanwhile have them rebuilt
+        rollups = [rollup for rollup in self._rollups(model) if rollup.__tablename__ not in self._rebuilding]
+        self._rebuilding.update({rollup.__tablename__: False for rollup in rollups})
+        try:
+            for rollup in rollups:
+                await self._create_indexes(rollup)
+                if await self.db[rollup.__tablename__].estimated_document_count() == 0:
+                    self._rebuilding[rollup.__tablename__] = True
+                await self._finish_rebuild(model, rollup)
+        finally:
+            for rollup in rollups:
+                self._rebuilding.pop(rollup.__tablename__, None)
+
     async def create_db(self):
-        for cls in ModelMetaclass.__models__:
-            if cls.__indexes__:
-                await self.db[cls.__tablename__].create_indexes(cls.__indexes__)
+        """Creates the indexes of all models that do not exist yet, as well as their rollups (and indexes)
+        if empty. Collections are handled concurrently"""
+        await asyncio.gather(
+            *(self._create_indexes(cls) for cls in ModelMetaclass.__models__ if cls.__indexes__),
+            *(self._create_rollups(cls) for cls in ModelMetaclass.__models__ if self._rollups(cls)),
+        )
 
     async def drop_db(self):
         await self._client.drop_database(self.db)
@@ -74,41 +369,182 @@ class MongoConnection:
     async def create_document(self, model: ModelMetaclass, document: dict, by_alias: bool = True) -> dict:
         """Fields in `document` not defined in `model` will be quietly ignored"""
         document = model(**document).dict(by_alias=by_alias)
-        await self.db[model.__tablename__].insert_one(document)
+        async with self._track("create", model):
+            await self._resilient(lambda: self.db[model.__tablename__].insert_one(document))
+        self._invalidate(model)
+        await self._update_rollups(model, [], [document])
         return document
 
-    async def read_document(self, model: ModelMetaclass, oid: str) -> dict:
+    async def create_documents(self, model: ModelMetaclass, documents: list, ordered: bool = False) -> list[dict]:
+        """Inserts multiple documents at once, reporting the status of each one.
+
+        Fields in `documents` not defined in `model` will be quietly ignored. Documents that are not
+        valid for the model are not sent to the database. If `ordered`, insertion stops at the first
+        failure and the documents coming after it are skipped.
+
+        The output has an entry per input document (in the same order), with its `index`, `status`,
+        `id` (if inserted) and `detail` of the failure (if any).
+        """
+        report = [{"index": i, "status": BulkStatus.skipped, "id": None, "detail": None} for i in range(len(documents))]
+        valid = []
+        for i, document in enumerate(documents):
+            try:
+                valid.append((i, model(**document).dict(by_alias=True)))
+            except (TypeError, ValidationError) as err:
+                report[i].update(status=BulkStatus.invalid, detail=str(err))
+                if ordered:
+                    break
+        if not valid:
+            return report
+
+        errors = {}
+        try:
+            async with self._track("create", model):
+                collection = self.db[model.__tablename__]
+                await self._resilient(lambda: collection.insert_many([document for _, document in valid], ordered=ordered))
+        except BulkWriteError as err:
+            errors = {error["index"]: error for error in err.details["writeErrors"]}
+        finally:
+            self._invalidate(model)
+        for j, (i, document) in enumerate(valid):
+            if j in errors:
+                status = BulkStatus.duplicate if errors[j]["code"] == 11000 else BulkStatus.invalid
+                report[i].update(status=status, detail=errors[j]["errmsg"])
+            elif not ordered or not errors or j < min(errors):
+                report[i].update(status=BulkStatus.inserted, id=document.get("_id"))
+        inserted = [document for i, document in valid if report[i]["status"] == BulkStatus.inserted]
+        await self._update_rollups(model, [], inserted)
+        return report
+
+    async def read_document(self, model: ModelMetaclass, oid: str, read_preference: _ServerMode = None) -> dict:
         try:
-            document = await self.db[model.__tablename__].find_one({"_id": PyObjectId(oid)})
+            document = await self._find_one(model, {"_id": PyObjectId(oid)}, read_preference)
         except InvalidId:  # Second attempt if _id is not a BSON ObjectId
-            document = await self.db[model.__tablename__].find_one({"_id": oid})
+            document = await self._find_one(model, {"_id": oid}, read_preference)
         if document is None:
             raise DocumentNotFound(oid)
         return document
 
     async def update_document(self, model: ModelMetaclass, oid: str, update: dict) -> dict:
-        """Will quietly work even if `update` includes fields not defined in `model`"""
+        """Will quietly work even if `update` includes fields not defined in `model`.
+
+        If the update modifies fields used by rollups of the model, the document before the update is
+        retrieved (to update the counts) and the updated document is built from it.
+        """
         try:
             match = {"_id": PyObjectId(oid)}
         except InvalidId:
             match = {"_id": oid}
-        update = {"$set": update}
-        document = await self.db[model.__tablename__].find_one_and_update(match, update, return_document=True)
+        fields, update = update, {"$set": update}
+        counted = any(rollup.fields.intersection(fields) for rollup in self._rollups(model))
+        async with self._track("update", model):
+            collection = self.db[model.__tablename__]
+            find_and_update = functools.partial(collection.find_one_and_update, match, update, return_document=not counted)
+            document = await self._resilient(find_and_update)
+        self._invalidate(model)
         if document is None:
             raise DocumentNotFound(oid)
+        if counted:
+            before, document = document, {**document, **fields}
+            await self._update_rollups(model, [before], [document])
         return document
 
     async def delete_document(self, model: ModelMetaclass, oid: str):
         try:
-            delete = await self.db[model.__tablename__].delete_one({"_id": PyObjectId(oid)})
+            match = {"_id": PyObjectId(oid)}
         except InvalidId:
-            delete = await self.db[model.__tablename__].delete_one({"_id": oid})
-        if delete.deleted_count == 0:
+            match = {"_id": oid}
+        async with self._track("delete", model):
+            collection = self.db[model.__tablename__]
+            if self._rollups(model):  # The deleted document is needed to update the counts
+                deleted = await self._resilient(lambda: collection.find_one_and_delete(match))
+            else:
+                deleted = (await self._resilient(lambda: collection.delete_one(match))).deleted_count
+        self._invalidate(model)
+        if not deleted:
             raise DocumentNotFound(oid)
+        await self._update_rollups(model, [deleted] if self._rollups(model) else [], [])
+
+    async def _existing(self, model: ModelMetaclass, oids: list) -> dict:
+        """Documents with the given IDs by ID, only with the fields used by the rollups of the model"""
+        fields = sorted({field for rollup in self._rollups(model) for field in rollup.fields})
+        projection = {"_id": 1, **{field: 1 for field in fields}}
+
+        async def find():
+            cursor = self.db[model.__tablename__].find({"_id": {"$in": oids}}, projection)
+            return {document["_id"]: document async for document in cursor}
+
+        async with self._track("read", model) as stats:
+            existing = await self._resilient(find, idempotent=True)
+            stats.documents = len(existing)
+        return existing
+
+    async def update_documents(self, model: ModelMetaclass, updates: list[tuple[str, dict]]) -> list[dict]:
+        """Updates multiple documents at once, reporting the status of each one.
 
-    async def count_documents(self, model: ModelMetaclass, q: BaseQuery) -> int:
+        Each update is given as a pair with the ID and the fields to modify in the document. Will quietly
+        work even if the updates include fields not defined in `model`.
+
+        The output has an entry per input update (in the same order), with its `index`, `status`,
+        `id` and `detail` of the failure (if any).
+        """
+        oids = [_cast_id(oid) for oid, _ in updates]
+        existing = await self._existing(model, oids)
+        report = [
+            {"index": i, "status": BulkStatus.updated if oid in existing else BulkStatus.not_found, "id": oid, "detail": None}
+            for i, oid in enumerate(oids)
+        ]
+        requests = [
+            (i, UpdateOne({"_id": oid}, {"$set": update}))
+            for i, (oid, (_, update)) in enumerate(zip(oids, updates))
+            if oid in existing
+        ]
+        await self._bulk_write(model, "update", requests, report)
+
+        before, after = {}, {}  # Updates of the same document are applied in order
+        for oid, (_, update), item in zip(oids, updates, report):
+            if item["status"] == BulkStatus.updated:
+                before.setdefault(oid, existing[oid])
+                after[oid] = {**after.get(oid, existing[oid]), **update}
+        await self._update_rollups(model, before.values(), after.values())
+        return report
+
+    async def delete_documents(self, model: ModelMetaclass, oids: list[str]) -> list[dict]:
+        """Deletes multiple documents at once, reporting the status of each one.
+
+        The output has an entry per input ID (in the same order), with its `index`, `status`,
+        `id` and `detail` of the failure (if any).
+        """
+        oids = [_cast_id(oid) for oid in oids]
+        existing = await self._existing(model, oids)
+        report = [
+            {"index": i, "status": BulkStatus.deleted if oid in existing else BulkStatus.not_found, "id": oid, "detail": None}
+            for i, oid in enumerate(oids)
+        ]
+        requests = [(i, DeleteOne({"_id": oid})) for i, oid in enumerate(oids) if oid in existing]
+        await self._bulk_write(model, "delete", requests, report)
+        deleted = {oid: existing[oid] for oid, item in zip(oids, report) if item["status"] == BulkStatus.deleted}
+        await self._update_rollups(model, deleted.values(), [])
+        return report
+
+    async def _bulk_write(self, model: ModelMetaclass, operation: str, requests: list[tuple[int, Any]], report: list[dict]):
+        """Sends requests paired with their index in the report, modifying the report with any errors"""
+        if not requests:
+            return
+        try:
+            async with self._track(operation, model):
+                collection = self.db[model.__tablename__]
+                await self._resilient(lambda: collection.bulk_write([request for _, request in requests], ordered=False))
+        except BulkWriteError as err:
+            for error in err.details["writeErrors"]:
+                status = BulkStatus.duplicate if error["code"] == 11000 else BulkStatus.invalid
+                report[requests[error["index"]][0]].update(status=status, detail=error["errmsg"])
+        finally:
+            self._invalidate(model)
+
+    async def count_documents(self, model: ModelMetaclass, q: BaseQuery, read_preference: _ServerMode = None) -> int:
         try:
-            (total,) = await self.db[model.__tablename__].aggregate(q.count_pipeline()).to_list(1)
+            (total,) = await self._aggregate(model, q.count_pipeline(), 1, read_preference, q, "count")
         except ValueError as err:
             # Special case: When the collection is empty total will be an empty list
             if "not enough values to unpack" not in str(err):
@@ -116,15 +552,96 @@ class MongoConnection:
             return 0
         return total["total"]
 
-    async def read_multiple_documents(self, model: ModelMetaclass, q: BaseQuery) -> list[dict]:
-        return [_ async for _ in self.db[model.__tablename__].aggregate(q.pipeline())]
+    async def read_multiple_documents(
+        self, model: ModelMetaclass, q: BaseQuery, read_preference: _ServerMode = None
+    ) -> list[dict]:
+        return await self._aggregate(model, q.pipeline(), read_preference=read_preference, q=q)
+
+    async def read_rollup(
+        self, rollup: Rollup, pipeline: list[dict], q: BaseQuery = None, read_preference: _ServerMode = None
+    ) -> list[dict]:
+        """Results of the pipeline over the counts of the rollup (e.g., from `DailyCount.pipeline`)"""
+        return await self._aggregate(rollup, pipeline, read_preference=read_preference, q=q, operation="rollup")
+
+    async def stream_documents(
+        self, model: ModelMetaclass, q: BaseQuery, batch_size: int = 1000, read_preference: _ServerMode = None
+    ) -> AsyncIterator[dict]:
+        """Yields documents as they arrive from the database, in batches of (at most) `batch_size`.
+
+        If the query includes a cursor (even if empty), the documents of the page coming after it are given
+        (see `read_paginated_documents`). Getting the first document is retried like other reads, while the
+        rest only go through the circuit breaker, since documents already given cannot be taken back.
+
+        The time reported to the operation monitor (and the profiler) only includes the time spent waiting for
+        the database, not that spent by the consumer between documents.
+        """
+        if isinstance(q, BasePaginatedQuery) and q.cursor is not None:
+            pipeline = q.keyset_pipeline(decode_cursor(q.cursor, q.order_by, q.direction) if q.cursor else None)
+        else:
+            pipeline = q.pipeline()
+
+        async def first() -> tuple[AsyncIterator[dict], dict | None]:
+            cursor = self._collection(model, read_preference).aggregate(pipeline, batchSize=batch_size).__aiter__()
+            try:
+                return cursor, await cursor.__anext__()
+            except StopAsyncIteration:
+                return cursor, None
+
+        command = {"aggregate": model.__tablename__, "pipeline": pipeline, "cursor": {}}
+        async with self._track("stream", model, q, command) as stats:
+            cursor, document = await self._resilient(first, idempotent=True)
+            while document is not None:
+                stats.documents += 1
+                given = time.perf_counter()
+                yield document
+                stats.idle += time.perf_counter() - given
+                try:
+                    document = await self._resilient(cursor.__anext__)
+                except StopAsyncIteration:
+                    document = None
+
+    async def read_paginated_documents(
+        self,
+        model: ModelMetaclass,
+        q: BasePaginatedQuery,
+        facet: bool = False,
+        read_preference: _ServerMode = None,
+        raw: bool = False,
+    ) -> dict:
+        """If the query includes a cursor (even if empty), keyset pagination is used instead of pages.
+        In that case, `next` and `previous` will be empty and `next_cursor` is given instead.
+
+        With `facet`, the total and the documents are retrieved in a single aggregation (the total
+        will always be exact). Otherwise, the total is given by the counting strategy of the connection
 
-    async def read_paginated_documents(self, model: ModelMetaclass, q: BasePaginatedQuery) -> dict:
-        total = await self.count_documents(model, q)
-        results = await self.db[model.__tablename__].aggregate(q.pipeline()).to_list(q.limit)
+        With `raw`, the documents are given as `RawBSONDocument` (e.g., to be encoded with `encode_json`,
+        skipping the validation against the model)
+        """
+        after = decode_cursor(q.cursor, q.order_by, q.direction) if q.cursor else None
+        if facet:
+            (document,) = await self._aggregate(model, q.facet_pipeline(after), 1, read_preference, q, raw=raw)
+            total, exact, results = document["total"], True, document["results"]
+        else:
+            total, exact = await self._counter.count(self, model, q, read_preference=read_preference)
+            pipeline = q.pipeline() if q.cursor is None else q.keyset_pipeline(after)
+            results = await self._aggregate(model, pipeline, q.limit, read_preference, q, raw=raw)
+        if q.cursor is not None:
+            # A full page signals that there might be more documents
+            last = results[-1] if len(results) == q.limit else None
+            cursor = encode_cursor(last.get(q.order_by), last["_id"], q.order_by, q.direction) if last else None
+            return {
+                "count": total,
+                "count_is_exact": exact,
+                "next": None,
+                "previous": None,
+                "next_cursor": cursor,
+                "results": results,
+            }
         return {
             "count": total,
+            "count_is_exact": exact,
             "next": q.page + 1 if q.skip + q.limit < total else None,
             "previous": q.page - 1 if q.page > 1 else None,
+            "next_cursor": None,
             "results": results,
         }
@@ -0,0 +1,61 @@
+import time
+
+from bson import json_util
+from pymongo.read_preferences import _ServerMode
+from query import BaseQuery
+
+from ._utils import ModelMetaclass
+
+
+class ExactCount:
+    """Counting strategy that always counts all documents matching the query.
+
+    Strategies are used by `MongoConnection` to get the totals for paginated results. They must
+    implement the coroutine `count`, returning the total and whether this total is exact.
+    """
+
+    async def count(
+        self, connection, model: ModelMetaclass, q: BaseQuery, read_preference: _ServerMode = None
+    ) -> tuple[int, bool]:
+        return await connection.count_documents(model, q, read_preference=read_preference), True
+
+
+class ApproximateCount(ExactCount):
+    """Counting strategy that trades exactness for speed.
+
+    Queries without filters use the collection metadata to estimate the total. Other queries are
+    counted exactly, but the total is stored for `ttl` seconds and reused by identical queries
+    (this includes any stage preceding the count, so grouped queries are stored separately).
+    At most `maxsize` totals are stored, discarding the oldest first.
+
+    In both cases the total is reported as not exact, except when it has just been counted.
+    """
+
+    def __init__(self, ttl: float = 30, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._totals = {}
+
+    @staticmethod
+    def _unfiltered(pipeline: list[dict]) -> bool:
+        """Whether the pipeline counts all documents in the collection (projections do not change the count)"""
+        return all(stage == {"$match": {}} or "$project" in stage for stage in pipeline[:-1])
+
+    async def count(
+        self, connection, model: ModelMetaclass, q: BaseQuery, read_preference: _ServerMode = None
+    ) -> tuple[int, bool]:
+        pipeline = q.count_pipeline()
+        if self._unfiltered(pipeline):
+            return await connection._collection(model, read_preference).estimated_document_count(), False
+
+        key, now = (model.__tablename__, json_util.dumps(pipeline)), time.monotonic()
+        expires, total = self._totals.get(key, (now, None))
+        if expires > now:
+            return total, False
+
+        self._totals.pop(key, None)
+        total, exact = await super().count(connection, model, q, read_preference=read_preference)
+        while len(self._totals) >= self.maxsize:
+            del self._totals[next(iter(self._totals))]
+        self._totals[key] = (now + self.ttl, total)
+        return total, exact
@@ -0,0 +1,99 @@
+import dataclasses
+import itertools
+from enum import Enum
+from typing import Any, NamedTuple
+
+from pymongo import IndexModel
+from query import BaseQuery
+
+from ._profiling import plan_stages
+from ._utils import ModelMetaclass
+
+_EQUALITY_OPERATORS = {"$eq", "$in"}
+
+
+class IndexAdvice(NamedTuple):
+    """Result of explaining a combination of filters and sorting of a query class.
+
+    Attributes:
+        query (str): Name of the query class
+        filters (tuple[str]): Fields used for filtering
+        sort (str | None): Field used for sorting (if any)
+        stages (list[str]): Stages of the winning plan (e.g., `COLLSCAN` or `IXSCAN`)
+        collscan (bool): Whether the whole collection is scanned
+        in_memory_sort (bool): Whether the documents are sorted in memory when an index could be used
+        suggestion (IndexModel | None): Index that would support the combination (if needed)
+    """
+
+    query: str
+    filters: tuple[str, ...]
+    sort: str | None
+    stages: list[str]
+    collscan: bool
+    in_memory_sort: bool
+    suggestion: IndexModel | None
+
+    @property
+    def ok(self) -> bool:
+        return self.suggestion is None
+
+
+def query_combinations(query_class: type[BaseQuery], samples: dict[str, Any]) -> list[BaseQuery]:
+    """Instances of the query class for every combination of its recipes and sorting field.
+
+    Every subset of the recipes is used (including none), with all the attributes of a recipe set to
+    the value given in `samples` and the attributes of the rest set to `None`. For sorted queries, each
+    subset is combined with every option of `order_by` (if it is an enum). Attributes not used by the
+    recipes keep their defaults.
+    """
+    order_by = {field.name: field.type for field in dataclasses.fields(query_class)}.get("order_by")
+    sorts = list(order_by) if isinstance(order_by, type) and issubclass(order_by, Enum) else [None]
+
+    queries = []
+    for n in range(len(query_class.recipes) + 1):
+        for recipes in itertools.combinations(query_class.recipes, n):
+            used = {attr for recipe in recipes for attr in recipe.attributes}
+            values = {
+                attr: samples[attr] if attr in used else None for recipe in query_class.recipes for attr in recipe.attributes
+            }
+            for sort in sorts:
+                queries.append(query_class(**values) if sort is None else query_class(**values, order_by=sort))
+    return queries
+
+
+def _value(field: Enum | str | None) -> str | None:
+    return field.value if isinstance(field, Enum) else field
+
+
+def _suggest(q: BaseQuery, collscan: bool, in_memory_sort: bool) -> IndexModel | None:
+    """Index following the equality, sort, range rule for the filters (and sorting, if needed)"""
+    if not collscan and not in_memory_sort:
+        return None
+    conditions = [recipe.pair(q) for recipe in q.recipes]
+    equality = [field for field, condition in conditions if condition and set(condition) <= _EQUALITY_OPERATORS]
+    ranges = [field for field, condition in conditions if condition and field not in equality]
+    sort = [(_value(q.order_by), int(q.direction))] if in_memory_sort else []
+    keys = [(field, 1) for field in equality] + sort + [(field, 1) for field in ranges if field not in dict(sort)]
+    return IndexModel(keys) if keys else None
+
+
+async def advise_indexes(
+    connection, model: ModelMetaclass, query_class: type[BaseQuery], samples: dict[str, Any]
+) -> list[IndexAdvice]:
+    """Explains the pipeline of every combination of filters and sorting of the query class (see
+    `query_combinations`) against the collection of the model, reporting those that scan the whole
+    collection or sort in memory.
+
+    Sorting in memory is only reported when it is done by the query planner, i.e., it could use an index.
+    Sorting after stages such as `$group` is done in memory anyway.
+    """
+    advice = []
+    for q in query_combinations(query_class, samples):
+        command = {"aggregate": model.__tablename__, "pipeline": q.pipeline(), "cursor": {}}
+        stages = plan_stages(await connection.db.command({"explain": command, "verbosity": "queryPlanner"}))
+        collscan, in_memory_sort = "COLLSCAN" in stages, "SORT" in stages
+        filters = tuple(field for field, condition in (recipe.pair(q) for recipe in q.recipes) if condition)
+        sort = _value(getattr(q, "order_by", None))
+        suggestion = _suggest(q, collscan, in_memory_sort)
+        advice.append(IndexAdvice(query_class.__name__, filters, sort, stages, collscan, in_memory_sort, suggestion))
+    return advice
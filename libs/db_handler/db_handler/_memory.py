@@ -0,0 +1,805 @@
+import itertools
+import re
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from types import SimpleNamespace
+from typing import Any, Callable, Iterable
+
+import bson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from pymongo import DeleteOne, InsertOne, IndexModel, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from ._connection import MongoConnection
+
+_MISSING = object()  # Marks fields not present in a document (as opposed to `None`)
+
+_REFERENCE = datetime(2000, 1, 1)  # Reference used by MongoDB for binning dates (a Saturday)
+
+_FIXED_UNITS = {
+    "millisecond": timedelta(milliseconds=1),
+    "second": timedelta(seconds=1),
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+_MONTH_UNITS = {"month": 1, "quarter": 3, "year": 12}
+
+_WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+
+def _normalize(value: Any) -> Any:
+    """Copy of the value as MongoDB would store it: enums by their value, dates in naive UTC with
+    millisecond resolution and tuples as lists. Containers are always copied"""
+    if isinstance(value, Enum):
+        return _normalize(value.value)
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, dict):
+        return {_normalize(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable version of the value (for grouping and unique keys)"""
+    if isinstance(value, dict):
+        return dict, tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return list, tuple(_freeze(v) for v in value)
+    return type(value) if isinstance(value, bool) else None, value
+
+
+def _rank(value: Any) -> int:
+    """Position of the type of the value in the BSON comparison order"""
+    if value is None or value is _MISSING:
+        return 0
+    if isinstance(value, bool):
+        return 7
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, dict):
+        return 3
+    if isinstance(value, list):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, ObjectId):
+        return 6
+    if isinstance(value, datetime):
+        return 8
+    return 9
+
+
+def _sort_key(value: Any) -> tuple[int, Any]:
+    rank = _rank(value)
+    if rank == 0:
+        return rank, 0
+    return rank, repr(value) if rank in (3, 4, 9) else value
+
+
+def _get(document: Any, path: str) -> Any:
+    """Value in a (dot separated) path of the document. Arrays of documents in the path are traversed"""
+    value = document
+    for key in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(key, _MISSING)
+        elif isinstance(value, list):
+            value = [item[key] for item in value if isinstance(item, dict) and key in item]
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _set(document: dict, path: str, value: Any):
+    """Sets the value in a (dot separated) path of the document, copying embedded documents in the path"""
+    *parents, last = path.split(".")
+    for key in parents:
+        child = document.get(key)
+        document[key] = child = dict(child) if isinstance(child, dict) else {}
+        document = child
+    if value is _MISSING:
+        document.pop(last, None)
+    else:
+        document[last] = value
+
+
+def _equal(value: Any, operand: Any) -> bool:
+    if isinstance(value, list) and not isinstance(operand, list):
+        return any(_equal(item, operand) for item in value)
+    if value is _MISSING:
+        value = None
+    return _rank(value) == _rank(operand) and value == operand
+
+
+def _compare(op: Callable[[Any, Any], bool]) -> Callable[[Any, Any], bool]:
+    """Comparison that only holds between values of the same BSON type (or any element of an array)"""
+
+    def compare(value, operand):
+        if isinstance(value, list):
+            return any(compare(item, operand) for item in value)
+        if value is _MISSING or _rank(value) != _rank(operand):
+            return False
+        return op(_sort_key(value), _sort_key(operand))
+
+    return compare
+
+
+def _regex(value: Any, operand: Any, options: str = "") -> bool:
+    if isinstance(value, list):
+        return any(_regex(item, operand, options) for item in value)
+    if not isinstance(value, str):
+        return False
+    if not isinstance(operand, re.Pattern):
+        flags = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}
+        operand = re.compile(operand, sum(flags[option] for option in options))
+    return operand.search(value) is not None
+
+
+_QUERY_OPERATORS = {
+    "$eq": _equal,
+    "$ne": lambda value, operand: not _equal(value, operand),
+    "$gt": _compare(lambda a, b: a > b),
+    "$gte": _compare(lambda a, b: a >= b),
+    "$lt": _compare(lambda a, b: a < b),
+    "$lte": _compare(lambda a, b: a <= b),
+    "$in": lambda value, operand: any(_matches_value(value, item) for item in operand),
+    "$nin": lambda value, operand: not any(_matches_value(value, item) for item in operand),
+    "$exists": lambda value, operand: (value is not _MISSING) == bool(operand),
+}
+
+
+def _matches_value(value: Any, condition: Any) -> bool:
+    """Whether the value matches a condition without operators (i.e., equality or a regular expression)"""
+    if isinstance(condition, re.Pattern):
+        return _regex(value, condition)
+    return _equal(value, condition)
+
+
+def _is_operator(condition: Any) -> bool:
+    """Whether the condition is given with operators (e.g., `{"$gt": 1}`), instead of a value to compare"""
+    return isinstance(condition, dict) and bool(condition) and all(k.startswith("$") for k in condition)
+
+
+def _matches_field(value: Any, condition: Any) -> bool:
+    if not _is_operator(condition):
+        return _matches_value(value, condition)
+    for op, operand in condition.items():
+        if op == "$options":
+            continue
+        if op == "$regex":
+            matched = _regex(value, operand, condition.get("$options", ""))
+        elif op == "$not":
+            matched = not _matches_field(value, operand)
+        elif op in _QUERY_OPERATORS:
+            matched = _QUERY_OPERATORS[op](value, operand)
+        else:
+            raise OperationFailure(f"unknown operator: {op}", code=2)
+        if not matched:
+            return False
+    return True
+
+
+def _matches(document: dict, query: dict) -> bool:
+    """Whether the document matches the query (as used in `$match` or `find`)"""
+    for key, condition in query.items():
+        if key == "$or":
+            matched = any(_matches(document, item) for item in condition)
+        elif key == "$and":
+            matched = all(_matches(document, item) for item in condition)
+        elif key == "$nor":
+            matched = not any(_matches(document, item) for item in condition)
+        elif key == "$expr":
+            matched = bool(_evaluate(condition, document))
+        else:
+            matched = _matches_field(_get(document, key), condition)
+        if not matched:
+            return False
+    return True
+
+
+def _date_trunc(args: dict, document: dict) -> datetime | None:
+    date = _evaluate(args["date"], document)
+    if not isinstance(date, datetime):
+        return None
+    unit, size = _evaluate(args["unit"], document), _evaluate(args.get("binSize", 1), document)
+    if unit in _MONTH_UNITS:
+        months, width = (date.year - _REFERENCE.year) * 12 + date.month - 1, _MONTH_UNITS[unit] * size
+        start = months - months % width
+        return datetime(_REFERENCE.year + start // 12, start % 12 + 1, 1)
+    reference = _REFERENCE
+    if unit == "week":
+        start_of_week = _WEEKDAYS.index(str(_evaluate(args.get("startOfWeek", "sun"), document)).lower()[:3])
+        reference += timedelta(days=(start_of_week - _REFERENCE.weekday()) % 7)
+    return date - (date - reference) % (_FIXED_UNITS[unit] * size)
+
+
+def _if_null(args: list, document: dict) -> Any:
+    *values, replacement = (_evaluate(arg, document) for arg in args)
+    return next((value for value in values if value is not None and value is not _MISSING), replacement)
+
+
+def _array_elem_at(args: list, document: dict) -> Any:
+    array, index = (_evaluate(arg, document) for arg in args)
+    if not isinstance(array, list):
+        return None
+    return array[index] if -len(array) <= index < len(array) else _MISSING
+
+
+def _size(args: Any, document: dict) -> int:
+    array = _evaluate(args[0] if isinstance(args, list) else args, document)
+    if not isinstance(array, list):
+        raise OperationFailure("The argument to $size must be an array", code=17124)
+    return len(array)
+
+
+def _slice(args: list, document: dict) -> list | None:
+    array, *bounds = (_evaluate(arg, document) for arg in args)
+    if not isinstance(array, list):
+        return None
+    start, count = bounds if len(bounds) == 2 else (0, bounds[0]) if bounds[0] >= 0 else (bounds[0], -bounds[0])
+    return array[start:][:count]
+
+
+def _sort_array(args: dict, document: dict) -> list | None:
+    array = _evaluate(args["input"], document)
+    if not isinstance(array, list):
+        return None
+    if isinstance(args["sortBy"], dict):
+        return _sort(array, args["sortBy"])
+    return sorted(array, key=_sort_key, reverse=args["sortBy"] == -1)
+
+
+def _set_union(args: list, document: dict) -> list | None:
+    arrays = [_evaluate(arg, document) for arg in args]
+    if any(array is None or array is _MISSING for array in arrays):
+        return None
+    return _add_to_set([value for array in arrays for value in array])
+
+
+def _bind(expression: Any, variables: dict) -> Any:
+    """Expression with the given variables (e.g., `$$this`) replaced by their values"""
+    if isinstance(expression, str) and expression.startswith("$$"):
+        name, *path = expression[2:].split(".", 1)
+        if name in variables:
+            value = _get(variables[name], path[0]) if path else variables[name]
+            return {"$literal": None if value is _MISSING else value}
+        return expression
+    if isinstance(expression, dict):
+        return {k: v if k == "$literal" else _bind(v, variables) for k, v in expression.items()}
+    if isinstance(expression, list):
+        return [_bind(item, variables) for item in expression]
+    return expression
+
+
+def _reduce(args: dict, document: dict) -> Any:
+    array = _evaluate(args["input"], document)
+    if not isinstance(array, list):
+        return None
+    value = _evaluate(args["initialValue"], document)
+    for item in array:
+        value = _evaluate(_bind(args["in"], {"value": value, "this": item}), document)
+    return value
+
+
+def _comparison(op: Callable[[Any, Any], bool]) -> Callable[[list, dict], bool]:
+    """Comparison of expressions, following the BSON comparison order (unlike queries, between any types)"""
+
+    def compare(args, document):
+        a, b = (None if value is _MISSING else value for value in (_evaluate(arg, document) for arg in args))
+        return op(_sort_key(a), _sort_key(b))
+
+    return compare
+
+
+_EXPRESSION_OPERATORS = {
+    "$dateTrunc": _date_trunc,
+    "$ifNull": _if_null,
+    "$arrayElemAt": _array_elem_at,
+    "$size": _size,
+    "$slice": _slice,
+    "$sortArray": _sort_array,
+    "$setUnion": _set_union,
+    "$reduce": _reduce,
+    "$eq": _comparison(lambda a, b: a == b),
+    "$ne": _comparison(lambda a, b: a != b),
+    "$gt": _comparison(lambda a, b: a > b),
+    "$gte": _comparison(lambda a, b: a >= b),
+    "$lt": _comparison(lambda a, b: a < b),
+    "$lte": _comparison(lambda a, b: a <= b),
+    "$and": lambda args, document: all(_truthy(_evaluate(arg, document)) for arg in args),
+    "$or": lambda args, document: any(_truthy(_evaluate(arg, document)) for arg in args),
+    "$literal": lambda args, document: args,
+}
+
+
+def _truthy(value: Any) -> bool:
+    """Truth value of an expression (only `false`, `null`, zero and missing values are false)"""
+    return value is not _MISSING and value is not None and value is not False and value != 0
+
+
+def _evaluate(expression: Any, document: dict) -> Any:
+    """Value of an aggregation expression for the document (`_MISSING` for fields not in the document)"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        if expression == "$$ROOT":
+            return document
+        return _get(document, expression[1:])
+    if isinstance(expression, dict):
+        if len(expression) == 1 and next(iter(expression)).startswith("$"):
+            op, args = next(iter(expression.items()))
+            if op not in _EXPRESSION_OPERATORS:
+                raise OperationFailure(f"Unrecognized expression '{op}'", code=168)
+            return _EXPRESSION_OPERATORS[op](args, document)
+        return {k: v for k, v in ((k, _evaluate(v, document)) for k, v in expression.items()) if v is not _MISSING}
+    if isinstance(expression, list):
+        return [None if v is _MISSING else v for v in (_evaluate(item, document) for item in expression)]
+    return expression
+
+
+def _add_to_set(values: list) -> list:
+    unique = {}
+    for value in values:
+        unique.setdefault(_freeze(value), value)
+    return list(unique.values())
+
+
+def _numbers(values: list) -> list:
+    return [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+
+
+def _top_n(values: list[tuple[list, Any]], args: dict) -> list:
+    """Outputs of the first `n` documents in the order of `sortBy` (given the sorting values and output of each)"""
+    values = list(values)
+    for i, direction in reversed(list(enumerate(args["sortBy"].values()))):  # Stable sorts, as in `_sort`
+        values.sort(key=lambda value: _sort_key(value[0][i]), reverse=direction == -1)
+    return [output for _, output in values[: args["n"]]]
+
+
+_ACCUMULATORS = {
+    "$sum": lambda values, args: sum(_numbers(values)),
+    "$avg": lambda values, args: sum(_numbers(values)) / len(_numbers(values)) if _numbers(values) else None,
+    "$min": lambda values, args: min((v for v in values if v is not None), key=_sort_key, default=None),
+    "$max": lambda values, args: max((v for v in values if v is not None), key=_sort_key, default=None),
+    "$first": lambda values, args: values[0] if values else None,
+    "$last": lambda values, args: values[-1] if values else None,
+    "$push": lambda values, args: list(values),
+    "$addToSet": lambda values, args: _add_to_set(values),
+    "$count": lambda values, args: len(values),
+    "$topN": _top_n,
+}
+
+
+def _accumulated(op: str, args: Any, document: dict) -> Any:
+    """Value of the document collected by the accumulator"""
+    if op == "$count":
+        return None
+    if op == "$topN":
+        keys = [_get(document, field) for field in args["sortBy"]]
+        output = _evaluate(args["output"], document)
+        return keys, None if output is _MISSING else output
+    return _evaluate(args, document)
+
+
+def _group(documents: list[dict], spec: dict) -> list[dict]:
+    accumulators = {field: next(iter(accumulator.items())) for field, accumulator in spec.items() if field != "_id"}
+    for op, _ in accumulators.values():
+        if op not in _ACCUMULATORS:
+            raise OperationFailure(f"unknown group operator '{op}'", code=15952)
+
+    groups = {}
+    for document in documents:
+        key = _evaluate(spec["_id"], document)
+        key = None if key is _MISSING else key
+        _, values = groups.setdefault(_freeze(key), (key, {field: [] for field in accumulators}))
+        for field, (op, args) in accumulators.items():
+            value = _accumulated(op, args, document)
+            if value is not _MISSING or op in ("$first", "$last"):
+                values[field].append(None if value is _MISSING else value)
+    return [
+        {"_id": key, **{field: _ACCUMULATORS[op](values[field], args) for field, (op, args) in accumulators.items()}}
+        for key, values in groups.values()
+    ]
+
+
+def _sort(documents: list[dict], spec: dict) -> list[dict]:
+    documents = list(documents)
+    for field, direction in reversed(spec.items()):  # Stable sorts, from the least significant key
+        documents.sort(key=lambda document: _sort_key(_get(document, field)), reverse=direction == -1)
+    return documents
+
+
+def _project(documents: list[dict], spec: dict) -> list[dict]:
+    excluded = [field for field, value in spec.items() if value is False or (type(value) is int and value == 0)]
+    included = {field: value for field, value in spec.items() if field not in excluded}
+    if not included:
+        output = [dict(document) for document in documents]
+        for document in output:
+            for field in excluded:
+                _set(document, field, _MISSING)
+        return output
+
+    output = []
+    for document in documents:
+        projected = {} if "_id" in excluded or "_id" not in document else {"_id": document["_id"]}
+        for field, value in included.items():
+            value = _get(document, field) if value is True or type(value) is int else _evaluate(value, document)
+            if value is not _MISSING:
+                _set(projected, field, value)
+        output.append(projected)
+    return output
+
+
+def _set_fields(documents: list[dict], spec: dict) -> list[dict]:
+    output = []
+    for document in documents:
+        values = {field: _evaluate(expression, document) for field, expression in spec.items()}
+        document = dict(document)
+        for field, value in values.items():
+            _set(document, field, value)
+        output.append(document)
+    return output
+
+
+def _unset(documents: list[dict], spec: str | list[str]) -> list[dict]:
+    return _project(documents, {field: 0 for field in ([spec] if isinstance(spec, str) else spec)})
+
+
+_STAGES = {
+    "$match": lambda documents, spec: [document for document in documents if _matches(document, spec)],
+    "$group": _group,
+    "$sort": _sort,
+    "$skip": lambda documents, spec: documents[spec:],
+    "$limit": lambda documents, spec: documents[:spec],
+    "$count": lambda documents, spec: [{spec: len(documents)}] if documents else [],
+    "$project": _project,
+    "$set": _set_fields,
+    "$addFields": _set_fields,
+    "$unset": _unset,
+    "$facet": lambda documents, spec: [{name: _run(documents, pipeline) for name, pipeline in spec.items()}],
+}
+
+
+def _run(documents: list[dict], pipeline: list[dict]) -> list[dict]:
+    """Results of an aggregation pipeline over the documents"""
+    for stage in pipeline:
+        ((name, spec),) = stage.items()
+        if name not in _STAGES:
+            raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'", code=40324)
+        documents = _STAGES[name](documents, spec)
+    return documents
+
+
+class _MemoryCursor:
+    """Asynchronous cursor over documents generated on first use (as results arrive from the database)"""
+
+    def __init__(self, generate: Callable[[], Iterable[dict]]):
+        self._generate = generate
+        self._documents = None
+
+    def _iterator(self):
+        if self._documents is None:
+            self._documents = iter(self._generate())
+        return self._documents
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        try:
+            return next(self._iterator())
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length: int | None) -> list[dict]:
+        return list(itertools.islice(self._iterator(), length))
+
+
+class _MemoryCollection:
+    """Collection with the subset of the interface of `AsyncIOMotorCollection` used by `MongoConnection`.
+
+    Views created by `with_options` share the documents and indexes. Only the codec options are used
+    (to return `RawBSONDocument`), read preferences are quietly ignored.
+    """
+
+    def __init__(self, database: "_MemoryDatabase", name: str, state: SimpleNamespace = None, codec_options=None):
+        self.database = database
+        self.name = name
+        self.codec_options = codec_options
+        # Unique indexes map the key of each document to its ID
+        indexes = {"_id_": {"v": 2, "key": {"_id": 1}, "name": "_id_"}}
+        self._state = state or SimpleNamespace(documents={}, indexes=indexes, unique={})
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.database.name}.{self.name}"
+
+    def with_options(self, codec_options=None, **kwargs) -> "_MemoryCollection":
+        return _MemoryCollection(self.database, self.name, self._state, codec_options or self.codec_options)
+
+    def _output(self, document: dict) -> dict:
+        if self.codec_options is not None and self.codec_options.document_class is RawBSONDocument:
+            return RawBSONDocument(bson.encode(document))
+        return _normalize(document)
+
+    def _matching(self, query: dict | None) -> Iterable[dict]:
+        query = _normalize(query or {})
+        return (document for document in self._state.documents.values() if _matches(document, query))
+
+    @staticmethod
+    def _index_key(index: dict, document: dict) -> tuple:
+        return tuple(_freeze(None if (value := _get(document, field)) is _MISSING else value) for field in index["key"])
+
+    def _unique_keys(self, document: dict) -> dict[str, tuple]:
+        return {name: self._index_key(index, document) for name, index in self._state.indexes.items() if index.get("unique")}
+
+    def _duplicate(self, index: dict, document: dict) -> DuplicateKeyError:
+        key = ", ".join(f"{field}: {_get(document, field)!r}" for field in index["key"])
+        message = f"E11000 duplicate key error collection: {self.full_name} index: {index['name']} dup key: {{ {key} }}"
+        return DuplicateKeyError(message, code=11000)
+
+    def _store(self, document: dict, replaces: dict = None):
+        """Stores the document (replacing another one if given), checking unique indexes"""
+        oid = _freeze(document["_id"])
+        if replaces is None and oid in self._state.documents:
+            raise self._duplicate(self._state.indexes["_id_"], document)
+        previous = self._unique_keys(replaces) if replaces is not None else {}
+        keys = self._unique_keys(document)
+        for name, key in keys.items():
+            if self._state.unique[name].get(key, oid) != oid:
+                raise self._duplicate(self._state.indexes[name], document)
+        for name, key in previous.items():
+            del self._state.unique[name][key]
+        for name, key in keys.items():
+            self._state.unique[name][key] = oid
+        self._state.documents[oid] = document
+
+    def _remove(self, document: dict):
+        for name, key in self._unique_keys(document).items():
+            del self._state.unique[name][key]
+        del self._state.documents[_freeze(document["_id"])]
+
+    def _insert(self, document: dict) -> Any:
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        self._store(_normalize(document))
+        return document["_id"]
+
+    def _update(self, query: dict, update: dict, upsert: bool = False) -> tuple[dict, dict] | tuple[None, None]:
+        """Updates the first document matching the query, returning it before and after the update. With
+        `upsert`, a document with the fields in the query compared by equality is inserted if none matches"""
+        document = next(self._matching(query), None)
+        if document is None and not upsert:
+            return None, None
+        if document is None:
+            updated = {k: v for k, v in _normalize(query).items() if not k.startswith("$") and not _is_operator(v)}
+            updated.setdefault("_id", ObjectId())
+        else:
+            updated = dict(document)
+        for op, fields in _normalize(update).items():
+            for field, value in fields.items():
+                if op == "$set":
+                    _set(updated, field, value)
+                elif op == "$unset":
+                    _set(updated, field, _MISSING)
+                elif op == "$inc":
+                    current = _get(updated, field)
+                    _set(updated, field, (0 if current is _MISSING else current) + value)
+                elif op in ("$min", "$max"):
+                    current = _get(updated, field)
+                    pick = min if op == "$min" else max
+                    _set(updated, field, value if current is _MISSING else pick(current, value, key=_sort_key))
+                elif op == "$addToSet":
+                    current = _get(updated, field)
+                    values = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                    _set(updated, field, _add_to_set(([] if current is _MISSING else list(current)) + values))
+                else:
+                    raise OperationFailure(f"Unknown modifier: {op}", code=9)
+        self._store(updated, replaces=document)
+        return document, updated
+
+    def _replace(self, query: dict, replacement: dict, upsert: bool = False) -> tuple[dict, dict] | tuple[None, None]:
+        """Replaces the first document matching the query, returning it before and after (as `_update`)"""
+        document = next(self._matching(query), None)
+        if document is None and not upsert:
+            return None, None
+        replaced = _normalize(replacement)
+        if document is not None:
+            replaced["_id"] = document["_id"]
+        elif "_id" not in replaced:
+            replaced["_id"] = _normalize(query).get("_id", ObjectId())
+        self._store(replaced, replaces=document)
+        return document, replaced
+
+    async def insert_one(self, document: dict) -> SimpleNamespace:
+        return SimpleNamespace(inserted_id=self._insert(document), acknowledged=True)
+
+    async def insert_many(self, documents: list[dict], ordered: bool = True) -> SimpleNamespace:
+        inserted, errors = [], []
+        for i, document in enumerate(documents):
+            try:
+                inserted.append(self._insert(document))
+            except DuplicateKeyError as err:
+                errors.append({"index": i, "code": err.code, "errmsg": str(err)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return SimpleNamespace(inserted_ids=inserted, acknowledged=True)
+
+    async def find_one(self, filter: dict = None, projection: dict = None) -> dict | None:
+        document = next(self._matching(filter), None)
+        if document is None:
+            return None
+        return self._output(_project([document], projection)[0] if projection else document)
+
+    def find(self, filter: dict = None, projection: dict = None, **kwargs) -> _MemoryCursor:
+        def generate():
+            documents = list(self._matching(filter))
+            return map(self._output, _project(documents, projection) if projection else documents)
+
+        return _MemoryCursor(generate)
+
+    async def find_one_and_update(self, filter: dict, update: dict, return_document: bool = False) -> dict | None:
+        before, after = self._update(filter, update)
+        document = after if return_document else before
+        return None if document is None else self._output(document)
+
+    async def delete_one(self, filter: dict) -> SimpleNamespace:
+        document = await self.find_one_and_delete(filter)
+        return SimpleNamespace(deleted_count=int(document is not None), acknowledged=True)
+
+    async def find_one_and_delete(self, filter: dict) -> dict | None:
+        document = next(self._matching(filter), None)
+        if document is not None:
+            self._remove(document)
+        return None if document is None else self._output(document)
+
+    async def delete_many(self, filter: dict) -> SimpleNamespace:
+        documents = list(self._matching(filter))
+        for document in documents:
+            self._remove(document)
+        return SimpleNamespace(deleted_count=len(documents), acknowledged=True)
+
+    async def bulk_write(self, requests: list, ordered: bool = True) -> SimpleNamespace:
+        result = SimpleNamespace(inserted_count=0, matched_count=0, modified_count=0, deleted_count=0, upserted_count=0)
+        errors = []
+        for i, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    result.inserted_count += 1
+                elif isinstance(request, (UpdateOne, ReplaceOne)):
+                    write = self._update if isinstance(request, UpdateOne) else self._replace
+                    before, after = write(request._filter, request._doc, request._upsert)
+                    result.matched_count += before is not None
+                    result.modified_count += before is not None and before != after
+                    result.upserted_count += before is None and after is not None
+                elif isinstance(request, DeleteOne):
+                    deleted = await self.delete_one(request._filter)
+                    result.deleted_count += deleted.deleted_count
+                else:
+                    raise TypeError(f"{type(request).__name__} is not supported by the in-memory backend")
+            except DuplicateKeyError as err:
+                errors.append({"index": i, "code": err.code, "errmsg": str(err)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, **vars(result)})
+        return result
+
+    async def count_documents(self, filter: dict) -> int:
+        return sum(1 for _ in self._matching(filter))
+
+    async def estimated_document_count(self) -> int:
+        return len(self._state.documents)
+
+    def aggregate(self, pipeline: list[dict], **kwargs) -> _MemoryCursor:
+        """Results of the pipeline. A final `$out` stage replaces the documents of the given collection"""
+
+        def generate():
+            stages = _normalize(pipeline)
+            out = stages.pop()["$out"] if stages and "$out" in stages[-1] else None
+            documents = _run(list(self._state.documents.values()), stages)
+            if out is None:
+                return map(self._output, documents)
+            target = self.database[out]
+            target._state.documents, target._state.unique = {}, {name: {} for name in target._state.unique}
+            for document in documents:
+                target._store(document)
+            return iter(())
+
+        return _MemoryCursor(generate)
+
+    def list_indexes(self) -> _MemoryCursor:
+        return _MemoryCursor(lambda: [dict(index) for index in self._state.indexes.values()])
+
+    async def create_indexes(self, indexes: list[IndexModel]) -> list[str]:
+        for index in indexes:
+            document = _normalize(index.document)
+            if document.get("unique"):
+                unique = {}
+                for oid, stored in self._state.documents.items():
+                    if unique.setdefault(self._index_key(document, stored), oid) != oid:
+                        raise self._duplicate(document, stored)
+                self._state.unique[document["name"]] = unique
+            self._state.indexes[document["name"]] = {"v": 2, **document}
+        return [index.document["name"] for index in indexes]
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The in-memory backend does not support change streams", code=40573)
+
+
+class _MemoryDatabase:
+    def __init__(self, client: "_MemoryClient", name: str):
+        self.client = client
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> _MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = _MemoryCollection(self, name)
+        return self._collections[name]
+
+    async def list_collection_names(self) -> list[str]:
+        return list(self._collections)
+
+    async def command(self, command: str | dict, **kwargs) -> dict:
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == "ping":
+            return {"ok": 1.0}
+        raise OperationFailure(f"The in-memory backend does not support the command '{name}'", code=59)
+
+
+class _MemoryClient:
+    """Client with the subset of the interface of `AsyncIOMotorClient` used by `MongoConnection`"""
+
+    def __init__(self):
+        self._databases = {}
+
+    def __getitem__(self, name: str) -> _MemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = _MemoryDatabase(self, name)
+        return self._databases[name]
+
+    @property
+    def admin(self) -> _MemoryDatabase:
+        return self["admin"]
+
+    async def drop_database(self, database: _MemoryDatabase | str):
+        self._databases.pop(getattr(database, "name", database), None)
+
+    def close(self):
+        pass
+
+
+class InMemoryConnection(MongoConnection):
+    """Connection keeping the documents in the memory of the process, without a MongoDB server.
+
+    Meant for tests and benchmarks of the code above the database, isolated from its variance. It has
+    the same interface as `MongoConnection` (and the same optional strategies, such as the query cache),
+    supporting the aggregation stages emitted by the query classes (`$match`, `$group`, `$sort`, `$skip`,
+    `$limit`, `$count`, `$project`, `$set`, `$unset` and `$facet`) and the most common query, expression
+    and accumulator operators. Unsupported operators raise `OperationFailure`, as MongoDB would.
+
+    Documents are kept when the connection is closed and lost when the object is discarded. Indexes only
+    enforce uniqueness, so the time taken by operations does not reflect that of a real database.
+    Commands other than `ping` (e.g., `explain`) and change streams are not supported.
+    """
+
+    def __init__(self, config: dict = None, **kwargs):
+        config = {"host": "memory", "port": 0, "username": "", "password": "", "database": "memory", **(config or {})}
+        super().__init__(config, **kwargs)
+        self._memory = _MemoryClient()
+
+    async def connect(self):
+        self._client = self._memory
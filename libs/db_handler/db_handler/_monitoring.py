@@ -0,0 +1,96 @@
+import threading
+import time
+from typing import Callable
+
+from pymongo import monitoring
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Listener of connection pool events (CMAP) that keeps track of the state of the pools.
+
+    The counters are aggregated over the pools of all servers. Use `add_checkout_observer` to
+    register callables that will receive the time (in seconds) taken by every connection checkout.
+
+    Attributes:
+        open (int): Connections currently open
+        checked_out (int): Connections currently in use
+        waiting (int): Operations currently waiting for a connection
+        checkout_failures (int): Total number of failed checkouts
+    """
+
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkout_failures = 0
+        self._observers = []
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Checkouts start and end in the same thread
+
+    def add_checkout_observer(self, observer: Callable[[float], None]):
+        self._observers.append(observer)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        self._local.start = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        elapsed = time.perf_counter() - getattr(self._local, "start", time.perf_counter())
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+        for observer in self._observers:
+            observer(elapsed)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+class OperationMonitor:
+    """Keeps track of the database operations done through a connection.
+
+    Use `add_observer` to register callables that will receive, for every operation, its name (`create`,
+    `read`, `update`, `delete`, `count`, `aggregate` or `stream`), the collection, the name of the query
+    class (empty if the operation does not come from a query), the time taken (in seconds) and the
+    number of documents returned.
+    """
+
+    def __init__(self):
+        self._observers = []
+
+    def add_observer(self, observer: Callable[[str, str, str, float, int], None]):
+        self._observers.append(observer)
+
+    def record(self, operation: str, collection: str, query: str, elapsed: float, documents: int = 0):
+        for observer in self._observers:
+            observer(operation, collection, query, elapsed, documents)
@@ -0,0 +1,88 @@
+import asyncio
+import dataclasses
+import logging
+import random
+from typing import Any
+
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import PyMongoError
+from query import BaseQuery
+
+
+def _walk(document: Any, key: str):
+    """Yields all values associated to `key` in nested dictionaries and lists"""
+    if isinstance(document, dict):
+        for k, v in document.items():
+            if k == key:
+                yield v
+            yield from _walk(v, key)
+    elif isinstance(document, list):
+        for item in document:
+            yield from _walk(item, key)
+
+
+def plan_stages(explain: dict) -> list[str]:
+    """Stages of the winning plans in the output of an `explain` command (e.g., `COLLSCAN` or `IXSCAN`)"""
+    plans = _walk(explain, "winningPlan")
+    return sorted({stage for plan in plans for stage in _walk(plan, "stage") if isinstance(stage, str)})
+
+
+def summarize_plan(explain: dict) -> dict:
+    """Summary of the output of an `explain` command with `executionStats` verbosity.
+
+    Includes the stages used by the query plans (e.g., `COLLSCAN` or `IXSCAN`) and the number of
+    index keys and documents examined, as well as the number of documents returned.
+    """
+    stats = list(_walk(explain, "executionStats"))
+    return {
+        "stages": plan_stages(explain),
+        "keys_examined": sum(s.get("totalKeysExamined", 0) for s in stats),
+        "docs_examined": sum(s.get("totalDocsExamined", 0) for s in stats),
+        "returned": sum(s.get("nReturned", 0) for s in stats),
+    }
+
+
+class QueryProfiler:
+    """Logs database operations taking longer than `threshold` seconds.
+
+    The log includes the full command sent to the database and, if available, the class and parameters
+    of the query that generated it. Running `explain` on the command can be slower than the command
+    itself, so the plan summary (see `summarize_plan`) is only added for a fraction `explain_rate`
+    of the slow operations. Both the explain and the log run in the background, without delaying the
+    operation being recorded.
+    """
+
+    def __init__(self, threshold: float = 1, explain_rate: float = 0, logger: logging.Logger = None):
+        self.threshold = threshold
+        self.explain_rate = explain_rate
+        self.logger = logger or logging.getLogger("db_handler")
+        self._tasks = set()  # Keeps references to the running tasks, which could be garbage collected otherwise
+
+    def record(self, db: AsyncIOMotorDatabase, command: dict, elapsed: float, q: BaseQuery = None) -> asyncio.Task | None:
+        """Records an operation given as a database command that can be explained. If slow, it is logged by
+        the returned task"""
+        if elapsed < self.threshold:
+            return None
+        params = {field.name: getattr(q, field.name) for field in dataclasses.fields(q)} if q is not None else None
+        task = asyncio.create_task(self._log(db, command, elapsed, q, params))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _log(self, db: AsyncIOMotorDatabase, command: dict, elapsed: float, q: BaseQuery | None, params: dict | None):
+        plan = None
+        if self.explain_rate and random.random() < self.explain_rate:
+            try:
+                plan = summarize_plan(await db.command({"explain": command, "verbosity": "executionStats"}))
+            except PyMongoError as err:
+                plan = f"unavailable ({err})"
+        self.logger.warning(
+            "Slow %s on %s (%.3f s). Query: %s %s. Command: %s. Plan: %s",
+            *next(iter(command.items())),
+            elapsed,
+            type(q).__name__ if q is not None else None,
+            params,
+            json_util.dumps(command),
+            plan,
+        )
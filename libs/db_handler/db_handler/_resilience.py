@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import random
+import time
+from enum import IntEnum
+from typing import Awaitable, Callable, TypeVar
+
+from pymongo.errors import ConnectionFailure, NetworkTimeout
+
+from ._utils import CircuitOpen
+
+T = TypeVar("T")
+
+
+class RetryPolicy:
+    """Policy for retrying idempotent database operations that fail to reach the server.
+
+    An operation is attempted up to `attempts` times. Between attempts, it waits a random time (jitter)
+    between zero and an exponential backoff, starting at `base_delay` and capped at `max_delay` seconds.
+    All attempts (including the waits) must finish within `deadline` seconds, otherwise `NetworkTimeout`
+    is raised. Only connection failures are retried (e.g., server selection timeouts during failovers).
+
+    Each attempt can go through a `guard` (e.g., `CircuitBreaker.call`). The deadline is applied inside
+    it, so that the guard sees an attempt running out of time as a failure (`NetworkTimeout`) instead
+    of being cancelled. The server selection timeout of the client should be shorter than the deadline,
+    so that attempts to reach an unavailable server fail (and can be retried) before it.
+    """
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.1, max_delay: float = 2, deadline: float = 10):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    async def _attempt(self, operation: Callable[[], Awaitable[T]], end: float) -> T:
+        try:
+            return await asyncio.wait_for(operation(), end - time.monotonic())
+        except asyncio.TimeoutError:
+            raise NetworkTimeout(f"Database operation did not finish within {self.deadline} seconds")
+
+    async def call(
+        self, operation: Callable[[], Awaitable[T]], guard: Callable[[Callable[[], Awaitable[T]]], Awaitable[T]] = None
+    ) -> T:
+        end = time.monotonic() + self.deadline
+        attempt_ = functools.partial(self._attempt, operation, end)
+        for attempt in range(self.attempts):
+            try:
+                return await (attempt_() if guard is None else guard(attempt_))
+            except ConnectionFailure:  # Includes running out of time (as `NetworkTimeout`), which is not retried
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+                if attempt == self.attempts - 1 or time.monotonic() + delay >= end:
+                    raise
+                await asyncio.sleep(delay)
+
+
+class BreakerState(IntEnum):
+    closed = 0
+    half_open = 1
+    open = 2
+
+
+class CircuitBreaker:
+    """Fails fast while the database is unreachable, instead of waiting for every operation to time out.
+
+    After `failure_threshold` consecutive connection failures the breaker opens and operations raise
+    `CircuitOpen` without reaching the database. After `reset_timeout` seconds, a single operation is
+    let through (half open): if it succeeds the breaker closes, otherwise it opens again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    @property
+    def state(self) -> BreakerState:
+        if self._opened_at is None:
+            return BreakerState.closed
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return BreakerState.half_open
+        return BreakerState.open
+
+    def _check(self):
+        state = self.state
+        if state == BreakerState.open or (state == BreakerState.half_open and self._trial):
+            raise CircuitOpen(max(self._opened_at + self.reset_timeout - time.monotonic(), 0))
+        self._trial = state == BreakerState.half_open
+
+    def _record(self, reached: bool):
+        if reached:
+            self.failures, self._opened_at = 0, None
+            return
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+    async def call(self, operation: Callable[[], Awaitable[T]]) -> T:
+        self._check()
+        try:
+            result = await operation()
+        except ConnectionFailure:
+            self._record(reached=False)
+            raise
+        except Exception:
+            self._record(reached=True)  # Other errors come from the server
+            raise
+        finally:
+            self._trial = False
+        self._record(reached=True)
+        return result
@@ -0,0 +1,215 @@
+from collections import Counter
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Iterable
+
+from bson import ObjectId
+from pymongo import DeleteOne, IndexModel, ReplaceOne, UpdateOne
+
+_INCREMENTAL = {"$count", "$sum", "$min", "$max", "$addToSet"}  # Accumulators that can be applied document by document
+
+
+def _references(expression: Any) -> set[str]:
+    """Fields (top level) referenced in an aggregation expression, e.g., `date` for `{"$min": "$date"}`"""
+    if isinstance(expression, str) and expression.startswith("$") and not expression.startswith("$$"):
+        return {expression[1:].split(".")[0]}
+    if isinstance(expression, dict):
+        return set().union(*(_references(value) for value in expression.values()))
+    if isinstance(expression, list):
+        return set().union(*(_references(value) for value in expression))
+    return set()
+
+
+def _plain(value: Any) -> Any:
+    return value.value if isinstance(value, Enum) else value
+
+
+def _values(documents: Iterable[dict], expression: str) -> list:
+    """Values of the field in the expression (e.g., `"$date"`) in the documents, other than missing or null"""
+    values = []
+    for document in documents:
+        value = document
+        for key in expression[1:].split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is not None:
+            values.append(_plain(value))
+    return values
+
+
+def _total(documents: list[dict], expression: Any) -> int | float:
+    """Result of `$sum` over the documents, for a number or the field in the expression"""
+    if not isinstance(expression, str):
+        return expression * len(documents)
+    return sum(v for v in _values(documents, expression) if isinstance(v, (int, float)) and not isinstance(v, bool))
+
+
+class DailyCount:
+    """Number of documents of a model per UTC day (of the field `date`) and combination of values of
+    the fields in `dimensions`, kept in the collection `collection`.
+
+    Rollups are declared in the models as a list in `__rollups__`. The connection updates the counts
+    incrementally on every write of documents of the model, and builds them from the existing documents
+    when the collection of the counts is empty (see `MongoConnection.rebuild_rollups`). Each document of
+    the collection has the key as `_id` (the day in `day` and the value of each dimension) and the number
+    of documents in `count`.
+
+    The rollup has `__tablename__`, so that it can be used like a model in `MongoConnection.read_rollup`.
+    """
+
+    def __init__(self, collection: str, date: str = "date", dimensions: Iterable[str] = ()):
+        self.__tablename__ = collection
+        self.__indexes__ = []
+        self.date = date
+        self.dimensions = tuple(dimensions)
+
+    @property
+    def fields(self) -> set[str]:
+        """Fields of the documents of the model that determine their key"""
+        return {self.date, *self.dimensions}
+
+    def key(self, document: dict) -> dict:
+        """Key of the counts including the document, as stored in the `_id` of the counts"""
+        date = document.get(self.date)
+        if isinstance(date, datetime):
+            date = date.astimezone(timezone.utc).replace(tzinfo=None) if date.tzinfo else date
+            date = datetime(date.year, date.month, date.day)
+        values = (document.get(dimension) for dimension in self.dimensions)
+        return {"day": date, **{d: v.value if isinstance(v, Enum) else v for d, v in zip(self.dimensions, values)}}
+
+    def refresh_pipeline(self, before: Iterable[dict], after: Iterable[dict]) -> None:
+        """Counts are updated from the written documents alone, without reading others"""
+        return None
+
+    def claims(self, before: Iterable[dict], after: Iterable[dict], version: ObjectId) -> list:
+        """Counts are updated only once, so nothing is needed before refreshing them"""
+        return []
+
+    def updates(
+        self, before: Iterable[dict], after: Iterable[dict], refreshed: list[dict] = None, version: ObjectId = None
+    ) -> list[UpdateOne]:
+        """Requests updating the counts when the documents `before` are replaced by those `after` (i.e.,
+        only `after` for insertions and only `before` for deletions)"""
+        deltas = Counter()
+        for document in after:
+            deltas[tuple(self.key(document).items())] += 1
+        for document in before:
+            deltas[tuple(self.key(document).items())] -= 1
+        return [
+            UpdateOne({"_id": dict(key)}, {"$inc": {"count": delta}}, upsert=True) for key, delta in deltas.items() if delta
+        ]
+
+    def rebuild_pipeline(self) -> list[dict]:
+        """Aggregation pipeline over the documents of the model replacing all the counts"""
+        day = {"$dateTrunc": {"date": f"${self.date}", "unit": "day"}}
+        key = {"day": day, **{dimension: {"$ifNull": [f"${dimension}", None]} for dimension in self.dimensions}}
+        return [{"$group": {"_id": key, "count": {"$count": {}}}}, {"$out": self.__tablename__}]
+
+    def pipeline(self, match: dict) -> list[dict]:
+        """Aggregation pipeline over the counts giving the number of documents per day (in `_id` and `day`).
+
+        The conditions in `match` are given for `day` and the dimensions, as they would be given for the
+        documents of the model. Ranges of dates must include whole days for the results to be the same.
+        """
+        match = {f"_id.{field}": condition for field, condition in match.items()}
+        return [
+            {"$match": match},
+            {"$group": {"_id": "$_id.day", "count": {"$sum": "$count"}}},
+            {"$match": {"count": {"$gt": 0}}},  # Counts reach zero when all documents of a key are removed
+            {"$set": {"day": "$_id"}},
+        ]
+
+
+class GroupSummary:
+    """Documents of a model grouped by the field `key` (e.g., a summary for each object), kept in the
+    collection `collection` with the given `indexes`.
+
+    The accumulators of the `$group` stage (other than `_id`) are given in `group`, which can only be `$count`,
+    `$sum`, `$min`, `$max` or `$addToSet` (of a field, or a number for `$sum`). Unlike counts, most of them
+    (e.g., `$min` or `$addToSet`) cannot be undone when documents are removed. Thus, on every write of documents
+    of the model, the connection groups again all the documents with the same keys as those written and replaces
+    their summaries (which requires an index for `key` in the model). Each summary has the key both as `_id` and
+    in the field `key`.
+
+    Writes running concurrently can refresh the same summaries in any order, so that replacing them with the
+    results of an earlier refresh would undo a later one. To avoid it, every write first claims the summaries
+    of its keys (see `claims`), and summaries are only replaced (or removed) by the last write that claimed them,
+    which refreshes them after every other write.
+
+    Like `DailyCount`, it is declared in `__rollups__` and has `__tablename__`, so that it can be read like
+    a model (e.g., with `MongoConnection.read_paginated_documents`).
+    """
+
+    def __init__(self, collection: str, key: str, group: dict, indexes: Iterable[IndexModel] = ()):
+        self.__tablename__ = collection
+        self.__indexes__ = list(indexes)
+        self.key = key
+        self.group = group
+        for field, accumulator in group.items():
+            (operator, expression), *others = accumulator.items()
+            path = isinstance(expression, str) and expression.startswith("$")
+            number = isinstance(expression, (int, float)) and operator == "$sum"
+            if others or operator not in _INCREMENTAL or not (path or number or operator == "$count"):
+                raise ValueError(f"Accumulator of {field} cannot be applied document by document: {accumulator}")
+
+    @property
+    def fields(self) -> set[str]:
+        """Fields of the documents of the model used in their summaries"""
+        return {self.key} | _references(self.group)
+
+    def _keys(self, before: Iterable[dict], after: Iterable[dict]) -> list:
+        return list(dict.fromkeys(_plain(document.get(self.key)) for document in (*before, *after)))
+
+    def _pipeline(self) -> list[dict]:
+        return [{"$group": {"_id": f"${self.key}", **self.group}}, {"$set": {self.key: "$_id"}}]
+
+    def refresh_pipeline(self, before: Iterable[dict], after: Iterable[dict]) -> list[dict] | None:
+        """Aggregation pipeline over the documents of the model giving the summaries of the keys of the
+        documents `before` and `after` a write (none if there are no documents)"""
+        keys = self._keys(before, after)
+        return [{"$match": {self.key: {"$in": keys}}}] + self._pipeline() if keys else None
+
+    def claims(self, before: Iterable[dict], after: Iterable[dict], version: ObjectId) -> list[UpdateOne]:
+        """Requests claiming the summaries of the keys of the documents `before` and `after` a write, applied
+        before refreshing them. These mark the summaries with `version` (in `_version`) and apply the write to
+        them as far as the accumulators allow, i.e., new summaries are complete and the rest are only missing
+        what cannot be undone until they are replaced (see `updates`)"""
+        keys = self._keys(before, after)
+        removed, added = {key: [] for key in keys}, {key: [] for key in keys}
+        for document in before:
+            removed[_plain(document.get(self.key))].append(document)
+        for document in after:
+            added[_plain(document.get(self.key))].append(document)
+        requests = []
+        for key in removed:
+            update = {"$set": {self.key: key, "_version": version}, "$inc": {}, "$min": {}, "$max": {}, "$addToSet": {}}
+            for field, accumulator in self.group.items():
+                (operator, expression), *_ = accumulator.items()
+                if operator == "$count":
+                    update["$inc"][field] = len(added[key]) - len(removed[key])
+                elif operator == "$sum":
+                    update["$inc"][field] = _total(added[key], expression) - _total(removed[key], expression)
+                elif operator == "$addToSet" and added[key]:
+                    update["$addToSet"][field] = {"$each": _values(added[key], expression)}
+                elif values := _values(added[key], expression):
+                    update[operator][field] = min(values) if operator == "$min" else max(values)
+            update = {operator: fields for operator, fields in update.items() if fields}
+            requests.append(UpdateOne({"_id": key}, update, upsert=bool(added[key])))  # Keys are removed by `updates`
+        return requests
+
+    def updates(
+        self, before: Iterable[dict], after: Iterable[dict], refreshed: list[dict] = None, version: ObjectId = None
+    ) -> list:
+        """Requests replacing the summaries of the keys of the documents `before` and `after` a write with
+        those `refreshed` (from `refresh_pipeline`), if they were not claimed by a later write since the
+        `version` of this one. Summaries of keys without documents are removed"""
+        found = {summary["_id"] for summary in refreshed or []}
+        guard = {"_version": version}
+        requests = [ReplaceOne({"_id": summary["_id"], **guard}, {**summary, **guard}) for summary in refreshed or []]
+        return requests + [DeleteOne({"_id": key, **guard}) for key in self._keys(before, after) if key not in found]
+
+    def rebuild_pipeline(self) -> list[dict]:
+        """Aggregation pipeline over the documents of the model replacing all the summaries"""
+        return self._pipeline() + [{"$out": self.__tablename__}]
+
+
+Rollup = DailyCount | GroupSummary
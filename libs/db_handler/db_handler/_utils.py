@@ -1,4 +1,14 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any
+
+import bson
 from bson import ObjectId
+from bson.errors import BSONError
+from bson.raw_bson import RawBSONDocument
 from pydantic import main
 
 
@@ -7,6 +17,74 @@ class DocumentNotFound(ValueError):
         super().__init__(f"Document not found. ID: {oid}")
 
 
+class InvalidCursor(ValueError):
+    def __init__(self, cursor):
+        super().__init__(f"Invalid pagination cursor: {cursor}")
+
+
+class CircuitOpen(RuntimeError):
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Database marked as unreachable. Retry after {retry_after:.0f} seconds")
+
+
+class BulkStatus(str, Enum):
+    """Status of individual documents in bulk operations"""
+
+    inserted = "inserted"
+    updated = "updated"
+    deleted = "deleted"
+    duplicate = "duplicate"
+    invalid = "invalid"
+    not_found = "not_found"
+    skipped = "skipped"
+
+
+def _sorting(order_by, direction) -> dict:
+    return {"order_by": order_by.value if isinstance(order_by, Enum) else order_by, "direction": int(direction)}
+
+
+def encode_cursor(value, oid, order_by, direction) -> str:
+    """Generates an opaque cursor from the value of the sorting field and the ID of a document, along
+    with the sorting (field and direction) of the query it comes from"""
+    document = {"value": value, "id": oid, **_sorting(order_by, direction)}
+    return base64.urlsafe_b64encode(bson.encode(document)).decode()
+
+
+def decode_cursor(cursor: str, order_by, direction) -> tuple:
+    """Recovers the value of the sorting field and the ID of a document from a cursor. Cursors from
+    queries sorted differently are invalid, as the value would be compared with another field"""
+    try:
+        document = bson.decode(base64.urlsafe_b64decode(cursor.encode()))
+        value, oid = document["value"], document["id"]
+        sorting = {"order_by": document["order_by"], "direction": document["direction"]}
+    except (binascii.Error, BSONError, KeyError):
+        raise InvalidCursor(cursor)
+    if sorting != _sorting(order_by, direction):
+        raise InvalidCursor(cursor)
+    return value, oid
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, RawBSONDocument):
+        return bson.decode(value.raw)
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_json(document: Any) -> bytes:
+    """Encodes documents from the database (decoded or as `RawBSONDocument`) as JSON, without validation.
+
+    Object IDs are encoded as strings and dates in ISO format, as done by the schemas of the services.
+    Each `RawBSONDocument` is still decoded (by the C extension of `bson`) right before being encoded, so
+    what is saved is building and validating the models of the documents, not decoding them.
+    """
+    return json.dumps(document, default=_json_default, separators=(",", ":")).encode()
+
+
 class PyObjectId(ObjectId):
     """Custom type to allow for bson's ObjectId to be declared as types in pydantic models"""
 
@@ -31,7 +109,9 @@ class ModelMetaclass(main.ModelMetaclass):
 
     The model is expected to have `__tablename__` as a class property, defining the
     name of the associated collection, and (optionally) `__indexes__`. The latter should
-    be a list of `IndexModel` from pymongo and is used to initialize the indexes.
+    be a list of `IndexModel` from pymongo and is used to initialize the indexes. Models can
+    also define `__rollups__`, a list of counts (e.g., `DailyCount`) kept up to date by the
+    connection.
 
     If a collection name already exists, an error will be raised.
 
@@ -57,6 +137,8 @@ class ModelMetaclass(main.ModelMetaclass):
 
         if not hasattr(cls, "__indexes__"):
             cls.__indexes__ = []
+        if not hasattr(cls, "__rollups__"):
+            cls.__rollups__ = []
         mcs.__models__.add(cls)
         return cls
 
@@ -0,0 +1,115 @@
+from unittest import mock
+
+import pytest
+from pymongo.read_preferences import SecondaryPreferred
+
+from db_handler import MongoConnection, QueryCache
+
+
+def test_key_is_independent_of_pipeline_instance():
+    first = QueryCache.key("tablename", [{"$match": {"field": 1}}])
+    second = QueryCache.key("tablename", [{"$match": {"field": 1}}])
+    assert first == second
+
+
+def test_key_depends_on_collection_and_pipeline():
+    key = QueryCache.key("tablename", [{"$match": {"field": 1}}])
+    assert key != QueryCache.key("other", [{"$match": {"field": 1}}])
+    assert key != QueryCache.key("tablename", [{"$match": {"field": 2}}])
+
+
+def test_key_depends_on_read_preference():
+    key = QueryCache.key("tablename", [])
+    assert key == QueryCache.key("tablename", [], read_preference=None)
+    assert key != QueryCache.key("tablename", [], read_preference=SecondaryPreferred(max_staleness=90))
+
+
+def test_get_missing_key_returns_none():
+    assert QueryCache().get(QueryCache.key("tablename", [])) is None
+
+
+def test_set_and_get_results():
+    cache, key = QueryCache(), QueryCache.key("tablename", [])
+    cache.set(key, [{"a": 1}], cache.generation("tablename"))
+    assert cache.get(key) == [{"a": 1}]
+
+
+@mock.patch('db_handler._cache.time')
+def test_expired_results_are_discarded(mock_time):
+    cache, key = QueryCache(ttl=10), QueryCache.key("tablename", [])
+
+    mock_time.monotonic.return_value = 0
+    cache.set(key, [{"a": 1}], 0)
+    mock_time.monotonic.return_value = 11
+    assert cache.get(key) is None
+
+
+def test_least_recently_used_results_are_discarded_when_full():
+    cache = QueryCache(maxsize=2)
+    keys = [QueryCache.key("tablename", [{"$match": {"field": i}}]) for i in range(3)]
+
+    cache.set(keys[0], [0], 0)
+    cache.set(keys[1], [1], 0)
+    cache.get(keys[0])
+    cache.set(keys[2], [2], 0)
+    assert cache.get(keys[0]) == [0]
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) == [2]
+
+
+def test_invalidate_discards_only_entries_of_collection():
+    cache, key, other = QueryCache(), QueryCache.key("tablename", []), QueryCache.key("other", [])
+    cache.set(key, [1], 0)
+    cache.set(other, [2], 0)
+
+    cache.invalidate("tablename")
+    assert cache.get(key) is None
+    assert cache.get(other) == [2]
+
+
+def test_results_of_queries_started_before_invalidation_are_not_stored():
+    cache, key = QueryCache(), QueryCache.key("tablename", [])
+    generation = cache.generation("tablename")
+
+    cache.invalidate("tablename")
+    cache.set(key, [1], generation)
+    assert cache.get(key) is None
+
+
+async def get_cached_connection(mock_client):
+    mock_db = mock.MagicMock()
+    mock_client.return_value.__getitem__.return_value = mock_db
+    mock_db.__getitem__.return_value.aggregate.return_value.to_list = mock.AsyncMock(return_value=[{"total": 2}])
+
+    conn = MongoConnection(mock.MagicMock(), cache=QueryCache())
+    await conn.connect()
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+    mock_query = mock.MagicMock()
+    mock_query.count_pipeline.return_value = [{"$count": "total"}]
+    return conn, mock_db, mock_model, mock_query
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_connection_reuses_cached_results(mock_client):
+    conn, mock_db, mock_model, mock_query = await get_cached_connection(mock_client)
+
+    assert await conn.count_documents(mock_model, mock_query) == 2
+    assert await conn.count_documents(mock_model, mock_query) == 2
+    mock_db.__getitem__.return_value.aggregate.assert_called_once()
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_connection_writes_invalidate_cached_results(mock_client):
+    conn, mock_db, mock_model, mock_query = await get_cached_connection(mock_client)
+    mock_db.__getitem__.return_value.delete_one = mock.AsyncMock()
+
+    await conn.count_documents(mock_model, mock_query)
+    await conn.delete_document(mock_model, "id")
+    await conn.count_documents(mock_model, mock_query)
+    assert mock_db.__getitem__.return_value.aggregate.call_count == 2
@@ -0,0 +1,101 @@
+from unittest import mock
+
+import pytest
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from db_handler import ChangeNotifier, MongoConnection, QueryCache
+from .. import utils
+
+
+def test_notifier_sends_collection_to_all_listeners():
+    notifier, first, second = ChangeNotifier(), mock.MagicMock(), mock.MagicMock()
+    notifier.add_listener(first)
+    notifier.add_listener(second)
+
+    notifier.notify("tablename")
+    first.assert_called_once_with("tablename")
+    second.assert_called_once_with("tablename")
+
+
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+def test_connection_registers_query_cache_as_listener():
+    cache = QueryCache()
+    key = cache.key("tablename", [])
+    cache.set(key, [1], 0)
+
+    conn = MongoConnection(mock.MagicMock(), cache=cache)
+    conn.notifier.notify("tablename")
+    assert cache.get(key) is None
+
+
+def mock_stream(*events, error=None):
+    async def iterate():
+        for event in events:
+            yield event
+        if error:
+            raise error
+
+    stream = mock.MagicMock()
+    stream.__aenter__ = mock.AsyncMock(return_value=iterate())
+    stream.__aexit__ = mock.AsyncMock(return_value=False)
+    return stream
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_watch_changes_notifies_every_event(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.watch.side_effect = [
+        mock_stream({"operationType": "insert"}, {"operationType": "delete"}),
+        mock_stream(error=OperationFailure("not supported", code=40573)),
+    ]
+    listener = mock.MagicMock()
+    conn.notifier.add_listener(listener)
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+    await conn.watch_changes(mock_model, retry_after=0)
+
+    assert listener.call_count == 2
+    listener.assert_called_with("tablename")
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_watch_changes_notifies_and_reopens_stream_after_interruption(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.watch.side_effect = [
+        mock_stream(error=AutoReconnect()),
+        mock_stream(error=OperationFailure("not supported", code=40573)),
+    ]
+    listener = mock.MagicMock()
+    conn.notifier.add_listener(listener)
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+    await conn.watch_changes(mock_model, retry_after=0)
+
+    listener.assert_called_once_with("tablename")
+    assert mock_db.__getitem__.return_value.watch.call_count == 2
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_watch_changes_notifies_rollups_of_the_model(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.watch.side_effect = [
+        mock_stream({"operationType": "insert"}),
+        mock_stream(error=OperationFailure("not supported", code=40573)),
+    ]
+    listener = mock.MagicMock()
+    conn.notifier.add_listener(listener)
+
+    mock_model, mock_rollup = mock.MagicMock(), mock.MagicMock()
+    mock_model.__tablename__, mock_rollup.__tablename__ = "tablename", "rollup"
+    mock_model.__rollups__ = [mock_rollup]
+    await conn.watch_changes(mock_model, retry_after=0)
+
+    assert listener.call_args_list == [mock.call("tablename"), mock.call("rollup")]
@@ -0,0 +1,148 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from pymongo.read_preferences import SecondaryPreferred
+
+from db_handler import MongoConnection, ReadCoalescer
+
+
+def blocked_read(release: asyncio.Event) -> mock.AsyncMock:
+    """Read that finishes (returning `True`) only once `release` is set"""
+    async def read():
+        return await release.wait()
+
+    return mock.AsyncMock(side_effect=read)
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_reads_are_coalesced():
+    coalescer, release = ReadCoalescer(), asyncio.Event()
+    read = blocked_read(release)
+
+    tasks = [asyncio.ensure_future(coalescer.run(("tablename", "key"), read)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    read.assert_awaited_once()
+    assert results == [True] * 3
+    assert (coalescer.reads, coalescer.coalesced) == (3, 2)
+    assert coalescer.ratio == pytest.approx(2 / 3)
+
+
+@pytest.mark.asyncio
+async def test_reads_with_different_keys_are_not_coalesced():
+    coalescer = ReadCoalescer()
+    read = mock.AsyncMock(return_value=[])
+
+    await asyncio.gather(coalescer.run(("tablename", "key"), read), coalescer.run(("tablename", "other"), read))
+    assert read.await_count == 2
+    assert coalescer.coalesced == 0
+
+
+@pytest.mark.asyncio
+async def test_sequential_reads_are_not_coalesced():
+    coalescer = ReadCoalescer()
+    read = mock.AsyncMock(return_value=[])
+
+    await coalescer.run(("tablename", "key"), read)
+    await coalescer.run(("tablename", "key"), read)
+    assert read.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidated_reads_are_not_shared_with_later_reads():
+    coalescer, release = ReadCoalescer(), asyncio.Event()
+    read = blocked_read(release)
+
+    first = asyncio.ensure_future(coalescer.run(("tablename", "key"), read))
+    await asyncio.sleep(0)
+    coalescer.invalidate("tablename")
+    second = asyncio.ensure_future(coalescer.run(("tablename", "key"), read))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(first, second)
+
+    assert read.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_by_coalesced_reads():
+    coalescer, release = ReadCoalescer(), asyncio.Event()
+
+    async def read():
+        await release.wait()
+        raise RuntimeError
+
+    tasks = [asyncio.ensure_future(coalescer.run(("tablename", "key"), read)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_connection_coalesces_identical_aggregations(mock_client):
+    mock_db, release = mock.MagicMock(), asyncio.Event()
+    mock_client.return_value.__getitem__.return_value = mock_db
+
+    async def to_list(length):
+        await release.wait()
+        return [{"total": 2}]
+
+    mock_db.__getitem__.return_value.aggregate.return_value.to_list = to_list
+    conn = MongoConnection(mock.MagicMock(), coalescer=ReadCoalescer())
+    await conn.connect()
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+    mock_query = mock.MagicMock()
+    mock_query.count_pipeline.return_value = [{"$count": "total"}]
+
+    tasks = [asyncio.ensure_future(conn.count_documents(mock_model, mock_query)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*tasks) == [2, 2]
+    mock_db.__getitem__.return_value.aggregate.assert_called_once()
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_connection_does_not_coalesce_aggregations_with_different_read_preferences(mock_client):
+    mock_db, release = mock.MagicMock(), asyncio.Event()
+    mock_client.return_value.__getitem__.return_value = mock_db
+
+    async def to_list(length):
+        await release.wait()
+        return [{"total": 2}]
+
+    mock_db.__getitem__.return_value.aggregate.return_value.to_list = to_list
+    mock_db.__getitem__.return_value.with_options.return_value.aggregate.return_value.to_list = to_list
+    conn = MongoConnection(mock.MagicMock(), coalescer=ReadCoalescer())
+    await conn.connect()
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+    mock_query = mock.MagicMock()
+    mock_query.count_pipeline.return_value = [{"$count": "total"}]
+
+    preferences = [None, SecondaryPreferred(max_staleness=90)]
+    tasks = [asyncio.ensure_future(conn.count_documents(mock_model, mock_query, read_preference=p)) for p in preferences]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*tasks) == [2, 2]
+    assert (conn.coalescer.reads, conn.coalescer.coalesced) == (2, 0)
+
+
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+def test_connection_registers_coalescer_as_listener():
+    coalescer = ReadCoalescer()
+    coalescer._running[("tablename", "key")] = mock.MagicMock()
+
+    conn = MongoConnection(mock.MagicMock(), coalescer=coalescer)
+    conn.notifier.notify("tablename")
+    assert coalescer._running == {}
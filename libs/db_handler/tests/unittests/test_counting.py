@@ -0,0 +1,126 @@
+from unittest import mock
+
+import pytest
+
+from db_handler import ApproximateCount, ExactCount
+
+
+def get_mocks(pipeline):
+    conn = mock.MagicMock()
+    conn.count_documents = mock.AsyncMock()
+    conn.count_documents.return_value = 5
+    conn._collection.return_value.estimated_document_count = mock.AsyncMock()
+    conn._collection.return_value.estimated_document_count.return_value = 10
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    mock_query = mock.MagicMock()
+    mock_query.count_pipeline.return_value = pipeline
+    return conn, mock_model, mock_query
+
+
+@pytest.mark.asyncio
+async def test_exact_count_counts_using_connection():
+    conn, mock_model, mock_query = get_mocks([{"$match": {}}, {"$count": "total"}])
+
+    assert await ExactCount().count(conn, mock_model, mock_query) == (5, True)
+    conn.count_documents.assert_awaited_once_with(mock_model, mock_query, read_preference=None)
+
+
+@pytest.mark.asyncio
+async def test_approximate_count_estimates_unfiltered_queries():
+    conn, mock_model, mock_query = get_mocks([{"$match": {}}, {"$count": "total"}])
+
+    assert await ApproximateCount().count(conn, mock_model, mock_query) == (10, False)
+    conn._collection.assert_called_with(mock_model, None)
+    conn.count_documents.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_approximate_count_estimates_unfiltered_queries_with_projection():
+    conn, mock_model, mock_query = get_mocks([{"$match": {}}, {"$project": {"field": 1}}, {"$count": "total"}])
+
+    assert await ApproximateCount().count(conn, mock_model, mock_query) == (10, False)
+    conn.count_documents.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_approximate_count_counts_grouped_queries():
+    conn, mock_model, mock_query = get_mocks([{"$match": {}}, {"$group": {"_id": "$field"}}, {"$count": "total"}])
+
+    assert await ApproximateCount().count(conn, mock_model, mock_query) == (5, True)
+    conn.count_documents.assert_awaited_once_with(mock_model, mock_query, read_preference=None)
+
+
+@pytest.mark.asyncio
+async def test_approximate_count_counts_filtered_queries_exactly_the_first_time():
+    conn, mock_model, mock_query = get_mocks([{"$match": {"field": 1}}, {"$count": "total"}])
+
+    assert await ApproximateCount().count(conn, mock_model, mock_query) == (5, True)
+    conn.count_documents.assert_awaited_once_with(mock_model, mock_query, read_preference=None)
+
+
+@pytest.mark.asyncio
+async def test_approximate_count_reuses_totals_of_identical_queries():
+    conn, mock_model, mock_query = get_mocks([{"$match": {"field": 1}}, {"$count": "total"}])
+    counter = ApproximateCount()
+
+    await counter.count(conn, mock_model, mock_query)
+    assert await counter.count(conn, mock_model, mock_query) == (5, False)
+    conn.count_documents.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_approximate_count_does_not_reuse_totals_of_different_queries():
+    conn, mock_model, mock_query = get_mocks([{"$match": {"field": 1}}, {"$count": "total"}])
+    counter = ApproximateCount()
+
+    await counter.count(conn, mock_model, mock_query)
+    mock_query.count_pipeline.return_value = [{"$match": {"field": 2}}, {"$count": "total"}]
+    assert await counter.count(conn, mock_model, mock_query) == (5, True)
+    assert conn.count_documents.await_count == 2
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._counting.time')
+async def test_approximate_count_recounts_after_expiration(mock_time):
+    conn, mock_model, mock_query = get_mocks([{"$match": {"field": 1}}, {"$count": "total"}])
+    counter = ApproximateCount(ttl=10)
+
+    mock_time.monotonic.return_value = 0
+    await counter.count(conn, mock_model, mock_query)
+    mock_time.monotonic.return_value = 11
+    assert await counter.count(conn, mock_model, mock_query) == (5, True)
+    assert conn.count_documents.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_approximate_count_discards_oldest_totals_when_full():
+    conn, mock_model, mock_query = get_mocks([{"$match": {"field": 1}}, {"$count": "total"}])
+    counter = ApproximateCount(maxsize=1)
+
+    await counter.count(conn, mock_model, mock_query)
+    mock_query.count_pipeline.return_value = [{"$match": {"field": 2}}, {"$count": "total"}]
+    await counter.count(conn, mock_model, mock_query)
+    mock_query.count_pipeline.return_value = [{"$match": {"field": 1}}, {"$count": "total"}]
+    assert await counter.count(conn, mock_model, mock_query) == (5, True)
+    assert conn.count_documents.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_exact_count_passes_along_read_preference():
+    conn, mock_model, mock_query = get_mocks([{"$match": {}}, {"$count": "total"}])
+    read_preference = mock.MagicMock()
+
+    await ExactCount().count(conn, mock_model, mock_query, read_preference=read_preference)
+    conn.count_documents.assert_awaited_once_with(mock_model, mock_query, read_preference=read_preference)
+
+
+@pytest.mark.asyncio
+async def test_approximate_count_estimates_with_read_preference():
+    conn, mock_model, mock_query = get_mocks([{"$match": {}}, {"$count": "total"}])
+    read_preference = mock.MagicMock()
+
+    await ApproximateCount().count(conn, mock_model, mock_query, read_preference=read_preference)
+    conn._collection.assert_called_with(mock_model, read_preference)
@@ -0,0 +1,112 @@
+from enum import Enum
+from unittest import mock
+
+import pytest
+from fastapi import Query
+from pydantic import dataclasses
+from query import BasePaginatedQuery, BaseQuery, QueryRecipe
+
+from db_handler import advise_indexes, query_combinations
+
+
+class MockFields(str, Enum):
+    date = "date"
+    name = "name"
+
+
+@dataclasses.dataclass
+class MockSortedQuery(BasePaginatedQuery):
+    order_by: MockFields = Query(MockFields.date)
+    owner: str | None = Query(None)
+    date_after: int | None = Query(None)
+
+    recipes = (QueryRecipe("owner", ["$eq"], ["owner"]), QueryRecipe("date", ["$gte"], ["date_after"]))
+
+
+@dataclasses.dataclass
+class MockQuery(BaseQuery):
+    owner: str | None = Query(None)
+
+    recipes = (QueryRecipe("owner", ["$eq"], ["owner"]),)
+
+
+SAMPLES = {"owner": "owner", "date_after": 1}
+
+
+def explain(*stages):
+    plan = {}
+    for stage in reversed(stages):
+        plan = {"stage": stage, "inputStage": plan} if plan else {"stage": stage}
+    return {"queryPlanner": {"winningPlan": plan, "rejectedPlans": [{"stage": "COLLSCAN"}]}}
+
+
+def test_query_combinations_include_all_subsets_of_recipes_and_sorting_fields():
+    queries = query_combinations(MockSortedQuery, SAMPLES)
+    combinations = {(q.owner, q.date_after, q.order_by) for q in queries}
+
+    assert len(queries) == 8
+    assert combinations == {
+        (owner, date, sort) for owner in (None, "owner") for date in (None, 1) for sort in MockFields
+    }
+
+
+def test_query_combinations_for_unsorted_queries():
+    queries = query_combinations(MockQuery, SAMPLES)
+    assert [q.owner for q in queries] == [None, "owner"]
+
+
+@pytest.mark.asyncio
+async def test_advise_indexes_reports_no_suggestion_when_indexes_are_used():
+    connection = mock.MagicMock()
+    connection.db.command = mock.AsyncMock(return_value=explain("FETCH", "IXSCAN"))
+    model = mock.MagicMock()
+    model.__tablename__ = "tablename"
+
+    advice = await advise_indexes(connection, model, MockQuery, SAMPLES)
+
+    assert len(advice) == 2
+    assert all(item.ok for item in advice)
+    assert advice[1].filters == ("owner",)
+    assert advice[1].stages == ["FETCH", "IXSCAN"]
+    command = {"aggregate": "tablename", "pipeline": [{"$match": {"owner": {"$eq": "owner"}}}], "cursor": {}}
+    connection.db.command.assert_awaited_with({"explain": command, "verbosity": "queryPlanner"})
+
+
+@pytest.mark.asyncio
+async def test_advise_indexes_suggests_equality_sort_range_index():
+    connection = mock.MagicMock()
+    connection.db.command = mock.AsyncMock(return_value=explain("SORT", "COLLSCAN"))
+    model = mock.MagicMock()
+    model.__tablename__ = "tablename"
+
+    advice = await advise_indexes(connection, model, MockSortedQuery, SAMPLES)
+    (item,) = [a for a in advice if a.filters == ("owner", "date") and a.sort == "name"]
+
+    assert item.collscan and item.in_memory_sort
+    assert item.suggestion.document["key"] == {"owner": 1, "name": -1, "date": 1}
+
+
+@pytest.mark.asyncio
+async def test_advise_indexes_does_not_repeat_sorting_field_in_suggestion():
+    connection = mock.MagicMock()
+    connection.db.command = mock.AsyncMock(return_value=explain("SORT", "COLLSCAN"))
+    model = mock.MagicMock()
+    model.__tablename__ = "tablename"
+
+    advice = await advise_indexes(connection, model, MockSortedQuery, SAMPLES)
+    (item,) = [a for a in advice if a.filters == ("date",) and a.sort == "date"]
+
+    assert item.suggestion.document["key"] == {"date": -1}
+
+
+@pytest.mark.asyncio
+async def test_advise_indexes_without_filters_or_sort_has_no_suggestion():
+    connection = mock.MagicMock()
+    connection.db.command = mock.AsyncMock(return_value=explain("COLLSCAN"))
+    model = mock.MagicMock()
+    model.__tablename__ = "tablename"
+
+    advice = await advise_indexes(connection, model, MockQuery, SAMPLES)
+
+    assert advice[0].collscan
+    assert advice[0].ok
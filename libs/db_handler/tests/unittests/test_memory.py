@@ -0,0 +1,268 @@
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import ClassVar
+
+import pytest
+from bson.raw_bson import RawBSONDocument
+from pydantic import BaseModel, Field, dataclasses
+from pymongo import IndexModel, UpdateOne
+from pymongo.errors import OperationFailure
+from query import BasePaginatedQuery, QueryRecipe, optimize
+
+from db_handler import BulkStatus, DocumentNotFound, InMemoryConnection, PyObjectId
+
+
+class Item(BaseModel):  # Not using the metaclass avoids registering the collection for every test
+    __tablename__ = "items"
+    __indexes__ = [IndexModel([("name", 1)], unique=True)]
+
+    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    name: str
+    group: str
+    date: datetime
+
+
+class ItemFields(str, Enum):
+    name = "name"
+    date = "date"
+
+
+@dataclasses.dataclass
+class ItemQuery(BasePaginatedQuery):
+    order_by: ItemFields = ItemFields.date
+    group: str | None = None
+
+    recipes: ClassVar[tuple[QueryRecipe]] = (QueryRecipe("group", ["$eq"], ["group"]),)
+
+
+start = datetime(2023, 1, 1, 12)
+items = [
+    {"name": f"item{i}", "group": "even" if i % 2 == 0 else "odd", "date": start + timedelta(hours=9 * i)} for i in range(10)
+]
+
+
+async def connection_with_items() -> InMemoryConnection:
+    conn = InMemoryConnection()
+    await conn.connect()
+    await conn.db[Item.__tablename__].create_indexes(Item.__indexes__)
+    await conn.create_documents(Item, items)
+    return conn
+
+
+@pytest.mark.asyncio
+async def test_create_read_update_and_delete_document():
+    conn = InMemoryConnection()
+    await conn.connect()
+    document = await conn.create_document(Item, items[0])
+
+    assert await conn.read_document(Item, str(document["_id"])) == document
+    updated = await conn.update_document(Item, str(document["_id"]), {"group": "other"})
+    assert updated == {**document, "group": "other"}
+
+    await conn.delete_document(Item, str(document["_id"]))
+    with pytest.raises(DocumentNotFound):
+        await conn.read_document(Item, str(document["_id"]))
+
+
+@pytest.mark.asyncio
+async def test_bulk_write_supports_accumulating_update_operators():
+    conn = InMemoryConnection()
+    await conn.connect()
+    collection = conn.db["summaries"]
+    update = {"$min": {"first": 5}, "$max": {"last": 5}, "$addToSet": {"values": {"$each": [5, 1, 5]}}}
+
+    await collection.bulk_write([UpdateOne({"_id": "key"}, update, upsert=True)])
+    assert await collection.find_one({"_id": "key"}) == {"_id": "key", "first": 5, "last": 5, "values": [5, 1]}
+    update = {"$min": {"first": 3}, "$max": {"last": 3}, "$addToSet": {"values": 3}}
+    await collection.bulk_write([UpdateOne({"_id": "key"}, update)])
+    assert await collection.find_one({"_id": "key"}) == {"_id": "key", "first": 3, "last": 5, "values": [5, 1, 3]}
+
+
+@pytest.mark.asyncio
+async def test_create_documents_reports_duplicates_in_unique_indexes():
+    conn = await connection_with_items()
+
+    report = await conn.create_documents(Item, [items[0], {**items[0], "name": "new"}])
+
+    assert [item["status"] for item in report] == [BulkStatus.duplicate, BulkStatus.inserted]
+    assert "index: name_1" in report[0]["detail"]
+
+
+@pytest.mark.asyncio
+async def test_update_documents_reports_duplicates_in_unique_indexes():
+    conn = await connection_with_items()
+    (first, second) = await conn.read_multiple_documents(Item, ItemQuery(page_size=2, direction=1))
+
+    updates = [(str(first["_id"]), {"name": "item9"}), (str(second["_id"]), {"group": "x"})]
+    report = await conn.update_documents(Item, updates)
+
+    assert [item["status"] for item in report] == [BulkStatus.duplicate, BulkStatus.updated]
+    assert (await conn.read_document(Item, str(second["_id"])))["group"] == "x"
+
+
+@pytest.mark.asyncio
+async def test_read_paginated_documents_filters_sorts_and_skips():
+    conn = await connection_with_items()
+
+    page = await conn.read_paginated_documents(Item, ItemQuery(group="even", page=2, page_size=2))
+
+    assert page["count"] == 5
+    assert (page["next"], page["previous"]) == (3, 1)
+    assert [document["name"] for document in page["results"]] == ["item4", "item2"]
+
+
+@pytest.mark.asyncio
+async def test_read_paginated_documents_by_keyset_returns_every_document_once():
+    conn = await connection_with_items()
+    names, q = [], ItemQuery(page_size=3, cursor="", order_by=ItemFields.name, direction=1)
+
+    while True:
+        page = await conn.read_paginated_documents(Item, q)
+        names += [document["name"] for document in page["results"]]
+        if page["next_cursor"] is None:
+            break
+        q = ItemQuery(page_size=3, cursor=page["next_cursor"], order_by=ItemFields.name, direction=1)
+
+    assert names == sorted(item["name"] for item in items)
+
+
+@pytest.mark.asyncio
+async def test_stream_documents_with_cursor_gives_page_after_it():
+    conn = await connection_with_items()
+    first = await conn.read_paginated_documents(Item, ItemQuery(page_size=3, cursor="", order_by=ItemFields.name))
+    q = ItemQuery(page_size=3, cursor=first["next_cursor"], order_by=ItemFields.name)
+
+    streamed = [document["name"] async for document in conn.stream_documents(Item, q)]
+
+    assert streamed == [document["name"] for document in (await conn.read_paginated_documents(Item, q))["results"]]
+    assert streamed == ["item6", "item5", "item4"]
+
+
+@pytest.mark.asyncio
+async def test_read_paginated_documents_with_facet():
+    conn = await connection_with_items()
+
+    page = await conn.read_paginated_documents(Item, ItemQuery(group="odd", page_size=2), facet=True)
+
+    assert page["count"] == 5
+    assert [document["name"] for document in page["results"]] == ["item9", "item7"]
+
+
+@pytest.mark.asyncio
+async def test_read_paginated_documents_as_raw_bson():
+    conn = await connection_with_items()
+
+    page = await conn.read_paginated_documents(Item, ItemQuery(page_size=1), raw=True)
+
+    assert isinstance(page["results"][0], RawBSONDocument)
+    assert page["results"][0]["name"] == "item9"
+
+
+@pytest.mark.asyncio
+async def test_aggregate_groups_by_truncated_date():
+    conn = await connection_with_items()
+    pipeline = [
+        {"$match": {"date": {"$gte": start + timedelta(hours=12)}}},
+        {
+            "$group": {
+                "_id": {"$dateTrunc": {"date": "$date", "unit": "day"}},
+                "groups": {"$addToSet": "$group"},
+                "first": {"$min": "$name"},
+                "count": {"$count": {}},
+            }
+        },
+        {"$set": {"day": "$_id"}},
+        {"$sort": {"day": 1}},
+        {"$limit": 2},
+    ]
+
+    results = await conn._aggregate(Item, pipeline)
+
+    assert results == [
+        {"_id": datetime(2023, 1, 2), "groups": ["even", "odd"], "first": "item2", "count": 2, "day": datetime(2023, 1, 2)},
+        {"_id": datetime(2023, 1, 3), "groups": ["even", "odd"], "first": "item4", "count": 3, "day": datetime(2023, 1, 3)},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_aggregate_limits_and_merges_arrays():
+    conn = await connection_with_items()
+    pipeline = [
+        {
+            "$group": {
+                "_id": "$group",
+                "last": {"$topN": {"n": 2, "sortBy": {"date": -1}, "output": "$name"}},
+                "names": {"$push": ["$name"]},
+            }
+        },
+        {"$set": {"names": {"$reduce": {"input": "$names", "initialValue": [], "in": {"$setUnion": ["$$value", "$$this"]}}}}},
+        {"$set": {"first": {"$slice": [{"$sortArray": {"input": "$names", "sortBy": -1}}, 1]}}},
+        {"$set": {"many": {"$or": [{"$gt": [{"$size": "$names"}, 4]}, False]}}},
+        {"$unset": "names"},
+        {"$sort": {"_id": 1}},
+    ]
+
+    results = await conn._aggregate(Item, pipeline)
+
+    assert results == [
+        {"_id": "even", "last": ["item8", "item6"], "first": ["item8"], "many": True},
+        {"_id": "odd", "last": ["item9", "item7"], "first": ["item9"], "many": True},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_aggregate_top_n_sorts_by_dotted_fields_in_each_direction():
+    conn = await connection_with_items()
+    pipeline = [
+        {"$group": {"_id": {"group": "$group", "name": "$name"}}},
+        {"$group": {"_id": None, "top": {"$topN": {"n": 3, "sortBy": {"_id.group": 1, "_id.name": -1}, "output": "$_id.name"}}}},
+    ]
+
+    results = await conn._aggregate(Item, pipeline)
+
+    assert results == [{"_id": None, "top": ["item8", "item6", "item4"]}]
+
+
+@pytest.mark.asyncio
+async def test_optimized_pipelines_give_same_results_with_fewer_stages():
+    conn = await connection_with_items()
+    group = {"$group": {"_id": "$group", "last": {"$max": "$date"}, "count": {"$count": {}}}}
+    after = {"name": {"$gt": "even"}, "$or": [{"name": {"$gt": "even"}}, {"_id": {"$gt": "even"}}]}
+    by_group = [{"$match": {}}, group, {"$set": {"name": "$_id"}}, {"$match": after}, {"$sort": {"name": 1}}, {"$skip": 0}]
+    counted = [{"$sort": {"date": 1}}, {"$set": {"day": "$date"}}, {"$match": {"day": {"$gte": start}}}, {"$count": "total"}]
+    early = {"$match": {"date": {"$lt": start + timedelta(days=2)}}}
+    sorted_group = [{"$sort": {"date": -1}}, early, group, {"$sort": {"_id": 1}}]
+
+    for pipeline in [by_group, counted, sorted_group]:
+        optimized = optimize(pipeline)
+        assert await conn._aggregate(Item, optimized) == await conn._aggregate(Item, pipeline)
+        assert len(optimized) < len(pipeline)
+    assert optimize(by_group)[0] == {"$match": {"group": {"$gt": "even"}, "$or": [{"group": {"$gt": "even"}}] * 2}}
+    assert optimize(counted) == [{"$match": {"date": {"$gte": start}}}, {"$count": "total"}]
+
+
+@pytest.mark.asyncio
+async def test_aggregate_fails_with_unsupported_stage():
+    conn = await connection_with_items()
+
+    with pytest.raises(OperationFailure):
+        await conn._aggregate(Item, [{"$lookup": {"from": "other"}}])
+
+
+@pytest.mark.asyncio
+async def test_documents_are_kept_after_reconnecting():
+    conn = await connection_with_items()
+    await conn.close()
+    await conn.connect()
+
+    assert await conn.count_documents(Item, ItemQuery()) == len(items)
+
+
+@pytest.mark.asyncio
+async def test_ping_and_watch_changes():
+    conn = InMemoryConnection()
+    assert await conn.ping() is False
+
+    await conn.connect()
+    assert await conn.ping() is True
+    await conn.watch_changes(Item)  # Returns immediately, as with standalone servers
@@ -1,8 +1,17 @@
+import json
+from datetime import datetime
 from unittest import mock
 
+import bson
 import pytest
-
-from db_handler import PyObjectId, DocumentNotFound
+from bson.raw_bson import RawBSONDocument
+from pydantic import BaseModel, Field
+from pymongo import DeleteOne, IndexModel, UpdateOne
+from pymongo.read_preferences import SecondaryPreferred
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+from db_handler import BulkStatus, PyObjectId, DocumentNotFound, InvalidCursor, encode_json
+from db_handler._utils import decode_cursor, encode_cursor
 from .. import utils
 
 
@@ -13,18 +22,79 @@ from .. import utils
 async def test_create_db_for_collection_with_indexes(mock_client, mock_model_meta):
     conn, mock_db = await utils.get_connection_and_db(mock_client)
     mock_db.__getitem__.return_value.create_indexes = mock.AsyncMock()
+    mock_db.__getitem__.return_value.list_indexes.return_value.__aiter__.return_value = [{"name": "_id_"}]
 
     mock_model = mock.MagicMock()
     mock_model.__tablename__ = "tablename"
-    mock_model.__indexes__ = mock.MagicMock()
+    mock_model.__indexes__ = [IndexModel([("field", 1)])]
     mock_model_meta.__models__ = [mock_model]
 
     await conn.create_db()
 
-    mock_db.__getitem__.assert_called_once_with(mock_model.__tablename__)
+    mock_db.__getitem__.assert_called_with(mock_model.__tablename__)
     mock_db.__getitem__.return_value.create_indexes.assert_awaited_once_with(mock_model.__indexes__)
 
 
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection.ModelMetaclass')
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_create_db_only_creates_missing_indexes(mock_client, mock_model_meta):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.create_indexes = mock.AsyncMock()
+    existing = [{"name": "_id_"}, {"name": "field_1"}]
+    mock_db.__getitem__.return_value.list_indexes.return_value.__aiter__.return_value = existing
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+    mock_model.__indexes__ = [IndexModel([("field", 1)]), IndexModel([("other", -1)])]
+    mock_model_meta.__models__ = [mock_model]
+
+    await conn.create_db()
+
+    mock_db.__getitem__.return_value.create_indexes.assert_awaited_once_with([mock_model.__indexes__[1]])
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection.ModelMetaclass')
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_create_db_does_nothing_if_all_indexes_exist(mock_client, mock_model_meta):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.create_indexes = mock.AsyncMock()
+    mock_db.__getitem__.return_value.list_indexes.return_value.__aiter__.return_value = [{"name": "field_1"}]
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+    mock_model.__indexes__ = [IndexModel([("field", 1)])]
+    mock_model_meta.__models__ = [mock_model]
+
+    await conn.create_db()
+
+    mock_db.__getitem__.return_value.create_indexes.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_ping_is_true_if_database_answers(mock_client):
+    conn, _ = await utils.get_connection_and_db(mock_client)
+    conn._client.admin.command = mock.AsyncMock()
+
+    assert await conn.ping() is True
+    conn._client.admin.command.assert_awaited_once_with("ping")
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_ping_is_false_if_database_does_not_answer(mock_client):
+    conn, _ = await utils.get_connection_and_db(mock_client)
+    conn._client.admin.command = mock.AsyncMock(side_effect=ServerSelectionTimeoutError())
+
+    assert await conn.ping() is False
+
+
 @pytest.mark.asyncio
 @mock.patch('db_handler._connection.ModelMetaclass')
 @mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
@@ -95,6 +165,105 @@ async def test_create_document_by_field(mock_client):
     mock_model.return_value.dict.assert_called_once_with(by_alias=False)
 
 
+class MockDocument(BaseModel):
+    __tablename__ = "tablename"
+
+    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    field: int
+
+
+def duplicate_error(*indexes):
+    errors = [{"index": i, "code": 11000, "errmsg": "duplicate"} for i in indexes]
+    return BulkWriteError({"writeErrors": errors})
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_create_documents_inserts_all_valid_documents_at_once(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.insert_many = mock.AsyncMock()
+
+    report = await conn.create_documents(MockDocument, [{"field": 1}, {"field": 2}])
+
+    mock_db.__getitem__.assert_called_with(MockDocument.__tablename__)
+    (inserted,), kwargs = mock_db.__getitem__.return_value.insert_many.await_args
+    assert [document["field"] for document in inserted] == [1, 2]
+    assert kwargs == {"ordered": False}
+    assert [item["status"] for item in report] == [BulkStatus.inserted] * 2
+    assert [item["id"] for item in report] == [document["_id"] for document in inserted]
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_create_documents_does_not_insert_invalid_documents(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.insert_many = mock.AsyncMock()
+
+    report = await conn.create_documents(MockDocument, [{"field": "invalid"}, {"field": 2}, "invalid"])
+
+    (inserted,), _ = mock_db.__getitem__.return_value.insert_many.await_args
+    assert [document["field"] for document in inserted] == [2]
+    assert [item["status"] for item in report] == [BulkStatus.invalid, BulkStatus.inserted, BulkStatus.invalid]
+    assert report[0]["id"] is None and report[0]["detail"] is not None
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_create_documents_reports_duplicates(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.insert_many = mock.AsyncMock()
+    mock_db.__getitem__.return_value.insert_many.side_effect = duplicate_error(1)
+
+    report = await conn.create_documents(MockDocument, [{"field": "invalid"}, {"field": 2}, {"field": 3}])
+
+    assert [item["status"] for item in report] == [BulkStatus.invalid, BulkStatus.inserted, BulkStatus.duplicate]
+    assert report[2] == {"index": 2, "status": BulkStatus.duplicate, "id": None, "detail": "duplicate"}
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_create_documents_ordered_skips_documents_after_duplicate(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.insert_many = mock.AsyncMock()
+    mock_db.__getitem__.return_value.insert_many.side_effect = duplicate_error(1)
+
+    report = await conn.create_documents(MockDocument, [{"field": 1}, {"field": 2}, {"field": 3}], ordered=True)
+
+    assert mock_db.__getitem__.return_value.insert_many.await_args.kwargs == {"ordered": True}
+    assert [item["status"] for item in report] == [BulkStatus.inserted, BulkStatus.duplicate, BulkStatus.skipped]
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_create_documents_ordered_does_not_send_documents_after_invalid(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.insert_many = mock.AsyncMock()
+
+    report = await conn.create_documents(MockDocument, [{"field": 1}, {"field": "invalid"}, {"field": 3}], ordered=True)
+
+    (inserted,), _ = mock_db.__getitem__.return_value.insert_many.await_args
+    assert [document["field"] for document in inserted] == [1]
+    assert [item["status"] for item in report] == [BulkStatus.inserted, BulkStatus.invalid, BulkStatus.skipped]
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_create_documents_without_valid_documents_does_not_insert(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.insert_many = mock.AsyncMock()
+
+    report = await conn.create_documents(MockDocument, [{"field": "invalid"}])
+
+    mock_db.__getitem__.return_value.insert_many.assert_not_awaited()
+    assert report[0]["status"] == BulkStatus.invalid
+
+
 @pytest.mark.asyncio
 @mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
 @mock.patch('db_handler._connection.AsyncIOMotorClient')
@@ -265,6 +434,90 @@ async def test_delete_document_fails_if_document_not_found(mock_client):
         await conn.delete_document(mock_model, oid)
 
 
+def mock_existing(mock_db, *oids):
+    async_for = mock.AsyncMock()
+    async_for.__aiter__.return_value = [{"_id": oid} for oid in oids]
+    mock_db.__getitem__.return_value.find.return_value = async_for
+    mock_db.__getitem__.return_value.bulk_write = mock.AsyncMock()
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_update_documents_sends_single_bulk_write_for_existing_documents(mock_client):
+    oid = "123456789012345678901234"
+
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_existing(mock_db, PyObjectId(oid), "plain_oid")
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    updates = [(oid, {"field": 1}), ("missing", {"field": 2}), ("plain_oid", {"field": 3})]
+    report = await conn.update_documents(mock_model, updates)
+
+    mock_db.__getitem__.assert_called_with(mock_model.__tablename__)
+    query = {"_id": {"$in": [PyObjectId(oid), "missing", "plain_oid"]}}
+    mock_db.__getitem__.return_value.find.assert_called_once_with(query, {"_id": 1})
+    requests = [UpdateOne({"_id": PyObjectId(oid)}, {"$set": {"field": 1}}), UpdateOne({"_id": "plain_oid"}, {"$set": {"field": 3}})]
+    mock_db.__getitem__.return_value.bulk_write.assert_awaited_once_with(requests, ordered=False)
+    assert [item["status"] for item in report] == [BulkStatus.updated, BulkStatus.not_found, BulkStatus.updated]
+    assert [item["id"] for item in report] == [PyObjectId(oid), "missing", "plain_oid"]
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_update_documents_reports_duplicates(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_existing(mock_db, "oid1", "oid2")
+    mock_db.__getitem__.return_value.bulk_write.side_effect = duplicate_error(1)
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    report = await conn.update_documents(mock_model, [("missing", {}), ("oid1", {}), ("oid2", {})])
+
+    assert [item["status"] for item in report] == [BulkStatus.not_found, BulkStatus.updated, BulkStatus.duplicate]
+    assert report[2]["detail"] == "duplicate"
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_update_documents_without_existing_documents_does_not_write(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_existing(mock_db)
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    report = await conn.update_documents(mock_model, [("missing", {})])
+
+    mock_db.__getitem__.return_value.bulk_write.assert_not_awaited()
+    assert report == [{"index": 0, "status": BulkStatus.not_found, "id": "missing", "detail": None}]
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_delete_documents_sends_single_bulk_write_for_existing_documents(mock_client):
+    oid = "123456789012345678901234"
+
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_existing(mock_db, PyObjectId(oid))
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    report = await conn.delete_documents(mock_model, [oid, "missing"])
+
+    mock_db.__getitem__.assert_called_with(mock_model.__tablename__)
+    mock_db.__getitem__.return_value.find.assert_called_once_with({"_id": {"$in": [PyObjectId(oid), "missing"]}}, {"_id": 1})
+    mock_db.__getitem__.return_value.bulk_write.assert_awaited_once_with([DeleteOne({"_id": PyObjectId(oid)})], ordered=False)
+    assert [item["status"] for item in report] == [BulkStatus.deleted, BulkStatus.not_found]
+
+
 @pytest.mark.asyncio
 @mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
 @mock.patch('db_handler._connection.AsyncIOMotorClient')
@@ -333,6 +586,28 @@ async def test_read_document_list(mock_client):
     mock_db.__getitem__.return_value.aggregate.assert_called_once_with(mock_query.pipeline.return_value)
 
 
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_stream_documents(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+
+    async_for = mock.AsyncMock()
+    async_for.__aiter__.return_value = [{}, {}, {}]
+    mock_db.__getitem__.return_value.aggregate.return_value = async_for
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    mock_query = mock.MagicMock()
+
+    docs = [doc async for doc in conn.stream_documents(mock_model, mock_query, batch_size=2)]
+
+    assert docs == async_for.__aiter__.return_value
+    mock_db.__getitem__.assert_called_with(mock_model.__tablename__)
+    mock_db.__getitem__.return_value.aggregate.assert_called_once_with(mock_query.pipeline.return_value, batchSize=2)
+
+
 @pytest.mark.asyncio
 @mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
 @mock.patch('db_handler._connection.AsyncIOMotorClient')
@@ -346,6 +621,7 @@ async def test_pagination_for_empty_results(mock_client):
     mock_model.__tablename__ = "tablename"
 
     mock_query = mock.MagicMock()
+    mock_query.cursor = None
     mock_query.page = 1
     mock_query.limit = 10
     mock_query.skip = 0
@@ -355,7 +631,7 @@ async def test_pagination_for_empty_results(mock_client):
 
     paginated = await conn.read_paginated_documents(mock_model, mock_query)
 
-    assert paginated == {"count": 0, "next": None, "previous": None, "results": to_list.return_value}
+    assert paginated == {"count": 0, "count_is_exact": True, "next": None, "previous": None, "next_cursor": None, "results": to_list.return_value}
     mock_db.__getitem__.assert_called_with(mock_model.__tablename__)
     mock_db.__getitem__.return_value.aggregate.assert_called_once_with(mock_query.pipeline.return_value)
     to_list.assert_awaited_once_with(mock_query.limit)
@@ -374,6 +650,7 @@ async def test_pagination_first_page(mock_client):
     mock_model.__tablename__ = "tablename"
 
     mock_query = mock.MagicMock()
+    mock_query.cursor = None
     mock_query.page = 1
     mock_query.limit = 10
     mock_query.skip = (mock_query.page - 1) * mock_query.limit
@@ -383,7 +660,7 @@ async def test_pagination_first_page(mock_client):
 
     paginated = await conn.read_paginated_documents(mock_model, mock_query)
 
-    assert paginated == {"count": 30, "next": 2, "previous": None, "results": to_list.return_value}
+    assert paginated == {"count": 30, "count_is_exact": True, "next": 2, "previous": None, "next_cursor": None, "results": to_list.return_value}
     mock_db.__getitem__.assert_called_with(mock_model.__tablename__)
     mock_db.__getitem__.return_value.aggregate.assert_called_once_with(mock_query.pipeline.return_value)
     to_list.assert_awaited_once_with(mock_query.limit)
@@ -402,6 +679,7 @@ async def test_pagination_middle_page(mock_client):
     mock_model.__tablename__ = "tablename"
 
     mock_query = mock.MagicMock()
+    mock_query.cursor = None
     mock_query.page = 2
     mock_query.limit = 10
     mock_query.skip = (mock_query.page - 1) * mock_query.limit
@@ -411,7 +689,7 @@ async def test_pagination_middle_page(mock_client):
 
     paginated = await conn.read_paginated_documents(mock_model, mock_query)
 
-    assert paginated == {"count": 30, "next": 3, "previous": 1, "results": to_list.return_value}
+    assert paginated == {"count": 30, "count_is_exact": True, "next": 3, "previous": 1, "next_cursor": None, "results": to_list.return_value}
     mock_db.__getitem__.assert_called_with(mock_model.__tablename__)
     mock_db.__getitem__.return_value.aggregate.assert_called_once_with(mock_query.pipeline.return_value)
     to_list.assert_awaited_once_with(mock_query.limit)
@@ -430,6 +708,7 @@ async def test_pagination_last_page(mock_client):
     mock_model.__tablename__ = "tablename"
 
     mock_query = mock.MagicMock()
+    mock_query.cursor = None
     mock_query.page = 3
     mock_query.limit = 10
     mock_query.skip = (mock_query.page - 1) * mock_query.limit
@@ -439,7 +718,226 @@ async def test_pagination_last_page(mock_client):
 
     paginated = await conn.read_paginated_documents(mock_model, mock_query)
 
-    assert paginated == {"count": 30, "next": None, "previous": 2, "results": to_list.return_value}
+    assert paginated == {"count": 30, "count_is_exact": True, "next": None, "previous": 2, "next_cursor": None, "results": to_list.return_value}
     mock_db.__getitem__.assert_called_with(mock_model.__tablename__)
     mock_db.__getitem__.return_value.aggregate.assert_called_once_with(mock_query.pipeline.return_value)
     to_list.assert_awaited_once_with(mock_query.limit)
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_keyset_pagination_for_first_page_with_more_results(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+
+    oid = PyObjectId("123456789012345678901234")
+    to_list = mock.AsyncMock()
+    to_list.return_value = [{"_id": PyObjectId(), "field": 2}, {"_id": oid, "field": 1}]
+    mock_db.__getitem__.return_value.aggregate.return_value.to_list = to_list
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    mock_query = mock.MagicMock()
+    mock_query.cursor = ""
+    mock_query.limit = 2
+    mock_query.order_by = "field"
+    mock_query.direction = -1
+
+    conn.count_documents = mock.AsyncMock()
+    conn.count_documents.return_value = 30
+
+    paginated = await conn.read_paginated_documents(mock_model, mock_query)
+
+    assert paginated["count"] == 30
+    assert paginated["next"] is None and paginated["previous"] is None
+    assert decode_cursor(paginated["next_cursor"], "field", -1) == (1, oid)
+    mock_query.keyset_pipeline.assert_called_once_with(None)
+    mock_db.__getitem__.return_value.aggregate.assert_called_once_with(mock_query.keyset_pipeline.return_value)
+    to_list.assert_awaited_once_with(mock_query.limit)
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_keyset_pagination_for_last_page(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+
+    oid = PyObjectId("123456789012345678901234")
+    to_list = mock.AsyncMock()
+    to_list.return_value = [{"_id": PyObjectId(), "field": 2}]
+    mock_db.__getitem__.return_value.aggregate.return_value.to_list = to_list
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    mock_query = mock.MagicMock()
+    mock_query.cursor = encode_cursor(1, oid, "field", -1)
+    mock_query.limit = 2
+    mock_query.order_by = "field"
+    mock_query.direction = -1
+
+    conn.count_documents = mock.AsyncMock()
+    conn.count_documents.return_value = 30
+
+    paginated = await conn.read_paginated_documents(mock_model, mock_query)
+
+    assert paginated["next_cursor"] is None
+    mock_query.keyset_pipeline.assert_called_once_with((1, oid))
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_keyset_pagination_fails_for_invalid_cursor(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    mock_query = mock.MagicMock()
+    mock_query.cursor = "invalid"
+
+    with pytest.raises(InvalidCursor, match="invalid"):
+        await conn.read_paginated_documents(mock_model, mock_query)
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_keyset_pagination_fails_for_cursor_of_another_sorting(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    mock_query = mock.MagicMock()
+    mock_query.order_by, mock_query.direction = "field", -1
+
+    for cursor in (encode_cursor(1, PyObjectId(), "other", -1), encode_cursor(1, PyObjectId(), "field", 1)):
+        mock_query.cursor = cursor
+        with pytest.raises(InvalidCursor):
+            await conn.read_paginated_documents(mock_model, mock_query)
+    mock_db.__getitem__.return_value.aggregate.assert_not_called()
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_pagination_with_facet_uses_single_aggregation(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+
+    to_list = mock.AsyncMock()
+    to_list.return_value = [{"total": 30, "results": [{}, {}]}]
+    mock_db.__getitem__.return_value.aggregate.return_value.to_list = to_list
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    mock_query = mock.MagicMock()
+    mock_query.cursor = None
+    mock_query.page = 2
+    mock_query.limit = 10
+    mock_query.skip = (mock_query.page - 1) * mock_query.limit
+
+    conn.count_documents = mock.AsyncMock()
+
+    paginated = await conn.read_paginated_documents(mock_model, mock_query, facet=True)
+
+    assert paginated == {"count": 30, "count_is_exact": True, "next": 3, "previous": 1, "next_cursor": None, "results": [{}, {}]}
+    conn.count_documents.assert_not_awaited()
+    mock_query.facet_pipeline.assert_called_once_with(None)
+    mock_db.__getitem__.return_value.aggregate.assert_called_once_with(mock_query.facet_pipeline.return_value)
+    to_list.assert_awaited_once_with(1)
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_read_document_list_with_read_preference(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    collection = mock_db.__getitem__.return_value.with_options.return_value
+
+    async_for = mock.AsyncMock()
+    async_for.__aiter__.return_value = [{}, {}, {}]
+    collection.aggregate.return_value = async_for
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    mock_query = mock.MagicMock()
+    read_preference = SecondaryPreferred(max_staleness=90)
+
+    docs = await conn.read_multiple_documents(mock_model, mock_query, read_preference=read_preference)
+
+    assert docs == async_for.__aiter__.return_value
+    mock_db.__getitem__.return_value.with_options.assert_called_once_with(read_preference=read_preference)
+    collection.aggregate.assert_called_once_with(mock_query.pipeline.return_value)
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_pagination_passes_read_preference_to_counter(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    collection = mock_db.__getitem__.return_value.with_options.return_value
+    collection.aggregate.return_value.to_list = mock.AsyncMock()
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    mock_query = mock.MagicMock()
+    mock_query.cursor = None
+    mock_query.page = 1
+    mock_query.limit = 10
+    mock_query.skip = 0
+    read_preference = SecondaryPreferred(max_staleness=90)
+
+    conn.count_documents = mock.AsyncMock()
+    conn.count_documents.return_value = 0
+
+    await conn.read_paginated_documents(mock_model, mock_query, read_preference=read_preference)
+
+    conn.count_documents.assert_awaited_once_with(mock_model, mock_query, read_preference=read_preference)
+    collection.aggregate.assert_called_once_with(mock_query.pipeline.return_value)
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_raw_pagination_reads_documents_as_raw_bson(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    collection = mock_db.__getitem__.return_value.with_options.return_value
+    collection.aggregate.return_value.to_list = mock.AsyncMock(return_value=[])
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    mock_query = mock.MagicMock()
+    mock_query.cursor = None
+    mock_query.page = 1
+    mock_query.limit = 10
+    mock_query.skip = 0
+
+    conn.count_documents = mock.AsyncMock()
+    conn.count_documents.return_value = 0
+
+    await conn.read_paginated_documents(mock_model, mock_query, raw=True)
+
+    (_, kwargs), = mock_db.__getitem__.return_value.with_options.call_args_list
+    assert kwargs["codec_options"].document_class is RawBSONDocument
+
+
+def test_encode_json_converts_raw_documents_ids_and_dates():
+    oid, date = PyObjectId(), datetime(2023, 1, 1, 12, 30)
+    raw = RawBSONDocument(bson.encode({"_id": oid, "date": date, "nested": {"list": [1, 2]}}))
+
+    encoded = encode_json({"count": 1, "results": [raw]})
+    assert json.loads(encoded) == {
+        "count": 1, "results": [{"_id": str(oid), "date": "2023-01-01T12:30:00", "nested": {"list": [1, 2]}}]
+    }
+
+
+def test_encode_json_fails_for_unknown_types():
+    with pytest.raises(TypeError):
+        encode_json({"value": object()})
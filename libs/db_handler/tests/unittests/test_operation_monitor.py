@@ -0,0 +1,74 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from db_handler import InMemoryConnection, OperationMonitor, PyObjectId
+from .. import utils
+
+
+def test_operation_monitor_sends_operations_to_observers():
+    observer = mock.MagicMock()
+    monitor = OperationMonitor()
+    monitor.add_observer(observer)
+
+    monitor.record("read", "tablename", "", 0.5, 1)
+    observer.assert_called_once_with("read", "tablename", "", 0.5, 1)
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_connection_reports_aggregations_with_query_and_documents(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    observer = mock.MagicMock()
+    conn.operation_monitor.add_observer(observer)
+
+    class QueryClass:
+        def pipeline(self):
+            return []
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+    mock_db.__getitem__.return_value.aggregate.return_value.__aiter__.return_value = [{}, {}]
+    await conn.read_multiple_documents(mock_model, QueryClass())
+
+    observer.assert_called_once_with("aggregate", "tablename", "QueryClass", mock.ANY, 2)
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_connection_reports_failed_operations(mock_client):
+    conn, mock_db = await utils.get_connection_and_db(mock_client)
+    mock_db.__getitem__.return_value.delete_one = mock.AsyncMock(side_effect=RuntimeError)
+    observer = mock.MagicMock()
+    conn.operation_monitor.add_observer(observer)
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+    with pytest.raises(RuntimeError):
+        await conn.delete_document(mock_model, str(PyObjectId()))
+
+    observer.assert_called_once_with("delete", "tablename", "", mock.ANY, 0)
+
+
+@pytest.mark.asyncio
+async def test_connection_reports_streams_without_time_spent_by_consumer():
+    conn = InMemoryConnection()
+    await conn.connect()
+    await conn.db["tablename"].insert_many([{"value": i} for i in range(3)])
+    observer = mock.MagicMock()
+    conn.operation_monitor.add_observer(observer)
+
+    class QueryClass:
+        def pipeline(self):
+            return []
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+    async for _ in conn.stream_documents(mock_model, QueryClass()):
+        await asyncio.sleep(0.05)  # Slow consumer
+
+    observer.assert_called_once_with("stream", "tablename", "QueryClass", mock.ANY, 3)
+    assert observer.call_args.args[3] < 0.05
@@ -0,0 +1,53 @@
+from unittest import mock
+
+from db_handler import PoolMonitor
+
+
+def test_pool_monitor_tracks_open_connections():
+    monitor = PoolMonitor()
+    monitor.connection_created(mock.MagicMock())
+    monitor.connection_created(mock.MagicMock())
+    monitor.connection_closed(mock.MagicMock())
+
+    assert monitor.open == 1
+
+
+def test_pool_monitor_tracks_waiting_and_checked_out_connections():
+    monitor = PoolMonitor()
+    monitor.connection_check_out_started(mock.MagicMock())
+    monitor.connection_check_out_started(mock.MagicMock())
+
+    assert monitor.waiting == 2
+    assert monitor.checked_out == 0
+
+    monitor.connection_checked_out(mock.MagicMock())
+
+    assert monitor.waiting == 1
+    assert monitor.checked_out == 1
+
+    monitor.connection_checked_in(mock.MagicMock())
+
+    assert monitor.checked_out == 0
+
+
+def test_pool_monitor_tracks_failed_checkouts():
+    monitor = PoolMonitor()
+    monitor.connection_check_out_started(mock.MagicMock())
+    monitor.connection_check_out_failed(mock.MagicMock())
+
+    assert monitor.waiting == 0
+    assert monitor.checkout_failures == 1
+
+
+@mock.patch('db_handler._monitoring.time')
+def test_pool_monitor_sends_checkout_latency_to_observers(mock_time):
+    observer = mock.MagicMock()
+    monitor = PoolMonitor()
+    monitor.add_checkout_observer(observer)
+
+    mock_time.perf_counter.return_value = 1
+    monitor.connection_check_out_started(mock.MagicMock())
+    mock_time.perf_counter.return_value = 1.5
+    monitor.connection_checked_out(mock.MagicMock())
+
+    observer.assert_called_once_with(0.5)
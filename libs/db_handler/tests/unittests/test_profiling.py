@@ -0,0 +1,116 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from db_handler import MongoConnection, QueryProfiler
+from db_handler._profiling import summarize_plan
+
+
+EXPLAIN = {
+    "stages": [
+        {
+            "$cursor": {
+                "queryPlanner": {
+                    "winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}},
+                    "rejectedPlans": [{"stage": "COLLSCAN"}],
+                },
+                "executionStats": {"nReturned": 2, "totalKeysExamined": 5, "totalDocsExamined": 5},
+            }
+        },
+        {"$group": {"_id": "$object"}},
+    ]
+}
+
+
+def test_summarize_plan_collects_stages_and_counts():
+    summary = summarize_plan(EXPLAIN)
+    assert summary == {"stages": ["FETCH", "IXSCAN"], "keys_examined": 5, "docs_examined": 5, "returned": 2}
+
+
+@pytest.mark.asyncio
+async def test_profiler_ignores_fast_operations():
+    logger, db = mock.MagicMock(), mock.MagicMock()
+    profiler = QueryProfiler(threshold=1, explain_rate=1, logger=logger)
+
+    assert profiler.record(db, {"aggregate": "tablename", "pipeline": []}, 0.5) is None
+    logger.warning.assert_not_called()
+    db.command.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_profiler_logs_slow_operations_without_explain():
+    logger, db = mock.MagicMock(), mock.MagicMock()
+    profiler = QueryProfiler(threshold=1, logger=logger)
+
+    await profiler.record(db, {"aggregate": "tablename", "pipeline": []}, 1.5)
+    logger.warning.assert_called_once()
+    assert logger.warning.call_args.args[1:3] == ("aggregate", "tablename")
+    assert logger.warning.call_args.args[-1] is None
+    db.command.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_profiler_logs_slow_operations_with_explain():
+    logger, db = mock.MagicMock(), mock.MagicMock()
+    db.command = mock.AsyncMock(return_value=EXPLAIN)
+    profiler = QueryProfiler(threshold=1, explain_rate=1, logger=logger)
+
+    command = {"aggregate": "tablename", "pipeline": []}
+    await profiler.record(db, command, 1.5)
+    db.command.assert_awaited_once_with({"explain": command, "verbosity": "executionStats"})
+    assert logger.warning.call_args.args[-1] == summarize_plan(EXPLAIN)
+
+
+@pytest.mark.asyncio
+async def test_profiler_explains_in_the_background():
+    logger, db, explained = mock.MagicMock(), mock.MagicMock(), asyncio.Event()
+
+    async def explain(command):
+        await explained.wait()
+        return EXPLAIN
+
+    db.command = explain
+    profiler = QueryProfiler(threshold=1, explain_rate=1, logger=logger)
+
+    task = profiler.record(db, {"aggregate": "tablename", "pipeline": []}, 1.5)
+    await asyncio.sleep(0)
+    assert not task.done()
+    logger.warning.assert_not_called()
+    explained.set()
+    await task
+    logger.warning.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_profiler_logs_slow_operations_if_explain_fails():
+    logger, db = mock.MagicMock(), mock.MagicMock()
+    db.command = mock.AsyncMock(side_effect=OperationFailure("failed"))
+    profiler = QueryProfiler(threshold=1, explain_rate=1, logger=logger)
+
+    await profiler.record(db, {"aggregate": "tablename", "pipeline": []}, 1.5)
+    assert logger.warning.call_args.args[-1].startswith("unavailable")
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_connection_reports_aggregations_with_query_to_profiler(mock_client):
+    mock_db = mock.MagicMock()
+    mock_client.return_value.__getitem__.return_value = mock_db
+    mock_db.__getitem__.return_value.aggregate.return_value.to_list = mock.AsyncMock(return_value=[{"total": 2}])
+
+    profiler = mock.MagicMock()
+    profiler.record = mock.MagicMock()
+    conn = MongoConnection(mock.MagicMock(), profiler=profiler)
+    await conn.connect()
+
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+    mock_query = mock.MagicMock()
+    mock_query.count_pipeline.return_value = [{"$count": "total"}]
+    await conn.count_documents(mock_model, mock_query)
+
+    command = {"aggregate": "tablename", "pipeline": [{"$count": "total"}], "cursor": {}}
+    profiler.record.assert_called_once_with(conn.db, command, mock.ANY, mock_query)
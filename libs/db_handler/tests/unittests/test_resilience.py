@@ -0,0 +1,175 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from pymongo.errors import AutoReconnect, DuplicateKeyError, NetworkTimeout
+
+from db_handler import BreakerState, CircuitBreaker, CircuitOpen, MongoConnection, RetryPolicy
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._resilience.asyncio.sleep', new_callable=mock.AsyncMock)
+async def test_retry_policy_retries_connection_failures(mock_sleep):
+    operation = mock.AsyncMock(side_effect=[AutoReconnect(), AutoReconnect(), "result"])
+    policy = RetryPolicy(attempts=3, base_delay=0.1, max_delay=1)
+
+    assert await policy.call(operation) == "result"
+    assert operation.await_count == 3
+    delays = [call.args[0] for call in mock_sleep.await_args_list]
+    assert 0 <= delays[0] <= 0.1 and 0 <= delays[1] <= 0.2
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._resilience.asyncio.sleep', new_callable=mock.AsyncMock)
+async def test_retry_policy_gives_up_after_all_attempts(mock_sleep):
+    operation = mock.AsyncMock(side_effect=AutoReconnect())
+    policy = RetryPolicy(attempts=3)
+
+    with pytest.raises(AutoReconnect):
+        await policy.call(operation)
+    assert operation.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_retry_policy_does_not_retry_other_errors():
+    operation = mock.AsyncMock(side_effect=DuplicateKeyError("duplicate"))
+    policy = RetryPolicy(attempts=3)
+
+    with pytest.raises(DuplicateKeyError):
+        await policy.call(operation)
+    operation.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_retry_policy_fails_after_deadline():
+    async def operation():
+        await asyncio.sleep(1)
+
+    policy = RetryPolicy(deadline=0.01)
+    with pytest.raises(NetworkTimeout):
+        await policy.call(operation)
+
+
+@pytest.mark.asyncio
+async def test_retry_policy_with_breaker_counts_attempts_out_of_time_as_failures():
+    async def unreachable():
+        await asyncio.sleep(1)  # Server selection takes longer than the deadline
+
+    policy, breaker = RetryPolicy(deadline=0.01), CircuitBreaker(failure_threshold=2)
+    for _ in range(2):
+        with pytest.raises(NetworkTimeout):
+            await policy.call(unreachable, breaker.call)
+    assert breaker.failures == 2 and breaker.state == BreakerState.open
+
+    with pytest.raises(CircuitOpen):
+        await policy.call(unreachable, breaker.call)
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    operation = mock.AsyncMock(side_effect=AutoReconnect())
+
+    for _ in range(2):
+        with pytest.raises(AutoReconnect):
+            await breaker.call(operation)
+    assert breaker.state == BreakerState.open
+
+    with pytest.raises(CircuitOpen):
+        await breaker.call(operation)
+    assert operation.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_resets_failures_after_success():
+    breaker = CircuitBreaker(failure_threshold=2)
+    operation = mock.AsyncMock(side_effect=[AutoReconnect(), "result", AutoReconnect()])
+
+    for _ in range(3):
+        try:
+            await breaker.call(operation)
+        except AutoReconnect:
+            pass
+    assert breaker.state == BreakerState.closed
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._resilience.time')
+async def test_circuit_breaker_closes_after_successful_trial(mock_time):
+    mock_time.monotonic.return_value = 0
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    with pytest.raises(AutoReconnect):
+        await breaker.call(mock.AsyncMock(side_effect=AutoReconnect()))
+
+    mock_time.monotonic.return_value = 31
+    assert breaker.state == BreakerState.half_open
+    assert await breaker.call(mock.AsyncMock(return_value="result")) == "result"
+    assert breaker.state == BreakerState.closed
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._resilience.time')
+async def test_circuit_breaker_opens_again_after_failed_trial(mock_time):
+    mock_time.monotonic.return_value = 0
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    with pytest.raises(AutoReconnect):
+        await breaker.call(mock.AsyncMock(side_effect=AutoReconnect()))
+
+    mock_time.monotonic.return_value = 31
+    with pytest.raises(AutoReconnect):
+        await breaker.call(mock.AsyncMock(side_effect=AutoReconnect()))
+    assert breaker.state == BreakerState.open
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_connection_retries_reads_but_not_writes(mock_client):
+    mock_db = mock.MagicMock()
+    mock_client.return_value.__getitem__.return_value = mock_db
+    collection = mock_db.__getitem__.return_value
+    collection.find_one = mock.AsyncMock(side_effect=[AutoReconnect(), {"_id": "id"}])
+    collection.delete_one = mock.AsyncMock(side_effect=AutoReconnect())
+
+    conn = MongoConnection(mock.MagicMock(), retry=RetryPolicy(base_delay=0), breaker=CircuitBreaker())
+    await conn.connect()
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    assert await conn.read_document(mock_model, "id") == {"_id": "id"}
+    assert collection.find_one.await_count == 2
+    with pytest.raises(AutoReconnect):
+        await conn.delete_document(mock_model, "id")
+    collection.delete_one.assert_awaited_once()
+    assert conn.breaker.failures == 1
+
+
+@pytest.mark.asyncio
+@mock.patch('db_handler._connection._MongoConfig', new=mock.MagicMock())
+@mock.patch('db_handler._connection.AsyncIOMotorClient')
+async def test_connection_retries_opening_streams(mock_client):
+    mock_db = mock.MagicMock()
+    mock_client.return_value.__getitem__.return_value = mock_db
+
+    class Cursor:
+        def __init__(self, *results):
+            self.results = iter(results)
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            result = next(self.results, StopAsyncIteration())
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+    mock_db.__getitem__.return_value.aggregate.side_effect = [Cursor(AutoReconnect()), Cursor({"_id": 1}, {"_id": 2})]
+
+    conn = MongoConnection(mock.MagicMock(), retry=RetryPolicy(base_delay=0), breaker=CircuitBreaker())
+    await conn.connect()
+    mock_model = mock.MagicMock()
+    mock_model.__tablename__ = "tablename"
+
+    assert [document async for document in conn.stream_documents(mock_model, mock.MagicMock())] == [{"_id": 1}, {"_id": 2}]
+    assert conn.breaker.failures == 0
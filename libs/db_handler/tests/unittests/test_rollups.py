@@ -0,0 +1,301 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+from bson import ObjectId
+from pydantic import BaseModel, Field
+from pymongo import DeleteOne, IndexModel, ReplaceOne, UpdateOne
+from pymongo.errors import ServerSelectionTimeoutError
+
+from db_handler import CircuitBreaker, DailyCount, GroupSummary, InMemoryConnection, PyObjectId
+from db_handler._memory import _MemoryCollection
+
+
+daily = DailyCount("items_by_day", date="date", dimensions=("group",))
+groups = GroupSummary(
+    "item_groups",
+    key="group",
+    group={"last_date": {"$max": "$date"}, "names": {"$addToSet": "$name"}, "count": {"$count": {}}},
+    indexes=[IndexModel([("count", -1)])],
+)
+
+
+class Item(BaseModel):  # Not using the metaclass avoids registering the collection for every test
+    __tablename__ = "items"
+    __indexes__ = [IndexModel([("name", 1)], unique=True)]
+    __rollups__ = [daily, groups]
+
+    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    name: str
+    group: str
+    date: datetime
+
+
+start = datetime(2023, 1, 1, 12)
+items = [
+    {"name": f"item{i}", "group": "even" if i % 2 == 0 else "odd", "date": start + timedelta(hours=9 * i)} for i in range(10)
+]
+
+
+async def counts(conn: InMemoryConnection) -> dict:
+    """Counts of the rollup that are not zero, by key"""
+    cursor = conn.db[daily.__tablename__].find({"count": {"$ne": 0}})
+    return {tuple(document["_id"].values()): document["count"] async for document in cursor}
+
+
+async def summaries(conn: InMemoryConnection) -> dict:
+    """Summaries by key, without the version of the write that last claimed them"""
+    cursor = conn.db[groups.__tablename__].find({}, {"_version": 0})
+    return {document["_id"]: {**document, "names": sorted(document["names"])} async for document in cursor}
+
+
+async def rebuilt(conn: InMemoryConnection) -> dict:
+    """Counts of the rollup as given by rebuilding it from the documents (checking the summaries as well)"""
+    current = await counts(conn), await summaries(conn)
+    await conn.rebuild_rollups(Item)
+    result = await counts(conn), await summaries(conn)
+    assert result == current
+    return result[0]
+
+
+def test_key_truncates_date_to_utc_day():
+    date = datetime(2023, 1, 2, 1, tzinfo=timezone(timedelta(hours=3)))
+
+    assert daily.key({"date": date, "group": "odd", "name": "x"}) == {"day": datetime(2023, 1, 1), "group": "odd"}
+    assert daily.key({"date": datetime(2023, 1, 1, 23, 59)}) == {"day": datetime(2023, 1, 1), "group": None}
+
+
+def test_updates_increment_counts_by_key():
+    before = [{"date": start, "group": "odd"}]
+    after = [{"date": start, "group": "even"}, {"date": start + timedelta(hours=1), "group": "even"}]
+    day = datetime(2023, 1, 1)
+
+    assert daily.updates(before, after) == [
+        UpdateOne({"_id": {"day": day, "group": "even"}}, {"$inc": {"count": 2}}, upsert=True),
+        UpdateOne({"_id": {"day": day, "group": "odd"}}, {"$inc": {"count": -1}}, upsert=True),
+    ]
+
+
+def test_updates_skip_unchanged_keys():
+    assert daily.updates([{"date": start, "group": "odd"}], [{"date": start + timedelta(hours=1), "group": "odd"}]) == []
+
+
+def test_pipeline_matches_fields_of_key():
+    pipeline = daily.pipeline({"day": {"$gte": start}, "group": "odd"})
+
+    assert pipeline[0] == {"$match": {"_id.day": {"$gte": start}, "_id.group": "odd"}}
+
+
+def test_summary_fields_include_key_and_referenced_fields():
+    assert groups.fields == {"group", "date", "name"}
+
+
+def test_summary_refresh_pipeline_groups_documents_with_written_keys():
+    pipeline = groups.refresh_pipeline([{"group": "odd"}], [{"group": "even"}, {"group": "odd"}])
+
+    assert pipeline[0] == {"$match": {"group": {"$in": ["odd", "even"]}}}
+    assert pipeline[1] == {"$group": {"_id": "$group", **groups.group}}
+    assert groups.refresh_pipeline([], []) is None
+
+
+def test_summary_updates_remove_keys_without_documents():
+    refreshed, version = [{"_id": "even", "group": "even", "count": 1}], ObjectId()
+    requests = groups.updates([{"group": "odd"}], [{"group": "even"}], refreshed, version)
+
+    assert requests == [
+        ReplaceOne({"_id": "even", "_version": version}, {**refreshed[0], "_version": version}),
+        DeleteOne({"_id": "odd", "_version": version}),
+    ]
+
+
+def test_summary_claims_apply_writes_incrementally():
+    version, date = ObjectId(), start + timedelta(days=1)
+    before = [{"group": "odd", "name": "a", "date": start}]
+    after = [{"group": "even", "name": "a", "date": start}, {"group": "even", "name": "b", "date": date}]
+    even = {"$set": {"group": "even", "_version": version}, "$inc": {"count": 2}, "$max": {"last_date": date}}
+
+    assert groups.claims(before, after, version) == [
+        UpdateOne({"_id": "odd"}, {"$set": {"group": "odd", "_version": version}, "$inc": {"count": -1}}),
+        UpdateOne({"_id": "even"}, {**even, "$addToSet": {"names": {"$each": ["a", "b"]}}}, upsert=True),
+    ]
+
+
+def test_summary_only_accepts_accumulators_applied_document_by_document():
+    with pytest.raises(ValueError):
+        GroupSummary("summaries", key="group", group={"first": {"$first": "$name"}})
+    with pytest.raises(ValueError):
+        GroupSummary("summaries", key="group", group={"span": {"$max": {"$subtract": ["$end", "$start"]}}})
+
+
+@pytest.mark.asyncio
+async def test_writes_update_summaries():
+    conn = InMemoryConnection()
+    await conn.connect()
+    created = await conn.create_documents(Item, items)
+    await conn.update_document(Item, str(created[0]["id"]), {"group": "other", "name": "moved"})
+    await conn.delete_documents(Item, [str(item["id"]) for item in created[1::2]])
+    await rebuilt(conn)
+
+    result = await summaries(conn)
+    names = ["item2", "item4", "item6", "item8"]
+    assert result["even"] == {"_id": "even", "group": "even", "last_date": items[8]["date"], "count": 4, "names": names}
+    assert result["other"]["names"] == ["moved"]
+    assert "odd" not in result
+
+
+@pytest.mark.asyncio
+async def test_writes_update_counts():
+    conn = InMemoryConnection()
+    await conn.connect()
+    created = [await conn.create_document(Item, item) for item in items[:3]]
+    await conn.create_documents(Item, items[3:])
+    assert sum((await rebuilt(conn)).values()) == 10
+
+    await conn.update_document(Item, str(created[0]["_id"]), {"group": "odd", "date": start + timedelta(days=5)})
+    await conn.update_document(Item, str(created[1]["_id"]), {"name": "renamed"})
+    await conn.delete_document(Item, str(created[2]["_id"]))
+    assert await rebuilt(conn) == {
+        (datetime(2023, 1, 1), "odd"): 1,
+        (datetime(2023, 1, 2), "odd"): 1,
+        (datetime(2023, 1, 3), "even"): 2,
+        (datetime(2023, 1, 3), "odd"): 1,
+        (datetime(2023, 1, 4), "even"): 1,
+        (datetime(2023, 1, 4), "odd"): 2,
+        (datetime(2023, 1, 6), "odd"): 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_bulk_writes_update_counts():
+    conn = InMemoryConnection()
+    await conn.connect()
+    await conn.db[Item.__tablename__].create_indexes(Item.__indexes__)
+    created = await conn.create_documents(Item, items + [items[0]])  # The duplicate is not counted
+    oids = [str(item["id"]) for item in created[:4]]
+
+    await conn.update_documents(Item, [(oids[0], {"group": "odd"}), (oids[0], {"group": "other"}), (oids[1], {"name": "x"})])
+    await conn.delete_documents(Item, [oids[2], oids[3], oids[3], "unknown"])
+    result = await rebuilt(conn)
+    assert sum(result.values()) == 8
+    assert result[(datetime(2023, 1, 1), "other")] == 1
+
+
+@pytest.mark.asyncio
+async def test_create_db_builds_rollups_without_counts():
+    conn = InMemoryConnection()
+    await conn.connect()
+    await conn.db[Item.__tablename__].insert_many([dict(item) for item in items])
+
+    with mock.patch("db_handler._connection.ModelMetaclass.__models__", {Item}):
+        await conn.create_db()
+        assert sum((await counts(conn)).values()) == 10
+        assert [index["name"] async for index in conn.db[groups.__tablename__].list_indexes()] == ["_id_", "count_-1"]
+        await conn.db[Item.__tablename__].delete_many({})
+        await conn.create_db()  # Existing counts are kept
+        assert sum((await counts(conn)).values()) == 10
+
+
+@pytest.mark.asyncio
+async def test_rollups_are_not_ready_nor_updated_until_checked_by_create_db():
+    conn = InMemoryConnection()
+    await conn.connect()
+    await conn.create_documents(Item, items[:5])
+
+    release, count = asyncio.Event(), _MemoryCollection.estimated_document_count
+
+    async def estimated_document_count(self):
+        await release.wait()
+        return await count(self)
+
+    with mock.patch("db_handler._connection.ModelMetaclass.__models__", {Item}), mock.patch.object(
+        _MemoryCollection, "estimated_document_count", estimated_document_count
+    ):
+        task = asyncio.create_task(conn.create_db())  # As if run in the background
+        await asyncio.sleep(0.01)
+        assert not conn.rollup_ready(daily) and not conn.rollup_ready(groups)
+
+        await conn.create_document(Item, items[5])
+        assert sum((await counts(conn)).values()) == 5
+
+        release.set()
+        await task
+    assert conn.rollup_ready(daily) and conn.rollup_ready(groups)
+    assert sum((await rebuilt(conn)).values()) == 6  # The counts were rebuilt, since they were written meanwhile
+
+
+@pytest.mark.asyncio
+async def test_summaries_are_only_replaced_by_the_last_write_claiming_them():
+    conn = InMemoryConnection()
+    await conn.connect()
+    first, second = await conn.create_documents(Item, items[:2])
+    refresh = conn._refresh
+
+    async def refresh_before_second_write(model, pipeline):  # The first write refreshes before the second is done
+        refreshed = await refresh(model, pipeline)
+        with mock.patch.object(conn, "_refresh", refresh):
+            await conn.delete_document(Item, str(second["id"]))
+        return refreshed
+
+    with mock.patch.object(conn, "_refresh", refresh_before_second_write):
+        await conn.update_document(Item, str(first["id"]), {"group": "odd"})
+
+    result = await summaries(conn)
+    assert result["odd"]["names"] == ["item0"] and result["odd"]["count"] == 1
+    assert await rebuilt(conn) == {(datetime(2023, 1, 1), "odd"): 1}
+
+
+@pytest.mark.asyncio
+async def test_disabled_rollups_are_neither_built_nor_updated():
+    conn = InMemoryConnection(disabled_rollups=[daily])
+    await conn.connect()
+    await conn.db[Item.__tablename__].insert_many([dict(item) for item in items[:5]])
+
+    with mock.patch("db_handler._connection.ModelMetaclass.__models__", {Item}):
+        await conn.create_db()
+    await conn.create_documents(Item, items[5:])
+
+    assert await counts(conn) == {}
+    assert sum(summary["count"] for summary in (await summaries(conn)).values()) == 10
+    assert not conn.rollup_ready(daily) and conn.rollup_ready(groups)
+
+
+@pytest.mark.asyncio
+async def test_read_rollup_gives_counts_per_day():
+    conn = InMemoryConnection()
+    await conn.connect()
+    await conn.create_documents(Item, items)
+
+    result = await conn.read_rollup(daily, daily.pipeline({"day": {"$gte": datetime(2023, 1, 3)}}) + [{"$sort": {"day": 1}}])
+    assert [(document["day"], document["count"]) for document in result] == [
+        (datetime(2023, 1, 3), 3),
+        (datetime(2023, 1, 4), 3),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_failures_to_update_counts_are_logged(caplog):
+    conn = InMemoryConnection()
+    await conn.connect()
+    rollup = conn.db[daily.__tablename__]
+
+    with mock.patch.object(type(rollup), "bulk_write", side_effect=ServerSelectionTimeoutError("down")):
+        with caplog.at_level(logging.WARNING, logger="db_handler"):
+            document = await conn.create_document(Item, items[0])
+    assert await conn.read_document(Item, str(document["_id"])) == document
+    assert "Rollup items_by_day is out of date" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_while_updating_counts_is_logged(caplog):
+    conn = InMemoryConnection(breaker=CircuitBreaker(failure_threshold=1))
+    await conn.connect()
+    rollup = conn.db[daily.__tablename__]
+
+    with mock.patch.object(type(rollup), "bulk_write", side_effect=ServerSelectionTimeoutError("down")):
+        with caplog.at_level(logging.WARNING, logger="db_handler"):
+            document = await conn.create_document(Item, items[0])  # The first rollup opens the breaker
+    assert "Rollup items_by_day is out of date: down" in caplog.text
+    assert "Rollup item_groups is out of date: Database marked as unreachable" in caplog.text
+    assert document["name"] == items[0]["name"]
@@ -1,4 +1,14 @@
+from ._optimizer import *
 from ._utils import *
 
 
-__all__ = ["QueryRecipe", "BaseQuery", "BaseSortedQuery", "BasePaginatedQuery", "Direction", "field_enum_factory"]
+__all__ = [
+    "QueryRecipe",
+    "BaseQuery",
+    "BaseProjectedQuery",
+    "BaseSortedQuery",
+    "BasePaginatedQuery",
+    "Direction",
+    "field_enum_factory",
+    "optimize",
+]
@@ -0,0 +1,221 @@
+from enum import Enum
+from typing import Any
+
+
+# Stages that change (or remove) fields of each document, without changing the number of documents
+_SHAPING = {"$set", "$addFields", "$project", "$unset"}
+# Stages whose output, if only counted, does not depend on the order of their input (except after slicing it)
+_PER_DOCUMENT = _SHAPING | {"$match", "$sort", "$skip", "$limit", "$count"}
+# Accumulators giving the same result regardless of the order of the documents in the group
+_ORDER_FREE = {
+    "$addToSet",
+    "$avg",
+    "$bottom",
+    "$bottomN",
+    "$count",
+    "$max",
+    "$maxN",
+    "$min",
+    "$minN",
+    "$stdDevPop",
+    "$stdDevSamp",
+    "$sum",
+    "$top",
+    "$topN",
+}
+# Operators giving the same result over the key of a group as over the grouped field of each document
+_KEY_OPERATORS = {"$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin", "$regex", "$options"}
+
+
+def _stage(stage: dict) -> tuple[str, Any]:
+    ((name, spec),) = stage.items()
+    return name, spec
+
+
+def _root(field: str) -> str:
+    return field.split(".")[0]
+
+
+def _path(expression: Any) -> str | None:
+    """Field referenced by the expression, if it is just a field path (e.g., `"$field"`)"""
+    if isinstance(expression, str) and expression.startswith("$") and not expression.startswith("$$"):
+        return expression[1:]
+    return None
+
+
+def _plain(condition: dict) -> dict:
+    """Condition with enumerations as field names (e.g., the sorting field) replaced by their values"""
+    plain = {}
+    for field, value in condition.items():
+        if field in ("$and", "$or", "$nor"):
+            value = [_plain(item) for item in value]
+        plain[field.value if isinstance(field, Enum) else field] = value
+    return plain
+
+
+def _fields(condition: dict) -> set[str] | None:
+    """Fields referenced by the condition of a `$match` stage (or `None` if they cannot be known, e.g., with `$expr`)"""
+    fields = set()
+    for field, value in condition.items():
+        if field in ("$and", "$or", "$nor"):
+            nested = [_fields(item) for item in value]
+            if None in nested:
+                return None
+            fields.update(*nested)
+        elif field.startswith("$"):
+            return None
+        else:
+            fields.add(field)
+    return fields
+
+
+def _rename(condition: dict, names: dict[str, str], key_only: bool = False) -> dict | None:
+    """Condition over the fields with the new names (or `None` if two fields get the same name).
+
+    With `key_only`, it is also `None` if any operator is not known to give the same result over the
+    key of a group as over the grouped field (e.g., `$exists`, since the key is never missing).
+    """
+    renamed = {}
+    for field, value in condition.items():
+        if field in ("$and", "$or", "$nor"):
+            value = [_rename(item, names, key_only) for item in value]
+            if None in value:
+                return None
+        elif key_only and isinstance(value, dict) and any(op.startswith("$") and op not in _KEY_OPERATORS for op in value):
+            return None
+        field = names.get(field, field)
+        if field in renamed:
+            return None
+        renamed[field] = value
+    return renamed
+
+
+def _before(condition: dict, stage: dict) -> dict | None:
+    """Equivalent condition to filter the documents before the stage, if it exists"""
+    name, spec = _stage(stage)
+    if name == "$sort":
+        return condition
+    fields = _fields(condition)
+    if fields is None:
+        return None
+    if name == "$unset":
+        removed = {_root(field) for field in ([spec] if isinstance(spec, str) else spec)}
+        return condition if not {_root(field) for field in fields} & removed else None
+    if name == "$group":
+        # Only the key of the group keeps the value of a field of the grouped documents
+        key = _path(spec["_id"])
+        return _rename(condition, {"_id": key}, key_only=True) if key is not None and fields <= {"_id"} else None
+    if name in ("$set", "$addFields"):
+        changed = {_root(field) for field in spec}
+        names = {field: _path(spec.get(field)) for field in fields if _root(field) in changed}
+    elif name == "$project":
+        if not any(value in (0, False) for field, value in spec.items() if field != "_id"):  # Inclusion
+            kept = {"_id"} if spec.get("_id", 1) not in (0, False) else set()
+            kept.update(field for field, value in spec.items() if value in (1, True))
+            names = {field: _path(spec.get(field)) for field in fields if field not in kept}
+        elif {_root(field) for field in fields} & {_root(field) for field in spec}:
+            return None
+        else:
+            return condition
+    else:
+        return None
+    # Fields changed by the stage can only be filtered before it if they are copies of other fields
+    if None in names.values():
+        return None
+    return _rename(condition, names)
+
+
+def _merge(first: dict, second: dict) -> dict:
+    if first.keys() & second.keys():
+        return {"$and": [first, second]}
+    return {**first, **second}
+
+
+def _add_match(stages: list[dict], condition: dict):
+    """Adds the `$match` stage as early as possible, merging it with the previous one if they meet"""
+    position = len(stages)
+    while position > 0:
+        name, spec = _stage(stages[position - 1])
+        if name == "$match":
+            stages[position - 1] = {"$match": _merge(spec, condition)}
+            return
+        moved = _before(condition, stages[position - 1])
+        if moved is None:
+            break
+        condition, position = moved, position - 1
+    stages.insert(position, {"$match": condition})
+
+
+def _noop(name: str, spec: Any) -> bool:
+    return (name, spec) in (("$match", {}), ("$set", {}), ("$addFields", {}), ("$unset", []), ("$skip", 0))
+
+
+def _order_free(stages: list[dict]) -> bool:
+    """Whether the number of documents output by the stages does not depend on the order of their input"""
+    sliced = False
+    for stage in stages:
+        name, _ = _stage(stage)
+        if name not in _PER_DOCUMENT or (sliced and name == "$match"):
+            return False
+        sliced = sliced or name in ("$skip", "$limit")
+    return True
+
+
+def _counted(stages: list[dict]) -> list[dict]:
+    """Removes stages that do not change the number of documents counted by the final `$count`"""
+    stages = [stage for i, stage in enumerate(stages) if "$sort" not in stage or not _order_free(stages[i + 1 :])]
+    kept = []
+    for stage in reversed(stages):
+        name, _ = _stage(stage)
+        # Fields are not used by later stages if these only count or slice the documents
+        if name in _SHAPING and all(_stage(later)[0] in ("$skip", "$limit", "$count") for later in kept):
+            continue
+        kept.append(stage)
+    return kept[::-1]
+
+
+def optimize(pipeline: list[dict]) -> list[dict]:
+    """Rewrites an aggregation pipeline to give the same results with fewer stages or less work.
+
+    Stages that do nothing (e.g., an empty `$match`) are removed. Every `$match` is moved as early as possible,
+    merging it with others: before `$sort`, before stages changing fields it does not filter (or copying them
+    from others, which are filtered instead) and before a `$group` if it only filters its key. Consecutive `$skip`
+    and `$limit` are merged, as is a `$sort` followed by another (only the last one sets the order). A `$sort`
+    before a `$group` only with accumulators not depending on order is removed, since `$group` does not keep it.
+    This is also the reason why a `$sort` by the key of a group is never moved before the group.
+
+    If the pipeline ends in `$count`, any `$sort` not changing the counted documents and any stage only
+    changing their fields is removed as well. Pipelines inside `$facet` are optimized independently.
+
+    Args:
+        pipeline (list[dict]): List with stages for mongo pipeline
+
+    Returns:
+        list[dict]: Optimized list of stages (the input is not modified)
+    """
+    stages = []
+    for stage in pipeline:
+        name, spec = _stage(stage)
+        previous = _stage(stages[-1])[0] if stages else None
+        if _noop(name, spec):
+            continue
+        if name == "$match":
+            _add_match(stages, _plain(spec))
+        elif name == "$skip" and previous == "$skip":
+            stages[-1] = {"$skip": stages[-1]["$skip"] + spec}
+        elif name == "$limit" and previous == "$limit":
+            stages[-1] = {"$limit": min(stages[-1]["$limit"], spec)}
+        elif name == "$sort" and previous == "$sort":
+            stages[-1] = stage
+        elif name == "$group" and previous == "$sort":
+            accumulators = (_stage(value)[0] for field, value in spec.items() if field != "_id")
+            if all(accumulator in _ORDER_FREE for accumulator in accumulators):
+                stages.pop()
+            stages.append(stage)
+        elif name == "$facet":
+            stages.append({"$facet": {field: optimize(value) for field, value in spec.items()}})
+        else:
+            stages.append(stage)
+    if stages and "$count" in stages[-1]:
+        return _counted(stages)
+    return stages
@@ -1,9 +1,11 @@
 from enum import Enum, IntEnum
-from typing import NamedTuple, ClassVar
+from typing import Callable, NamedTuple, ClassVar
 
 from fastapi import Query
 from pydantic import BaseModel, dataclasses
 
+from ._optimizer import optimize
+
 
 def field_enum_factory(model: type[BaseModel], by_alias: bool = True, *, exclude=None) -> type[Enum]:
     name, exclude = model.__name__ + "Fields", exclude or set()
@@ -26,11 +28,14 @@ class QueryRecipe(NamedTuple):
         field (str): Field in document to be queried
         operators (list[str]): Mongo operators used for filtering
         attributes (list[str]): Class attribute names containing values for the operators
+        convert (Callable[[dict], dict], optional): Function rewriting the condition (if not empty), e.g., to
+            translate operators not understood by MongoDB into others
     """
 
     field: str
     operators: list[str]
     attributes: list[str]
+    convert: Callable[[dict], dict] | None = None
 
     def pair(self, q) -> tuple[str, dict]:
         """Generates pair with field name and the mongo dictionary used for filtering according to the
@@ -47,6 +52,8 @@ class QueryRecipe(NamedTuple):
         """
         values = (getattr(q, attr) for attr in self.attributes)
         condition = {op: val for op, val in zip(self.operators, values) if val is not None}
+        if condition and self.convert is not None:
+            condition = self.convert(condition)
         return self.field, condition
 
 
@@ -66,17 +73,25 @@ class BaseQuery:
         """Generates match stage for pipeline"""
         return [{"$match": {k: v for k, v in (r.pair(self) for r in self.recipes) if v}}]
 
+    def _required_fields(self) -> set[str]:
+        """Fields that must be kept if the documents are projected (e.g., for sorting)"""
+        return set()
+
     def _query_pipeline(self) -> list[dict]:
         """All stages for generating documents of interest. Should not include sort, skip, etc."""
         return self._match()
 
+    def _pipeline(self) -> list[dict]:
+        """All stages for generating the documents to return, before optimizing them (see `optimize`)"""
+        return self._query_pipeline()
+
     def pipeline(self) -> list[dict]:
         """Aggregation pipeline for mongo.
 
         Returns:
             list[dict]: List with stages for mongo pipeline
         """
-        return self._query_pipeline()
+        return optimize(self._pipeline())
 
     def count_pipeline(self) -> list[dict]:
         """Aggregation pipeline for mongo to count documents.
@@ -87,7 +102,31 @@ class BaseQuery:
         Returns:
             list[dict]: List with stages for mongo pipeline
         """
-        return self._query_pipeline() + [{"$count": "total"}]
+        return optimize(self._query_pipeline() + [{"$count": "total"}])
+
+
+@dataclasses.dataclass
+class BaseProjectedQuery(BaseQuery):
+    """Base class for handling queries that can select the fields in the output documents.
+
+    Subclasses MUST implement instructions for `fields`.
+    This mainly refers to its type, which should be a list of enums (see `field_enum_factory`), and proper description.
+
+    The projection is done right after the filters, so that it can make use of covered indexes. The document ID
+    and any field required by later stages (e.g., for sorting) are always included.
+    """
+
+    fields: list[Enum] | None = Query(None, description="Fields to include in results (all if not given)")
+
+    def _project(self) -> list[dict]:
+        """Generates projection stage for pipeline (if there are fields to select)"""
+        if not self.fields:
+            return []
+        fields = set(self.fields) | self._required_fields()
+        return [{"$project": {field: 1 for field in sorted(fields)}}]
+
+    def _query_pipeline(self) -> list[dict]:
+        return super()._query_pipeline() + self._project()
 
 
 @dataclasses.dataclass
@@ -101,17 +140,15 @@ class BaseSortedQuery(BaseQuery):
     order_by: Enum
     direction: Direction = Query(Direction.descending, description="Sort by ascending or descending values")
 
+    def _required_fields(self) -> set[str]:
+        return super()._required_fields() | {self.order_by}
+
     def _sort(self) -> list[dict]:
         """Generates sort stage for pipeline"""
         return [{"$sort": {self.order_by: self.direction}}]
 
-    def pipeline(self) -> list[dict]:
-        """Aggregation pipeline for mongo.
-
-        Returns:
-            list[dict]: List with stages for mongo pipeline
-        """
-        return super().pipeline() + self._sort()
+    def _pipeline(self) -> list[dict]:
+        return super()._pipeline() + self._sort()
 
 
 @dataclasses.dataclass
@@ -119,7 +156,11 @@ class BasePaginatedQuery(BaseSortedQuery):
     """Base class for handling typical queries on reports with pagination."""
 
     page: int = Query(1, description="Page for paginated results", ge=1)
-    page_size: int = Query(10, description="Number of reports per page", ge=1)
+    # Pages in a `$facet` are given in a single document, which cannot exceed 16 MB (see `facet_pipeline`)
+    page_size: int = Query(10, description="Number of reports per page", ge=1, le=1000)
+    cursor: str | None = Query(
+        None, description="Cursor for keyset pagination (empty for first page). Takes precedence over `page`"
+    )
 
     @property
     def skip(self) -> int:
@@ -131,5 +172,56 @@ class BasePaginatedQuery(BaseSortedQuery):
         """Number of documents per page"""
         return self.page_size
 
-    def pipeline(self) -> list[dict]:
-        return super().pipeline() + [{"$skip": self.skip}, {"$limit": self.limit}]
+    def _after(self, value, oid) -> list[dict]:
+        """Generates match stage for documents strictly after the given sort key and ID"""
+        op, bound = ("$gt", "$gte") if self.direction == Direction.ascending else ("$lt", "$lte")
+        return [{"$match": {self.order_by: {bound: value}, "$or": [{self.order_by: {op: value}}, {"_id": {op: oid}}]}}]
+
+    def _page(self) -> list[dict]:
+        """Generates stages for selecting the requested page (after sorting)"""
+        return [{"$skip": self.skip}, {"$limit": self.limit}]
+
+    def _keyset(self, after: tuple | None) -> list[dict]:
+        """Generates stages for sorting and selecting the page coming after the given sort key and ID"""
+        after = self._after(*after) if after else []
+        return after + [{"$sort": {self.order_by: self.direction, "_id": self.direction}}, {"$limit": self.limit}]
+
+    def _pipeline(self) -> list[dict]:
+        return super()._pipeline() + self._page()
+
+    def keyset_pipeline(self, after: tuple | None = None) -> list[dict]:
+        """Aggregation pipeline for mongo using keyset (cursor) pagination.
+
+        Instead of skipping documents, this selects those coming after the last document of the
+        previous page. The document ID is used to break ties in the sorting field, so that the order
+        is unique and no documents are repeated or lost between pages.
+
+        Args:
+            after (tuple, optional): Value of the sorting field and ID of the last document in the
+                previous page. If not given, the pipeline will return the first page
+
+        Returns:
+            list[dict]: List with stages for mongo pipeline
+        """
+        return optimize(self._query_pipeline() + self._keyset(after))
+
+    def facet_pipeline(self, after: tuple | None = None) -> list[dict]:
+        """Aggregation pipeline for mongo to get both the total and the requested page.
+
+        The output of the aggregation will be a single document with a field called `total`, which has
+        the total number of elements, and a field called `results`, with the documents in the page.
+        The documents are paginated by keyset if `cursor` is defined.
+
+        Note that sorting inside `$facet` cannot use indexes, so this is best suited for queries
+        that cannot use them anyway (e.g., sorting after grouping).
+
+        Args:
+            after (tuple, optional): Only used with keyset pagination (see `keyset_pipeline`)
+
+        Returns:
+            list[dict]: List with stages for mongo pipeline
+        """
+        results = self._sort() + self._page() if self.cursor is None else self._keyset(after)
+        facet = {"total": [{"$count": "total"}], "results": results}
+        total = {"$ifNull": [{"$arrayElemAt": ["$total.total", 0]}, 0]}
+        return optimize(self._query_pipeline() + [{"$facet": facet}, {"$set": {"total": total}}])
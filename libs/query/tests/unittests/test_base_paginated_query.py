@@ -52,7 +52,7 @@ def test_query_pipeline_skips_according_to_parameters():
 
 
 def test_query_pipeline_sorted_according_to_parameters():
-    q = MockQuery(attr1="mock", order_by="key", direction=-1)
+    q = MockQuery(attr1="mock", order_by="key", direction=-1, page=2)
 
     assert q.pipeline()[-3] == {"$sort": {"key": -1}}
 
@@ -83,3 +83,60 @@ def test_query_pipeline_with_non_positive_page_fails():
 def test_query_pipeline_with_non_positive_page_size_fails():
     with pytest.raises(ValidationError, match="greater than or equal to 1"):
         MockQuery(attr1="mock", order_by="key", page_size=0)
+
+
+def test_query_pipeline_with_page_size_over_maximum_fails():
+    with pytest.raises(ValidationError, match="less than or equal to 1000"):
+        MockQuery(attr1="mock", order_by="key", page_size=1001)
+
+
+def test_query_keyset_pipeline_without_cursor_starts_from_first_document():
+    q = MockQuery(attr1="mock", order_by="key", direction=-1, page_size=6, cursor="")
+
+    assert q.keyset_pipeline() == [
+        {"$match": {"field1": {"$op1": "mock"}}},
+        {"$sort": {"key": -1, "_id": -1}},
+        {"$limit": 6},
+    ]
+
+
+def test_query_keyset_pipeline_descending_matches_documents_after_cursor():
+    q = MockQuery(attr1="mock", order_by="key", direction=-1, cursor="cursor")
+
+    after = {"key": {"$lte": 5}, "$or": [{"key": {"$lt": 5}}, {"_id": {"$lt": "oid"}}]}
+    assert q.keyset_pipeline((5, "oid"))[0] == {"$match": {"field1": {"$op1": "mock"}, **after}}
+
+
+def test_query_keyset_pipeline_ascending_matches_documents_after_cursor():
+    q = MockQuery(attr1="mock", order_by="key", direction=1, cursor="cursor")
+
+    after = {"key": {"$gte": 5}, "$or": [{"key": {"$gt": 5}}, {"_id": {"$gt": "oid"}}]}
+    assert q.keyset_pipeline((5, "oid"))[0] == {"$match": {"field1": {"$op1": "mock"}, **after}}
+
+
+def test_query_keyset_pipeline_does_not_include_skip():
+    q = MockQuery(attr1="mock", order_by="key", page=3, cursor="cursor")
+
+    assert all("$skip" not in stage for stage in q.keyset_pipeline((5, "oid")))
+
+
+def test_query_facet_pipeline_counts_and_paginates_in_single_stage():
+    q = MockQuery(attr1="mock", order_by="key", direction=-1, page=3, page_size=6)
+
+    pipeline = q.facet_pipeline()
+    assert pipeline[0] == {"$match": {"field1": {"$op1": "mock"}}}
+    assert pipeline[1] == {
+        "$facet": {
+            "total": [{"$count": "total"}],
+            "results": [{"$sort": {"key": -1}}, {"$skip": q.skip}, {"$limit": q.limit}],
+        }
+    }
+    assert pipeline[2] == {"$set": {"total": {"$ifNull": [{"$arrayElemAt": ["$total.total", 0]}, 0]}}}
+
+
+def test_query_facet_pipeline_with_cursor_uses_keyset_pagination():
+    q = MockQuery(attr1="mock", order_by="key", direction=-1, cursor="cursor")
+
+    after = {"key": {"$lte": 5}, "$or": [{"key": {"$lt": 5}}, {"_id": {"$lt": "oid"}}]}
+    results = q.facet_pipeline((5, "oid"))[1]["$facet"]["results"]
+    assert results == [{"$match": after}] + q.keyset_pipeline((5, "oid"))[1:]
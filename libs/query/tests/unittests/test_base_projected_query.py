@@ -0,0 +1,36 @@
+from fastapi import Query
+from pydantic import dataclasses
+
+from query import BaseProjectedQuery, BasePaginatedQuery, QueryRecipe
+
+
+@dataclasses.dataclass
+class MockQuery(BaseProjectedQuery):
+    fields: list[str] | None = Query(None)
+    attr1: str = Query()
+
+    recipes = (QueryRecipe("field1", ["$op1"], ["attr1"]),)
+
+
+@dataclasses.dataclass
+class MockSortedQuery(MockQuery, BasePaginatedQuery):
+    order_by: str = Query("default")
+
+
+def test_query_pipeline_without_fields_does_not_project():
+    q = MockQuery(attr1="mock")
+
+    assert all("$project" not in stage for stage in q.pipeline())
+
+
+def test_query_pipeline_with_fields_projects_right_after_match():
+    q = MockQuery(attr1="mock", fields=["field2", "field1"])
+
+    assert q.pipeline() == [{"$match": {"field1": {"$op1": "mock"}}}, {"$project": {"field1": 1, "field2": 1}}]
+
+
+def test_query_pipeline_with_fields_includes_sorting_field():
+    q = MockSortedQuery(attr1="mock", fields=["field2"], order_by="key")
+
+    assert q.pipeline()[1] == {"$project": {"field2": 1, "key": 1}}
+    assert q.pipeline()[2] == {"$sort": {"key": -1}}
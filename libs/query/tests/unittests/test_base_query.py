@@ -55,3 +55,11 @@ def test_query_count_pipeline_finishes_in_count_stage_with_total_field():
     q = MockQuery(attr1="mock")
 
     assert q.count_pipeline()[-1] == {"$count": "total"}
+
+
+def test_query_pipeline_converts_conditions():
+    @dataclasses.dataclass
+    class ConvertedQuery(MockQuery):
+        recipes = (QueryRecipe("field1", ["prefix"], ["attr1"], lambda condition: {"$gte": condition["prefix"]}),)
+
+    assert ConvertedQuery(attr1="mock").pipeline() == [{"$match": {"field1": {"$gte": "mock"}}}]
@@ -0,0 +1,110 @@
+from enum import Enum
+
+from query import optimize
+
+
+group = {"$group": {"_id": "$object", "last": {"$max": "$date"}, "count": {"$count": {}}}}
+rename = {"$set": {"object": "$_id"}}
+
+
+def test_optimize_removes_stages_doing_nothing():
+    pipeline = [{"$match": {}}, {"$set": {}}, {"$sort": {"date": 1}}, {"$skip": 0}, {"$limit": 10}]
+
+    assert optimize(pipeline) == [{"$sort": {"date": 1}}, {"$limit": 10}]
+
+
+def test_optimize_merges_consecutive_stages():
+    pipeline = [{"$sort": {"a": 1}}, {"$sort": {"b": 1}}, {"$skip": 5}, {"$skip": 5}, {"$limit": 10}, {"$limit": 4}]
+
+    assert optimize(pipeline) == [{"$sort": {"b": 1}}, {"$skip": 10}, {"$limit": 4}]
+
+
+def test_optimize_moves_match_before_sort_and_merges_it():
+    pipeline = [{"$match": {"a": 1}}, {"$sort": {"date": 1}}, {"$match": {"b": 2}}, {"$match": {"a": {"$gt": 0}}}]
+
+    assert optimize(pipeline) == [
+        {"$match": {"$and": [{"a": 1, "b": 2}, {"a": {"$gt": 0}}]}},
+        {"$sort": {"date": 1}},
+    ]
+
+
+def test_optimize_moves_match_before_stages_not_changing_its_fields():
+    pipeline = [{"$set": {"b": 1}}, {"$unset": "c"}, {"$project": {"a": 1, "d": 1}}, {"$match": {"a": 1}}]
+
+    assert optimize(pipeline)[0] == {"$match": {"a": 1}}
+
+
+def test_optimize_keeps_match_after_stages_changing_its_fields():
+    for stage in [{"$set": {"a": 1}}, {"$set": {"a.b": 1}}, {"$unset": ["a"]}, {"$project": {"b": 1}}, {"$project": {"a": 0}}]:
+        assert optimize([stage, {"$match": {"a": 1}}]) == [stage, {"$match": {"a": 1}}]
+
+
+def test_optimize_keeps_match_with_unknown_fields_in_place():
+    pipeline = [{"$set": {"b": 1}}, {"$match": {"$expr": {"$eq": ["$a", 1]}}}]
+
+    assert optimize(pipeline) == pipeline
+
+
+def test_optimize_filters_key_of_group_before_grouping():
+    after = {"object": {"$lte": "ZTF2"}, "$or": [{"object": {"$lt": "ZTF2"}}, {"_id": {"$lt": "ZTF2"}}]}
+    pipeline = [{"$match": {"date": {"$gte": 1}}}, group, rename, {"$match": after}, {"$sort": {"object": -1}}]
+
+    assert optimize(pipeline) == [
+        {"$match": {"date": {"$gte": 1}, "object": {"$lte": "ZTF2"}, "$or": [{"object": {"$lt": "ZTF2"}}] * 2}},
+        group,
+        rename,
+        {"$sort": {"object": -1}},
+    ]
+
+
+def test_optimize_keeps_match_after_group_if_not_only_over_key():
+    for condition in [{"count": {"$gt": 1}}, {"object": "ZTF1", "last": 1}, {"object": {"$exists": True}}]:
+        assert optimize([group, rename, {"$match": condition}])[0] == group
+
+
+def test_optimize_keeps_sort_by_key_of_group_after_grouping():
+    pipeline = [group, rename, {"$sort": {"object": 1}}, {"$limit": 5}]
+
+    assert optimize(pipeline) == pipeline
+
+
+def test_optimize_removes_sort_before_group_not_depending_on_order():
+    first = {"$group": {"_id": "$object", "first": {"$first": "$date"}}}
+
+    assert optimize([{"$sort": {"object": 1}}, group]) == [group]
+    assert optimize([{"$sort": {"date": 1}}, first]) == [{"$sort": {"date": 1}}, first]
+
+
+def test_optimize_count_removes_sort_and_fields():
+    pipeline = [{"$match": {"a": 1}}, group, rename, {"$sort": {"count": -1}}, {"$project": {"count": 1}}, {"$count": "total"}]
+
+    assert optimize(pipeline) == [{"$match": {"a": 1}}, group, {"$count": "total"}]
+
+
+def test_optimize_count_keeps_sort_if_it_changes_counted_documents():
+    pipeline = [{"$sort": {"date": 1}}, {"$limit": 5}, {"$match": {"a": 1}}, {"$count": "total"}]
+
+    assert optimize(pipeline) == pipeline
+
+
+def test_optimize_count_keeps_fields_used_by_later_stages():
+    pipeline = [{"$set": {"b": "$a"}}, group, {"$count": "total"}]
+
+    assert optimize(pipeline) == pipeline
+
+
+def test_optimize_pipelines_inside_facet():
+    results = [{"$sort": {"a": 1}}, {"$skip": 0}, {"$limit": 1}]
+
+    assert optimize([{"$facet": {"total": [{"$count": "total"}], "results": results}}]) == [
+        {"$facet": {"total": [{"$count": "total"}], "results": [{"$sort": {"a": 1}}, {"$limit": 1}]}}
+    ]
+
+
+def test_optimize_uses_values_of_enumerations_as_fields():
+    class Fields(str, Enum):
+        id = "_id"
+
+    pipeline = [group, {"$match": {Fields.id: "ZTF1"}}]
+
+    assert optimize(pipeline) == [{"$match": {"object": "ZTF1"}}, group]
@@ -0,0 +1,41 @@
+"""Compares two result files of `benchmarks.suite` (e.g., from different commits).
+
+Run from the root of the service with
+
+    python -m benchmarks.compare before.json after.json --threshold 0.1
+
+Prints the ratio between the minimum times of each benchmark in both files and exits with an error if any
+of them is slower by more than the threshold (a fraction of the time before).
+"""
+import argparse
+import json
+import sys
+
+
+def compare(before: dict, after: dict, threshold: float) -> list[str]:
+    """Prints the comparison, returning the names of the benchmarks that regressed"""
+    for key in ("dataset_size", "backend"):
+        if before[key] != after[key]:
+            print(f"Warning: different {key} ({before[key]} and {after[key]})")
+
+    regressions = []
+    print(f"{'benchmark':<45} {'before (ms)':>11} {'after (ms)':>11} {'ratio':>7}")
+    for name, result in after["results"].items():
+        if name not in before["results"]:
+            continue
+        old, new = before["results"][name]["min"], result["min"]
+        regressed = new > old * (1 + threshold)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<45} {1000 * old:>11.4f} {1000 * new:>11.4f} {new / old:>6.2f}x{' <-' if regressed else ''}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before", help="Results taken as reference")
+    parser.add_argument("after", help="Results to compare")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Tolerated slowdown (default: 0.1)")
+    args = parser.parse_args()
+    with open(args.before) as f, open(args.after) as g:
+        sys.exit(1 if compare(json.load(f), json.load(g), args.threshold) else 0)
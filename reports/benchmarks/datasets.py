@@ -0,0 +1,45 @@
+"""Synthetic datasets of reports for benchmarks.
+
+Reports are generated deterministically from their position, so datasets of the same size are always the
+same. Each object is reported by `REPORTS_PER_OBJECT` different users (keeping the unique index over owner,
+object and report type), with dates spread over a year.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from bson import ObjectId
+from db_handler import MongoConnection
+
+from reports.database import models
+
+REPORTS_PER_OBJECT = 20
+START = datetime(2023, 1, 1)
+SOURCES = ["web", "api", "pipeline"]
+REPORT_TYPES = ["bogus", "misclassified", "interesting", "other"]
+
+
+def synthetic_reports(size: int, seed: int = 42) -> Iterator[dict]:
+    rng = random.Random(seed)
+    for i in range(size):
+        yield {
+            "_id": ObjectId(f"{i:024x}"),
+            "date": START + timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+            "object": f"ZTF{i // REPORTS_PER_OBJECT:09d}",
+            "solved": rng.random() < 0.3,
+            "source": rng.choice(SOURCES),
+            "observation": "observation",
+            "report_type": rng.choice(REPORT_TYPES),
+            "owner": f"user{i % REPORTS_PER_OBJECT}",
+        }
+
+
+async def populate(connection: MongoConnection, size: int, batch_size: int = 10000):
+    """Inserts the dataset of the given size, unless the collection already has that many reports"""
+    collection = connection.db[models.Report.__tablename__]
+    if await collection.estimated_document_count() == size:
+        return
+    await collection.delete_many({})
+    reports = synthetic_reports(size)
+    while batch := [report for _, report in zip(range(batch_size), reports)]:
+        await collection.insert_many(batch, ordered=False)
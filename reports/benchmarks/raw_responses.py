@@ -0,0 +1,62 @@
+"""Compares the time taken to build the response of `GET /` from the BSON sent by the database.
+
+The default path decodes the documents, validates them against the response model and serializes them,
+while the fast path keeps them as raw BSON until encoding them as JSON (decoding each one just before),
+skipping the validation.
+
+Run from the root of the service with `python -m benchmarks.raw_responses` (no database is required).
+"""
+import json
+import timeit
+from datetime import datetime
+
+import bson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from db_handler import encode_json
+from fastapi.encoders import jsonable_encoder
+
+from reports import schemas
+
+PAGE_SIZES = [10, 100, 1000]
+
+
+def _page(results: list) -> dict:
+    return {"count": len(results), "count_is_exact": True, "next": None, "previous": None, "results": results}
+
+
+def _report(i: int) -> bytes:
+    report = {
+        "_id": ObjectId(),
+        "date": datetime.utcnow().replace(microsecond=0),
+        "object": f"ZTF{i:09d}",
+        "solved": False,
+        "source": "source",
+        "observation": "observation",
+        "report_type": "report_type",
+        "owner": "owner",
+    }
+    return bson.encode(report)
+
+
+def default_path(documents: list[bytes]) -> bytes:
+    page = schemas.PaginatedReports(**_page([bson.decode(document) for document in documents]))
+    return json.dumps(jsonable_encoder(page, by_alias=True, exclude_unset=True)).encode()
+
+
+def fast_path(documents: list[bytes]) -> bytes:
+    return encode_json(_page([RawBSONDocument(document) for document in documents]))
+
+
+def main(repeat: int = 5, number: int = 20):
+    print(f"{'page size':>10} {'default (ms)':>14} {'fast (ms)':>10} {'speedup':>8}")
+    for size in PAGE_SIZES:
+        documents = [_report(i) for i in range(size)]
+        assert json.loads(default_path(documents)) == json.loads(fast_path(documents))
+        default = min(timeit.repeat(lambda: default_path(documents), repeat=repeat, number=number)) / number
+        fast = min(timeit.repeat(lambda: fast_path(documents), repeat=repeat, number=number)) / number
+        print(f"{size:>10} {1000 * default:>14.3f} {1000 * fast:>10.3f} {default / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Benchmarks of the query pipelines, validation of models and queries done by the routes listing reports.
+
+Database benchmarks run over a synthetic dataset (see `benchmarks.datasets`), either in memory (default)
+or in MongoDB, using the same environment variables as the service. With MongoDB, the reports are inserted
+in a separate database (named after the configured one with the suffix `_benchmarks`), which is kept
+between runs to avoid inserting them again. The in-memory backend is best suited for up to about a
+million reports.
+
+Run from the root of the service with
+
+    python -m benchmarks.suite --dataset-size 10000 --backend memory --output results.json
+
+The results are saved as JSON, to be compared between commits with `python -m benchmarks.compare`.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import re
+import subprocess
+import timeit
+from datetime import datetime
+from typing import Callable
+
+from bson import ObjectId
+from db_handler import InMemoryConnection, ModelMetaclass, MongoConnection, PyObjectId
+from db_handler._utils import encode_cursor
+from pydantic import BaseModel, Field
+from pymongo import IndexModel
+
+from reports import filters
+from reports.database import get_settings, models
+
+from .datasets import populate, synthetic_reports
+
+PAGE_SIZES = [10, 100, 1000]
+PAGES = [1, 10, 100]
+FILTERS = {"date_after": datetime(2023, 1, 1), "date_before": datetime(2023, 6, 1), "object": re.compile("^ZTF0")}
+
+
+def measure(function: Callable, repeat: int, min_time: float) -> dict:
+    """Seconds per call of the function (minimum and mean of `repeat` rounds of at least `min_time` seconds)"""
+    timer = timeit.Timer(function)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / elapsed)) if elapsed < min_time else number
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {"min": min(times), "mean": sum(times) / len(times), "calls": number * repeat}
+
+
+def pipeline_cases() -> dict[str, Callable]:
+    projected = filters.QueryByReport(**FILTERS, fields=[filters.ReportFields.object, filters.ReportFields.owner])
+    keyset = filters.QueryByReport(**FILTERS, cursor="")
+    after = (datetime(2023, 3, 1), ObjectId())
+    return {
+        "pipeline/without_filters": filters.QueryByReport().pipeline,
+        "pipeline/with_filters_and_projection": projected.pipeline,
+        "pipeline/count": filters.QueryByReport(**FILTERS).count_pipeline,
+        "pipeline/keyset": lambda: keyset.keyset_pipeline(after),
+        "pipeline/facet_by_object": filters.QueryByObject(**FILTERS).facet_pipeline,
+        "pipeline/by_day": filters.QueryByDay(**FILTERS).pipeline,
+    }
+
+
+def _create_model(names: itertools.count):
+    name = f"benchmark{next(names)}"
+    namespace = {
+        "__tablename__": name,
+        "__indexes__": [IndexModel([("field", 1)])],
+        "__annotations__": {"id": PyObjectId, "field": str},
+        "id": Field(default_factory=PyObjectId, alias="_id"),
+    }
+    ModelMetaclass.__models__.discard(ModelMetaclass(name, (BaseModel,), namespace))  # Keeps the registry as it was
+
+
+def model_cases() -> dict[str, Callable]:
+    oid, report, names = ObjectId(), next(synthetic_reports(1)), itertools.count()
+    return {
+        "models/object_id_from_string": lambda: PyObjectId.validate(str(oid)),
+        "models/object_id_from_object_id": lambda: PyObjectId.validate(oid),
+        "models/report_validation": lambda: models.Report(**report).dict(by_alias=True),
+        "models/model_creation": lambda: _create_model(names),
+    }
+
+
+def database_cases(loop: asyncio.AbstractEventLoop, connection: MongoConnection) -> dict[str, Callable]:
+    def run(coroutine_function, *args, **kwargs):
+        return lambda: loop.run_until_complete(coroutine_function(*args, **kwargs))
+
+    cases = {}
+    for page, page_size in itertools.product(PAGES, PAGE_SIZES):
+        q = filters.QueryByReport(page=page, page_size=page_size)
+        cases[f"database/paginated/page={page},size={page_size}"] = run(
+            connection.read_paginated_documents, models.Report, q, raw=True
+        )
+        cursor = ""
+        if page > 1:  # Cursor pointing to the last report of the previous page
+            previous = filters.QueryByReport(page=page - 1, page_size=page_size)
+            documents = loop.run_until_complete(connection.read_multiple_documents(models.Report, previous))
+            if not documents:  # Page beyond the end of the dataset
+                continue
+            cursor = encode_cursor(documents[-1]["date"], documents[-1]["_id"], previous.order_by, previous.direction)
+        q = filters.QueryByReport(page_size=page_size, cursor=cursor)
+        cases[f"database/keyset/page={page},size={page_size}"] = run(
+            connection.read_paginated_documents, models.Report, q, raw=True
+        )
+    for page_size in PAGE_SIZES:
+        q = filters.QueryByObject(page_size=page_size)
+        cases[f"database/by_object/size={page_size}"] = run(connection.read_paginated_documents, models.Report, q, facet=True)
+        cases[f"database/by_object_summary/size={page_size}"] = run(
+            connection.read_paginated_documents, models.object_summaries, q.summary()
+        )
+    cases["database/by_day"] = run(connection.read_multiple_documents, models.Report, filters.QueryByDay())
+    pipeline = filters.QueryByDay().rollup_pipeline(models.daily_counts)
+    cases["database/by_day_rollup"] = run(connection.read_rollup, models.daily_counts, pipeline)
+    return cases
+
+
+def _connection(backend: str) -> MongoConnection:
+    if backend == "memory":
+        return InMemoryConnection()
+    settings = get_settings()
+    return MongoConnection({**settings.dict(exclude_none=True), "database": f"{settings.database}_benchmarks"})
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(dataset_size: int, backend: str, select: str, repeat: int, min_time: float, output: str | None):
+    loop = asyncio.new_event_loop()
+    connection = _connection(backend)
+    loop.run_until_complete(connection.connect())
+    try:
+        cases = {**pipeline_cases(), **model_cases()}
+        if "database".startswith(select) or select.startswith("database"):
+            loop.run_until_complete(connection.create_db())
+            loop.run_until_complete(populate(connection, dataset_size))
+            loop.run_until_complete(connection.rebuild_rollups(models.Report))  # Reports are inserted directly
+            cases.update(database_cases(loop, connection))
+
+        results = {}
+        print(f"{'benchmark':<45} {'min (ms)':>10} {'mean (ms)':>10}")
+        for name, function in cases.items():
+            if not name.startswith(select):
+                continue
+            results[name] = measure(function, repeat, min_time)
+            print(f"{name:<45} {1000 * results[name]['min']:>10.4f} {1000 * results[name]['mean']:>10.4f}")
+    finally:
+        loop.run_until_complete(connection.close())
+        loop.close()
+
+    if output:
+        metadata = {"commit": _commit(), "date": datetime.utcnow().isoformat(), "python": platform.python_version()}
+        with open(output, "w") as f:
+            json.dump({**metadata, "dataset_size": dataset_size, "backend": backend, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-size", type=int, default=10000, help="Number of synthetic reports (default: 10000)")
+    parser.add_argument("--backend", choices=["memory", "mongodb"], default="memory", help="Database (default: memory)")
+    parser.add_argument("--select", default="", help="Only run benchmarks with names starting with this prefix")
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds per benchmark (default: 5)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per round (default: 0.2)")
+    parser.add_argument("--output", help="File to save the results as JSON")
+    args = parser.parse_args()
+    main(args.dataset_size, args.backend, args.select, args.repeat, args.min_time, args.output)
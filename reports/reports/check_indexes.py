@@ -0,0 +1,45 @@
+"""Checks that every combination of filters and sorting of the queries over reports is supported by indexes.
+
+Run with `python -m reports.check_indexes` (using the same environment variables as the service). Exits
+with an error if any combination scans the whole collection or sorts in memory, listing suggested indexes.
+"""
+import asyncio
+import re
+import sys
+from datetime import datetime, timedelta
+
+from db_handler import IndexAdvice, advise_indexes
+
+from . import filters
+from .database import get_connection, models
+
+
+SAMPLES = {
+    "date_after": datetime.utcnow() - timedelta(days=30),
+    "date_before": datetime.utcnow(),
+    "object": re.compile("^ZTF"),
+    "object_prefix": "ZTF",
+    "object_in": ["ZTF1", "ZTF2"],
+}
+
+QUERIES = [filters.QueryByReport, filters.QueryByObject, filters.QueryByDay]
+
+
+def describe(advice: IndexAdvice) -> str:
+    filters_ = ", ".join(advice.filters) or "no filters"
+    status = "OK" if advice.ok else f"suggested index: {dict(advice.suggestion.document['key'])}"
+    return f"{advice.query} ({filters_}; sort by {advice.sort}): {', '.join(advice.stages)} -> {status}"
+
+
+async def check() -> bool:
+    """Prints the result for every combination, returning whether all are supported by indexes"""
+    async with get_connection() as connection:
+        await connection.create_db()
+        advice = [a for q in QUERIES for a in await advise_indexes(connection, models.Report, q, SAMPLES)]
+    for item in advice:
+        print(describe(item))
+    return all(item.ok for item in advice)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(check()) else 1)
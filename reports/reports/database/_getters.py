@@ -1,10 +1,42 @@
 from functools import lru_cache
 
-from db_handler import MongoConnection
+from db_handler import (
+    ApproximateCount,
+    CircuitBreaker,
+    InMemoryConnection,
+    MongoConnection,
+    QueryCache,
+    QueryProfiler,
+    ReadCoalescer,
+    RetryPolicy,
+)
 
-from ..settings import get_settings
+from . import models
+from ..settings import get_settings, get_service_settings
 
 
 @lru_cache
 def get_connection() -> MongoConnection:
-    return MongoConnection(get_settings().dict())
+    settings = get_service_settings()
+    counter = ApproximateCount(ttl=settings.count_cache_ttl) if settings.approximate_count else None
+    cache = QueryCache(maxsize=settings.query_cache_size, ttl=settings.query_cache_ttl) if settings.query_cache_size else None
+    profiler = None
+    if settings.slow_query_threshold is not None:
+        profiler = QueryProfiler(threshold=settings.slow_query_threshold, explain_rate=settings.slow_query_explain_rate)
+    retry, breaker = None, None
+    if settings.retry_attempts > 1:
+        retry = RetryPolicy(attempts=settings.retry_attempts, deadline=settings.retry_deadline)
+    if settings.breaker_failure_threshold > 0:
+        breaker = CircuitBreaker(settings.breaker_failure_threshold, reset_timeout=settings.breaker_reset_timeout)
+    coalescer = ReadCoalescer() if settings.coalesce_reads else None
+    # Rollups that are not read are not kept either
+    rollups = ((models.daily_counts, settings.daily_rollup), (models.object_summaries, settings.object_summary))
+    disabled = [rollup for rollup, enabled in rollups if not enabled]
+    strategies = dict(counter=counter, cache=cache, profiler=profiler, retry=retry, breaker=breaker, coalescer=coalescer)
+    if settings.database_backend == "memory":
+        return InMemoryConnection(disabled_rollups=disabled, **strategies)
+    config = get_settings().dict(exclude_none=True)
+    if retry is not None:  # Each attempt must fail to select a server before the deadline, so that it can be retried
+        timeout = int(1000 * settings.retry_deadline / settings.retry_attempts)
+        config["server_selection_timeout_ms"] = min(config["server_selection_timeout_ms"], timeout)
+    return MongoConnection(config, disabled_rollups=disabled, **strategies)
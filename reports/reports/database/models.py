@@ -2,7 +2,7 @@ from datetime import datetime, timezone
 
 from pymongo import IndexModel
 from pydantic import BaseModel, Field
-from db_handler import PyObjectId, ModelMetaclass
+from db_handler import DailyCount, GroupSummary, PyObjectId, ModelMetaclass
 
 
 def _oid() -> PyObjectId:
@@ -15,11 +15,42 @@ def _utcnow() -> datetime:
     return now.replace(microsecond=(now.microsecond // 1000) * 1000, tzinfo=None)
 
 
+# Number of reports per day, source and type (used by the counts per day)
+daily_counts = DailyCount("reports_by_day", date="date", dimensions=("source", "report_type"))
+
+# Reports grouped by object (used by the queries by object). Includes ID to break ties in keyset pagination
+object_summaries = GroupSummary(
+    "report_objects",
+    key="object",
+    group={
+        "first_date": {"$min": "$date"},
+        "last_date": {"$max": "$date"},
+        "users": {"$addToSet": "$owner"},
+        "source": {"$addToSet": "$source"},
+        "report_type": {"$addToSet": "$report_type"},
+        "count": {"$count": {}},
+    },
+    indexes=[
+        IndexModel([("last_date", -1), ("_id", -1)]),
+        IndexModel([("first_date", -1), ("_id", -1)]),
+        IndexModel([("count", -1), ("_id", -1)]),
+        IndexModel([("object", 1)]),
+    ],
+)
+
+
 class Report(BaseModel, metaclass=ModelMetaclass):
     """Full mongo model for reports"""
 
     __tablename__ = "reports"
-    __indexes__ = [IndexModel([("owner", 1), ("object", 1), ("report_type", 1)], unique=True), IndexModel([("date", -1)])]
+    __indexes__ = [
+        IndexModel([("owner", 1), ("object", 1), ("report_type", 1)], unique=True),
+        # Includes ID to support keyset pagination by date (which uses the ID to break ties)
+        IndexModel([("date", -1), ("_id", -1)]),
+        # Used by the filters by object and to refresh the summaries of the objects of written reports
+        IndexModel([("object", 1)]),
+    ]
+    __rollups__ = [daily_counts, object_summaries]
 
     id: PyObjectId = Field(default_factory=_oid, description="Unique identifier in DB", alias="_id")
     date: datetime = Field(default_factory=_utcnow, description="Date and time of creation (UTC)")
@@ -1,36 +1,88 @@
-from datetime import datetime
+import re
+from dataclasses import fields
+from datetime import datetime, time, timezone
 from typing import Pattern, ClassVar
 
 import query
 from fastapi import Query
+from db_handler import DailyCount
 from pydantic import dataclasses
 
+from .database import models
 from .schemas import ReportOut, ReportByObject, ReportByDay
 
 
 ReportFields = query.field_enum_factory(ReportOut)
-ObjectFields = query.field_enum_factory(ReportByObject)
+# Counts are only given with some options, so these cannot be used for sorting
+ObjectFields = query.field_enum_factory(
+    ReportByObject, exclude={"source_count", "report_type_count", "users_count", "truncated"}
+)
 DayCountFields = query.field_enum_factory(ReportByDay)
 
 
+def _utc(date: datetime | None) -> datetime | None:
+    """Date in naive UTC, as stored in the database"""
+    if date is None or date.tzinfo is None:
+        return date
+    return date.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _prefix_range(prefix: str) -> dict:
+    """Condition for strings starting with the prefix as a range, which can use indexes"""
+    end = prefix.rstrip(chr(0x10FFFF))  # The last character cannot be incremented
+    return {"$gte": prefix, "$lt": end[:-1] + chr(ord(end[-1]) + 1)} if end else {"$gte": prefix}
+
+
+def _literal_prefix(pattern: Pattern) -> str | None:
+    """Prefix matched by a regular expression that only requires strings to start with it (e.g., `^ZTF21`)"""
+    if pattern.flags & ~re.UNICODE or not pattern.pattern.startswith("^"):
+        return None
+    prefix = re.sub(r"\\([^0-9A-Za-z])", r"\1", pattern.pattern[1:])  # Escaped characters are literal
+    unescaped = re.sub(r"\\[^0-9A-Za-z]", "", pattern.pattern[1:])
+    return prefix if prefix and not set(unescaped) & set(".^$*+?{}[]|()\\") else None
+
+
+def _object_condition(condition: dict) -> dict:
+    """Replaces prefixes of object IDs, given directly or as regular expressions, by ranges (which can use indexes)"""
+    condition = dict(condition)
+    if "prefix" in condition:
+        condition.update(_prefix_range(condition.pop("prefix")))
+    prefix = _literal_prefix(condition["$regex"]) if "$regex" in condition else None
+    if prefix is not None and "$gte" not in condition:
+        del condition["$regex"]
+        condition.update(_prefix_range(prefix))
+    return condition
+
+
 @dataclasses.dataclass
 class CommonQueries:
     date_after: datetime | None = Query(None, description="Starting date of reports")
     date_before: datetime | None = Query(None, description="End date of reports")
-    object: Pattern | None = Query(None, description="Reports for object IDs matching regex")
+    object: Pattern | None = Query(
+        None, description="Reports for object IDs matching regex. Only patterns like `^ZTF21` (a prefix) can use indexes"
+    )
+    object_prefix: str | None = Query(None, description="Reports for object IDs starting with the given prefix")
+    object_in: list[str] | None = Query(None, description="Reports for any of the given object IDs")
     owned: bool = Query(False, description="Whether to include only reports owned by requesting user")
 
     recipes: ClassVar[tuple[query.QueryRecipe]] = (
         query.QueryRecipe("date", ["$gte", "$lte"], ["date_after", "date_before"]),
-        query.QueryRecipe("object", ["$regex"], ["object"]),
+        query.QueryRecipe("object", ["$regex", "prefix", "$in"], ["object", "object_prefix", "object_in"], _object_condition),
     )
 
+    @property
+    def _filters_object(self) -> bool:
+        return self.object is not None or self.object_prefix is not None or self.object_in is not None
+
 
 @dataclasses.dataclass
-class QueryByReport(CommonQueries, query.BasePaginatedQuery):
+class QueryByReport(CommonQueries, query.BaseProjectedQuery, query.BasePaginatedQuery):
     """Queries that will return individual reports, directly as they come from the database."""
 
     order_by: ReportFields = Query(ReportFields.date, description="Field to sort by")
+    fields: list[ReportFields] | None = Query(
+        None, description="Fields to include in results (all if not given). ID and sorting field are always included"
+    )
 
 
 @dataclasses.dataclass
@@ -38,18 +90,88 @@ class QueryByObject(CommonQueries, query.BasePaginatedQuery):
     """Queries that will return reports grouped by object."""
 
     order_by: ObjectFields = Query(ObjectFields.last_date, description="Field to sort by")
+    set_size: int | None = Query(
+        None, ge=1, description="Maximum number of users, sources and types per object, keeping the first alphabetically"
+    )
+    distinct_counts: bool = Query(False, description="Whether to give only the number of users, sources and types")
+
+    sets: ClassVar[tuple[str]] = ("users", "source", "report_type")
+
+    def _bounded_sets(self, sets: tuple[str]) -> list[dict]:
+        """Stages adding the number of values in each set (as `<set>_count`) and either removing the sets (for
+        `distinct_counts`) or keeping only their first values (up to `set_size`), flagging if any is `truncated`"""
+        stages = [{"$set": {f"{name}_count": {"$size": f"${name}"} for name in sets}}]
+        if self.distinct_counts:
+            return stages + [{"$unset": list(self.sets)}]
+        values = {name: {"$slice": [{"$sortArray": {"input": f"${name}", "sortBy": 1}}, self.set_size]} for name in sets}
+        truncated = {"$or": [{"$gt": [f"${name}_count", self.set_size]} for name in self.sets]}
+        return stages + [{"$set": {**values, "truncated": truncated}}]
 
     def _query_pipeline(self) -> list[dict]:
-        group = {
-            "_id": "$object",
+        if self.set_size is None and not self.distinct_counts:
+            group = {"_id": "$object", **models.object_summaries.group}
+            return super()._query_pipeline() + [{"$group": group}, {"$set": {"object": "$_id"}}]
+
+        # Reports are grouped by user first, so that no group holds every user of an object in memory
+        by_user = {
+            "_id": {"object": "$object", "user": "$owner"},
             "first_date": {"$min": "$date"},
             "last_date": {"$max": "$date"},
-            "users": {"$addToSet": "$owner"},
+            "count": {"$count": {}},
             "source": {"$addToSet": "$source"},
             "report_type": {"$addToSet": "$report_type"},
-            "count": {"$count": {}},
         }
-        return super()._query_pipeline() + [{"$group": group}, {"$set": {"object": "$_id"}}]
+        by_object = {
+            "_id": "$_id.object",
+            "first_date": {"$min": "$first_date"},
+            "last_date": {"$max": "$last_date"},
+            "count": {"$sum": "$count"},
+            "users_count": {"$count": {}},
+            "source": {"$addToSet": "$source"},
+            "report_type": {"$addToSet": "$report_type"},
+        }
+        if not self.distinct_counts:
+            by_object["users"] = {"$topN": {"n": self.set_size, "sortBy": {"_id.user": 1}, "output": "$_id.user"}}
+        # Sources and types (few different values) are kept as sets of the sets of each user and merged
+        merged = {
+            name: {"$reduce": {"input": f"${name}", "initialValue": [], "in": {"$setUnion": ["$$value", "$$this"]}}}
+            for name in ("source", "report_type")
+        }
+        stages = [{"$group": by_user}, {"$group": by_object}, {"$set": {"object": "$_id", **merged}}]
+        return super()._query_pipeline() + stages + self._bounded_sets(("source", "report_type"))
+
+    def summary(self) -> "QuerySummaryByObject | None":
+        """Query giving the same results over the summaries of objects, if possible.
+
+        This is only the case without filters by date, since these change the reports included in each object.
+        """
+        if self.date_after is not None or self.date_before is not None:
+            return None
+        return QuerySummaryByObject(**{field.name: getattr(self, field.name) for field in fields(self)})
+
+
+@dataclasses.dataclass
+class QuerySummaryByObject(QueryByObject):
+    """Queries over the summaries of objects (see `models.object_summaries`), which are already grouped."""
+
+    @property
+    def _bounded_after_page(self) -> bool:
+        """Whether the sets can be bounded after selecting the page, so that sorting can use the indexes"""
+        return self.order_by not in self.sets
+
+    def _bounds(self) -> list[dict]:
+        if self.set_size is None and not self.distinct_counts:
+            return []
+        return self._bounded_sets(self.sets)
+
+    def _query_pipeline(self) -> list[dict]:
+        return self._match() + ([] if self._bounded_after_page else self._bounds())
+
+    def _page(self) -> list[dict]:
+        return super()._page() + (self._bounds() if self._bounded_after_page else [])
+
+    def _keyset(self, after: tuple | None) -> list[dict]:
+        return super()._keyset(after) + (self._bounds() if self._bounded_after_page else [])
 
 
 @dataclasses.dataclass
@@ -61,3 +183,20 @@ class QueryByDay(CommonQueries, query.BaseSortedQuery):
     def _query_pipeline(self) -> list[dict]:
         group = {"_id": {"$dateTrunc": {"date": "$date", "unit": "day"}}, "count": {"$count": {}}}
         return super()._query_pipeline() + [{"$group": group}, {"$set": {"day": "$_id"}}]
+
+    def rollup_pipeline(self, rollup: DailyCount) -> list[dict] | None:
+        """Pipeline giving the same results over the counts of the rollup, if possible.
+
+        This is only the case without filters by object and with dates including whole days (in UTC),
+        i.e., starting at midnight and ending at the last millisecond of a day.
+        """
+        if self._filters_object:
+            return None
+        after, before = (_utc(date) for date in (self.date_after, self.date_before))
+        if after is not None and after.time() != time.min:
+            return None
+        if before is not None and before.time() < time(23, 59, 59, 999000):
+            return None
+        days = {"$gte": after, "$lte": before and datetime.combine(before.date(), time.min)}
+        match = {"day": {k: v for k, v in days.items() if v is not None}}
+        return rollup.pipeline(match if match["day"] else {}) + self._sort()
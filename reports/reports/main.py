@@ -1,12 +1,16 @@
 """API for interacting with reports"""
-from db_handler import DocumentNotFound
+import asyncio
+
+from db_handler import CircuitOpen, DocumentNotFound, InvalidCursor
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
-from pymongo.errors import DuplicateKeyError, ServerSelectionTimeoutError
+from pymongo.errors import ConnectionFailure, DuplicateKeyError
 from starlette_prometheus import metrics, PrometheusMiddleware
 
-from .database import get_connection
+from .database import get_connection, models
+from .monitoring import server_timing, track_breaker, track_coalescer, track_operations, track_pool
 from .routes import root
+from .settings import get_service_settings
 from . import __version__
 
 
@@ -18,7 +22,14 @@ app = FastAPI(
 )
 
 app.add_middleware(PrometheusMiddleware)
+app.middleware("http")(server_timing)
 app.add_route("/metrics", metrics)
+track_pool(get_connection().pool_monitor)
+track_operations(get_connection().operation_monitor)
+if get_connection().breaker is not None:
+    track_breaker(get_connection().breaker)
+if get_connection().coalescer is not None:
+    track_coalescer(get_connection().coalescer)
 
 app.include_router(root)
 
@@ -26,26 +37,62 @@ app.include_router(root)
 @app.on_event("startup")
 async def startup():
     await get_connection().connect()
-    await get_connection().create_db()
+    if get_service_settings().background_indexes:
+        # Missing indexes are built while serving requests (these can be slower until the build finishes)
+        app.state.indexer = asyncio.create_task(get_connection().create_db())
+    else:
+        await get_connection().create_db()
+    if get_service_settings().watch_changes:
+        # Keeps caches in line with writes made by other replicas of the service
+        app.state.watcher = asyncio.create_task(get_connection().watch_changes(models.Report))
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    for task in ("indexer", "watcher"):
+        if getattr(app.state, task, None) is not None:
+            getattr(app.state, task).cancel()
+            setattr(app.state, task, None)
     await get_connection().close()
 
 
+@app.get("/health/live", include_in_schema=False)
+async def liveness():
+    """The service is running (does not check the database)"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness():
+    """The service can handle requests, i.e., the database is reachable"""
+    if not await get_connection().ping():
+        return JSONResponse(status_code=503, content={"status": "unavailable"})
+    return {"status": "ready"}
+
+
 @app.exception_handler(DuplicateKeyError)
 async def bad_request_for_duplicates(request, exc):
     message = f"Duplicate document in database: {str(exc)}"
     return JSONResponse(status_code=400, content={"detail": message})
 
 
-@app.exception_handler(ServerSelectionTimeoutError)
+@app.exception_handler(ConnectionFailure)
 async def database_is_down(request, exc):
     message = f"Cannot connect to database server: {str(exc)}"
     return JSONResponse(status_code=503, content={"detail": message})
 
 
+@app.exception_handler(CircuitOpen)
+async def database_is_unreachable(request, exc):
+    headers = {"Retry-After": str(max(round(exc.retry_after), 1))}
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
+
+
 @app.exception_handler(DocumentNotFound)
 async def document_not_found(request, exc):
     return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+
+@app.exception_handler(InvalidCursor)
+async def bad_request_for_invalid_cursor(request, exc):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
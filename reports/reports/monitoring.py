@@ -0,0 +1,75 @@
+import time
+from contextvars import ContextVar
+
+from db_handler import CircuitBreaker, OperationMonitor, PoolMonitor, ReadCoalescer
+from prometheus_client import Counter, Gauge, Histogram
+
+
+POOL_OPEN = Gauge("mongodb_pool_open_connections", "Open connections to MongoDB")
+POOL_CHECKED_OUT = Gauge("mongodb_pool_checked_out_connections", "Connections to MongoDB currently in use")
+POOL_WAITING = Gauge("mongodb_pool_wait_queue_length", "Operations waiting for a connection to MongoDB")
+POOL_CHECKOUT_FAILURES = Gauge("mongodb_pool_checkout_failures", "Failed checkouts of connections to MongoDB")
+POOL_CHECKOUT_LATENCY = Histogram("mongodb_pool_checkout_seconds", "Time taken to check out a connection to MongoDB")
+
+BREAKER_STATE = Gauge("mongodb_circuit_breaker_state", "State of the circuit breaker (0: closed, 1: half open, 2: open)")
+
+READS = Gauge("mongodb_coalescer_reads", "Aggregations requested to MongoDB (including coalesced ones)")
+READS_COALESCED = Gauge("mongodb_coalescer_coalesced_reads", "Aggregations that reused a running identical one")
+READS_COALESCED_RATIO = Gauge("mongodb_coalescer_ratio", "Fraction of the aggregations that were coalesced")
+
+OPERATION_LABELS = ["operation", "collection", "query"]
+OPERATION_LATENCY = Histogram("mongodb_operation_seconds", "Time taken by MongoDB operations", OPERATION_LABELS)
+OPERATION_DOCUMENTS = Counter("mongodb_operation_documents", "Documents returned by MongoDB operations", OPERATION_LABELS)
+
+# Time taken by each type of database operation during the current request
+_timings: ContextVar[dict | None] = ContextVar("timings", default=None)
+
+
+def track_pool(monitor: PoolMonitor):
+    """Exports the state of the connection pool as metrics"""
+    POOL_OPEN.set_function(lambda: monitor.open)
+    POOL_CHECKED_OUT.set_function(lambda: monitor.checked_out)
+    POOL_WAITING.set_function(lambda: monitor.waiting)
+    POOL_CHECKOUT_FAILURES.set_function(lambda: monitor.checkout_failures)
+    monitor.add_checkout_observer(POOL_CHECKOUT_LATENCY.observe)
+
+
+def track_breaker(breaker: CircuitBreaker):
+    """Exports the state of the circuit breaker as a metric"""
+    BREAKER_STATE.set_function(lambda: breaker.state)
+
+
+def track_coalescer(coalescer: ReadCoalescer):
+    """Exports the number of reads coalesced by the connection as metrics"""
+    READS.set_function(lambda: coalescer.reads)
+    READS_COALESCED.set_function(lambda: coalescer.coalesced)
+    READS_COALESCED_RATIO.set_function(lambda: coalescer.ratio)
+
+
+def _observe_operation(operation: str, collection: str, query: str, elapsed: float, documents: int):
+    OPERATION_LATENCY.labels(operation, collection, query).observe(elapsed)
+    OPERATION_DOCUMENTS.labels(operation, collection, query).inc(documents)
+    timings = _timings.get()
+    if timings is not None:
+        timings[operation] = timings.get(operation, 0) + elapsed
+
+
+def track_operations(monitor: OperationMonitor):
+    """Exports the time taken by database operations and the documents returned as metrics"""
+    monitor.add_observer(_observe_operation)
+
+
+async def server_timing(request, call_next):
+    """Middleware adding a `Server-Timing` header with the time taken by each type of database operation
+    (e.g., `db-aggregate`) and by the rest of the request handling (`app`), in milliseconds"""
+    timings, start = {}, time.perf_counter()
+    token = _timings.set(timings)
+    try:
+        response = await call_next(request)
+    finally:
+        _timings.reset(token)
+    elapsed = time.perf_counter() - start
+    entries = [f"db-{operation};dur={1000 * value:.1f}" for operation, value in timings.items()]
+    entries.append(f"app;dur={1000 * (elapsed - sum(timings.values())):.1f}")
+    response.headers["Server-Timing"] = ", ".join(entries)
+    return response
@@ -0,0 +1,21 @@
+"""Rebuilds the counts of reports per day and the summaries of objects from all the reports in the database.
+
+Run with `python -m reports.rebuild_rollups` (using the same environment variables as the service). These are
+updated by the service on every write, so this is only needed to backfill them for reports written by other
+means (e.g., imported directly into the database) or after failures to update them, which are logged.
+"""
+import asyncio
+
+from .database import get_connection, models
+
+
+async def rebuild():
+    async with get_connection() as connection:
+        await connection.rebuild_rollups(models.Report)
+        for rollup in models.Report.__rollups__:
+            count = await connection.db[rollup.__tablename__].estimated_document_count()
+            print(f"Rebuilt {rollup.__tablename__}: {count} documents")
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
@@ -1,28 +1,108 @@
-from fastapi import APIRouter, Body, Depends
+import json
+
+from db_handler import encode_json
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from pymongo.read_preferences import SecondaryPreferred, _ServerMode
+from query import BaseQuery
 
 from . import database, filters, schemas
 from .database import models
+from .settings import get_service_settings
 
 
 root = APIRouter()
 
-
-@root.get("/", response_model=schemas.PaginatedReports)
-async def get_report_list(q: filters.QueryByReport = Depends()):
-    """Query reports"""
-    return await database.get_connection().read_paginated_documents(models.Report, q)
-
-
-@root.get("/by_object", response_model=schemas.PaginatedReportsByObject)
-async def get_report_list_by_object(q: filters.QueryByObject = Depends()):
-    """Query reports grouped by object"""
-    return await database.get_connection().read_paginated_documents(models.Report, q)
-
-
-@root.get("/count_by_day", response_model=list[schemas.ReportByDay])
-async def count_reports_by_day(q: filters.QueryByDay = Depends()):
-    """Query number of reports per day"""
-    return await database.get_connection().read_multiple_documents(models.Report, q)
+# Queries over many reports tolerate slightly stale data, so they go to secondaries when available
+_analytics = SecondaryPreferred(max_staleness=get_service_settings().secondary_max_staleness)
+
+
+async def _parse_json_list(request: Request) -> list:
+    """Parses body with either a JSON array or newline delimited JSON (NDJSON)"""
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            return [json.loads(line) for line in body.splitlines() if line.strip()]
+        documents = json.loads(body)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=f"Malformed JSON: {str(err)}")
+    if not isinstance(documents, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array")
+    return documents
+
+
+def _accepts_ndjson(request: Request) -> bool:
+    return "application/x-ndjson" in request.headers.get("accept", "")
+
+
+async def _stream_ndjson(q: BaseQuery, schema: type[BaseModel], read_preference: _ServerMode = None) -> StreamingResponse:
+    """Streams documents as newline delimited JSON (NDJSON) as they arrive from the database.
+
+    The first document is awaited before starting the response, so that errors reaching the
+    database can still be reported with a proper status code.
+    """
+    documents = database.get_connection().stream_documents(models.Report, q, read_preference=read_preference)
+    try:
+        first = [await documents.__anext__()]
+    except StopAsyncIteration:
+        first = []
+
+    async def lines():
+        for document in first:
+            yield schema(**document).json(by_alias=True, exclude_unset=True) + "\n"
+        async for document in documents:
+            yield schema(**document).json(by_alias=True, exclude_unset=True) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+_bulk_body = {"type": "array", "items": schemas.ReportIn.schema()}
+_ndjson_response = {200: {"content": {"application/x-ndjson": {}}}}
+
+
+@root.get("/", response_model=schemas.PaginatedReports, response_model_exclude_unset=True, responses=_ndjson_response)
+async def get_report_list(request: Request, q: filters.QueryByReport = Depends()):
+    """Query reports. Reports in the page are streamed as NDJSON (without pagination data) if requested"""
+    if _accepts_ndjson(request):
+        return await _stream_ndjson(q, schemas.ReportProjection, _analytics)
+    # Reports are stored as defined by the schema, so they are encoded as they come from the database (skipping validation)
+    page = await database.get_connection().read_paginated_documents(models.Report, q, read_preference=_analytics, raw=True)
+    return Response(encode_json(page), media_type="application/json")
+
+
+@root.get(
+    "/by_object",
+    response_model=schemas.PaginatedReportsByObject,
+    response_model_exclude_unset=True,
+    responses=_ndjson_response,
+)
+async def get_report_list_by_object(request: Request, q: filters.QueryByObject = Depends()):
+    """Query reports grouped by object.
+    Objects in the page are streamed as NDJSON (without pagination data) if requested"""
+    if _accepts_ndjson(request):
+        return await _stream_ndjson(q, schemas.ReportByObject, _analytics)
+    # Summaries kept per object are used when the filters allow it (and they are built). These are sorted using
+    # indexes (outside a facet)
+    summary = q.summary() if get_service_settings().object_summary else None
+    if summary is not None and database.get_connection().rollup_ready(models.object_summaries):
+        return await database.get_connection().read_paginated_documents(
+            models.object_summaries, summary, read_preference=_analytics
+        )
+    # Grouping is done only once for both total and page, as sorting after grouping cannot use indexes anyway
+    return await database.get_connection().read_paginated_documents(models.Report, q, facet=True, read_preference=_analytics)
+
+
+@root.get("/count_by_day", response_model=list[schemas.ReportByDay], responses=_ndjson_response)
+async def count_reports_by_day(request: Request, q: filters.QueryByDay = Depends()):
+    """Query number of reports per day. Days are streamed as NDJSON if requested"""
+    if _accepts_ndjson(request):
+        return await _stream_ndjson(q, schemas.ReportByDay, _analytics)
+    # Counts kept per day are used when the filters allow it (and they are built), instead of grouping every report
+    pipeline = q.rollup_pipeline(models.daily_counts) if get_service_settings().daily_rollup else None
+    if pipeline is not None and database.get_connection().rollup_ready(models.daily_counts):
+        return await database.get_connection().read_rollup(models.daily_counts, pipeline, q, read_preference=_analytics)
+    return await database.get_connection().read_multiple_documents(models.Report, q, read_preference=_analytics)
 
 
 @root.post("/", response_model=schemas.ReportOut, status_code=201)
@@ -31,6 +111,43 @@ async def create_new_report(report: schemas.ReportIn = Body(...)):
     return await database.get_connection().create_document(models.Report, report.dict())
 
 
+@root.post(
+    "/bulk",
+    response_model=list[schemas.BulkItem],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _bulk_body}, "application/x-ndjson": {"schema": _bulk_body}},
+        }
+    },
+)
+async def create_new_reports(
+    request: Request, ordered: bool = Query(False, description="Whether to stop inserting after the first failure")
+):
+    """Insert multiple reports in database, either as a JSON array or newline delimited JSON.
+    Date and ID are set internally. The status of each report is given in the same order"""
+    reports = [
+        {k: v for k, v in report.items() if k in schemas.ReportIn.__fields__} if isinstance(report, dict) else report
+        for report in await _parse_json_list(request)
+    ]
+    return await database.get_connection().create_documents(models.Report, reports, ordered=ordered)
+
+
+@root.patch("/bulk", response_model=list[schemas.BulkItem])
+async def update_existing_reports(reports: schemas.BulkUpdate = Body(...)):
+    """Updates one or more fields of multiple existing reports based on their IDs.
+    The status of each report is given in the same order"""
+    update = reports.update.dict(exclude_none=True)
+    updates = [(report_id, update) for report_id in reports.ids]
+    return await database.get_connection().update_documents(models.Report, updates)
+
+
+@root.delete("/bulk", response_model=list[schemas.BulkItem])
+async def delete_reports(reports: schemas.BulkDelete = Body(...)):
+    """Deletes multiple existing reports based on their IDs. The status of each report is given in the same order"""
+    return await database.get_connection().delete_documents(models.Report, reports.ids)
+
+
 @root.get("/{report_id}", response_model=schemas.ReportOut)
 async def get_single_report(report_id: str):
     """Retrieve single report based on its ID"""
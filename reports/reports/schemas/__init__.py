@@ -1,3 +1,4 @@
+from ._bulk import *
 from ._by_day import *
 from ._by_object import *
 from ._reports import *
@@ -5,5 +5,7 @@ class PaginatedModel(BaseModel):
     """Basic schema for paginated results"""
 
     count: int = Field(..., description="Total number of results matching query")
+    count_is_exact: bool = Field(True, description="Whether count is exact (otherwise, it is an estimate)")
     next: int | None = Field(..., description="Next page number (null if no next page)")
     previous: int | None = Field(..., description="Previous page number (null if no previous page)")
+    next_cursor: str | None = Field(None, description="Cursor for next page (only when paginating by cursor)")
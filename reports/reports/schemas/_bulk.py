@@ -0,0 +1,29 @@
+from db_handler import BulkStatus, PyObjectId
+from pydantic import BaseModel, Field
+
+from ._reports import _PyObjectIdSchema, ReportUpdate
+
+
+class BulkItem(BaseModel):
+    """Schema for the status of individual reports in bulk operations"""
+
+    index: int = Field(..., description="Position of the report in the request")
+    status: BulkStatus = Field(..., description="Result of the operation")
+    id: _PyObjectIdSchema | str | None = Field(None, description="Unique identifier in DB (if any)")
+    detail: str | None = Field(None, description="Reason for failure (if any)")
+
+    class Config:
+        json_encoders = {PyObjectId: str}
+
+
+class BulkUpdate(BaseModel):
+    """Schema for updating multiple reports with the same fields"""
+
+    ids: list[str] = Field(..., description="Unique identifiers in DB of the reports to update")
+    update: ReportUpdate = Field(..., description="Fields to modify in every report")
+
+
+class BulkDelete(BaseModel):
+    """Schema for deleting multiple reports"""
+
+    ids: list[str] = Field(..., description="Unique identifiers in DB of the reports to delete")
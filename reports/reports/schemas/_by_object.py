@@ -12,9 +12,13 @@ class ReportByObject(BaseModel):
     first_date: datetime = Field(..., description="Date and time of first report (UTC)")
     last_date: datetime = Field(..., description="Date and time of last report (UTC)")
     count: int = Field(..., description="Number of reports")
-    source: list[str] = Field(..., description="Service(s) of origin of the reports")
-    report_type: list[str] = Field(..., description="Type(s) of reports")
-    users: list[str] = Field(..., description="Reporting user(s)")
+    source: list[str] | None = Field(None, description="Services of origin of the reports (not with `distinct_counts`)")
+    report_type: list[str] | None = Field(None, description="Types of reports (not with `distinct_counts`)")
+    users: list[str] | None = Field(None, description="Reporting users (not with `distinct_counts`)")
+    source_count: int | None = Field(None, description="Number of services (with `set_size` or `distinct_counts`)")
+    report_type_count: int | None = Field(None, description="Number of types (with `set_size` or `distinct_counts`)")
+    users_count: int | None = Field(None, description="Number of users (with `set_size` or `distinct_counts`)")
+    truncated: bool | None = Field(None, description="Whether any list is limited by `set_size` (only with `set_size`)")
 
 
 class PaginatedReportsByObject(PaginatedModel):
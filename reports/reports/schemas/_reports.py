@@ -37,10 +37,16 @@ class ReportUpdate(ReportIn):
     __all_optional__ = True
 
 
+class ReportProjection(ReportOut):
+    """Schema for individual reports, which may include only some of their fields"""
+
+    __all_optional__ = True
+
+
 class PaginatedReports(PaginatedModel):
     """Schema for paginated reports"""
 
-    results: list[ReportOut] = Field(..., description="List of reports matching query")
+    results: list[ReportProjection] = Field(..., description="List of reports matching query")
 
     class Config(ReportOut.Config):
         """This class is necessary to parse ObjectID fields nested in results"""
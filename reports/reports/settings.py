@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic import BaseSettings
 
@@ -9,12 +10,47 @@ class MongoSettings(BaseSettings):
     username: str
     password: str
     database: str
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: int | None = None
+    wait_queue_timeout_ms: int | None = None
+    server_selection_timeout_ms: int = 30000
+    compressors: str | None = None
 
     class Config:
         env_prefix = "mongodb_"
         env_file = ".env.test"
 
 
+class ServiceSettings(BaseSettings):
+    approximate_count: bool = False
+    count_cache_ttl: float = 30
+    secondary_max_staleness: int = 90
+    query_cache_size: int = 0
+    query_cache_ttl: float = 10
+    watch_changes: bool = False
+    slow_query_threshold: float | None = None
+    slow_query_explain_rate: float = 0
+    retry_attempts: int = 3
+    retry_deadline: float = 10
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30
+    coalesce_reads: bool = True
+    background_indexes: bool = False
+    database_backend: Literal["mongodb", "memory"] = "mongodb"
+    daily_rollup: bool = True
+    object_summary: bool = True
+
+    class Config:
+        env_prefix = "reports_"
+        env_file = ".env.test"
+
+
 @lru_cache
 def get_settings() -> MongoSettings:
     return MongoSettings()
+
+
+@lru_cache
+def get_service_settings() -> ServiceSettings:
+    return ServiceSettings()
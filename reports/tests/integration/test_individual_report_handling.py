@@ -187,3 +187,30 @@ def test_delete_non_existing_report_fails():
         check = utils.client.delete(f'/oid')
 
     assert check.status_code == 404
+
+
+@pytest.mark.usefixtures('mongo_service')
+def test_post_bulk_reports_reports_duplicates_and_invalid_entries():
+    invalid_input = {k: v for k, v in report_input.items() if k != "object"}
+    with utils.client:
+        insert = utils.client.post('/bulk', content=json.dumps([report_input, report_input, invalid_input, different_input]))
+        for item in insert.json():
+            if item["id"]:
+                utils.client.delete(f'/{item["id"]}')
+
+    assert insert.status_code == 200
+    assert [item["status"] for item in insert.json()] == ["inserted", "duplicate", "invalid", "inserted"]
+
+
+@pytest.mark.usefixtures('mongo_service')
+def test_patch_and_delete_bulk_reports_report_missing_entries():
+    with utils.client:
+        insert = utils.client.post('/bulk', content=json.dumps([report_input, different_input]))
+        ids = [item["id"] for item in insert.json()] + ["missing"]
+        update = utils.client.patch('/bulk', content=json.dumps({"ids": ids, "update": {"solved": True}}))
+        check = [utils.client.get(f'/{oid}') for oid in ids[:2]]
+        delete = utils.client.request('DELETE', '/bulk', content=json.dumps({"ids": ids}))
+
+    assert [item["status"] for item in update.json()] == ["updated", "updated", "not_found"]
+    assert all(report.json()["solved"] for report in check)
+    assert [item["status"] for item in delete.json()] == ["deleted", "deleted", "not_found"]
@@ -131,3 +131,28 @@ def test_query_by_date_after():
     assert 0 < result.json()["count"] < total  # Just to make sure there's something here
 
     assert all(report["date"] >= cutoff_date for report in result.json()["results"])
+
+
+@pytest.mark.usefixtures('mongo_service')
+def test_query_keyset_pagination_traverses_all_reports_in_order():
+    reports, cursor = [], ""
+    with utils.client:
+        while cursor is not None:
+            result = utils.client.get(endpoint, params={'page_size': page_size, 'cursor': cursor})
+            assert result.status_code == 200
+            reports.extend(result.json()["results"])
+            cursor = result.json()["next_cursor"]
+
+    assert len(reports) == len({report["_id"] for report in reports}) == total
+
+    dates = [report["date"] for report in reports]
+    assert dates == sorted(dates, reverse=True)
+
+
+@pytest.mark.usefixtures('mongo_service')
+def test_query_with_fields_returns_only_selected_fields():
+    with utils.client:
+        result = utils.client.get(endpoint, params={'fields': ['object', 'owner']})
+
+    assert result.status_code == 200
+    assert all(set(report) == {"_id", "date", "object", "owner"} for report in result.json()["results"])
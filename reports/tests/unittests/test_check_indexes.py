@@ -0,0 +1,39 @@
+import asyncio
+from unittest import mock
+
+from db_handler import IndexAdvice
+from pymongo import IndexModel
+
+from reports import check_indexes
+
+
+ok = IndexAdvice("QueryByReport", ("date",), "date", ["FETCH", "IXSCAN"], False, False, None)
+suggestion = IndexModel([("solved", -1), ("object", 1)])
+missing = IndexAdvice("QueryByReport", ("object",), "solved", ["SORT", "COLLSCAN"], True, True, suggestion)
+
+
+def test_describe_supported_combination():
+    assert check_indexes.describe(ok) == "QueryByReport (date; sort by date): FETCH, IXSCAN -> OK"
+
+
+def test_describe_unsupported_combination_includes_suggestion():
+    assert "suggested index: {'solved': -1, 'object': 1}" in check_indexes.describe(missing)
+
+
+@mock.patch('reports.check_indexes.advise_indexes')
+@mock.patch('reports.check_indexes.get_connection')
+def test_check_fails_if_any_combination_is_not_supported(mock_connection, mock_advise):
+    mock_connection.return_value.__aenter__.return_value.create_db = mock.AsyncMock()
+    mock_advise.side_effect = [[ok], [ok, missing], []]
+
+    assert asyncio.run(check_indexes.check()) is False
+    assert mock_advise.await_count == len(check_indexes.QUERIES)
+
+
+@mock.patch('reports.check_indexes.advise_indexes')
+@mock.patch('reports.check_indexes.get_connection')
+def test_check_succeeds_if_all_combinations_are_supported(mock_connection, mock_advise):
+    mock_connection.return_value.__aenter__.return_value.create_db = mock.AsyncMock()
+    mock_advise.return_value = [ok]
+
+    assert asyncio.run(check_indexes.check()) is True
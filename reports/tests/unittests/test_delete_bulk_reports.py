@@ -0,0 +1,34 @@
+import json
+from unittest import mock
+
+from db_handler import BulkStatus
+from pymongo.errors import ServerSelectionTimeoutError
+
+from reports.database import models
+from .. import utils
+
+endpoint = "/bulk"
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_delete_bulk_reports(mock_connection):
+    oid = utils.random_oid()
+    delete_documents = mock.AsyncMock()
+    mock_connection.return_value.delete_documents = delete_documents
+    delete_documents.return_value = [{"index": 0, "status": BulkStatus.deleted, "id": oid, "detail": None}]
+
+    response = utils.client.request("DELETE", endpoint, content=json.dumps({"ids": [str(oid)]}))
+    assert response.status_code == 200
+
+    delete_documents.assert_awaited_once_with(models.Report, [str(oid)])
+    assert response.json() == [{"index": 0, "status": "deleted", "id": str(oid), "detail": None}]
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_delete_bulk_reports_fails_if_database_is_down(mock_connection):
+    delete_documents = mock.AsyncMock()
+    delete_documents.side_effect = ServerSelectionTimeoutError()
+    mock_connection.return_value.delete_documents = delete_documents
+
+    response = utils.client.request("DELETE", endpoint, content=json.dumps({"ids": ["id"]}))
+    assert response.status_code == 503
@@ -1,7 +1,15 @@
+import asyncio
+import json
+from datetime import datetime
 from unittest import mock
 
+import bson
+from bson.raw_bson import RawBSONDocument
+from db_handler import InMemoryConnection
 from pymongo.errors import ServerSelectionTimeoutError
 
+from reports.database.models import Report
+from reports.filters import QueryByReport, ReportFields
 from .. import utils
 
 endpoint = "/"
@@ -13,8 +21,10 @@ def test_read_report_empty_list(mock_connection):
     mock_connection.return_value.read_paginated_documents = paginate
     paginate.return_value = {
         "count": 0,
+        "count_is_exact": True,
         "previous": None,
         "next": None,
+        "next_cursor": None,
         "results": []
     }
 
@@ -43,6 +53,11 @@ def test_read_report_list_fails_if_page_size_is_less_than_one():
     assert response.status_code == 422
 
 
+def test_read_report_list_fails_if_page_size_is_more_than_maximum():
+    response = utils.client.get(endpoint, params={"page_size": 1001})
+    assert response.status_code == 422
+
+
 @mock.patch('reports.routes.database.get_connection')
 def test_read_report_list_fails_if_database_is_down(mock_connection):
     paginate = mock.AsyncMock()
@@ -51,3 +66,169 @@ def test_read_report_list_fails_if_database_is_down(mock_connection):
 
     response = utils.client.get(endpoint)
     assert response.status_code == 503
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_list_with_cursor_uses_keyset_pagination(mock_connection):
+    paginate = mock.AsyncMock()
+    mock_connection.return_value.read_paginated_documents = paginate
+    paginate.return_value = {
+        "count": 0,
+        "count_is_exact": True,
+        "previous": None,
+        "next": None,
+        "next_cursor": "cursor",
+        "results": []
+    }
+
+    response = utils.client.get(endpoint, params={"cursor": ""})
+    assert response.status_code == 200
+    assert response.json() == paginate.return_value
+    assert paginate.await_args.args[1].cursor == ""
+
+
+def test_read_report_list_fails_if_cursor_is_invalid():
+    response = utils.client.get(endpoint, params={"cursor": "invalid"})
+    assert response.status_code == 400
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_list_streams_ndjson_if_requested(mock_connection):
+    reports = utils.create_reports(3)
+
+    async def stream(*args, **kwargs):
+        for report in reports:
+            yield report
+
+    mock_connection.return_value.stream_documents = mock.MagicMock(side_effect=stream)
+
+    response = utils.client.get(endpoint, headers={"accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == utils.create_jsons(reports)
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_list_streams_ndjson_after_cursor(mock_connection):
+    connection = mock_connection.return_value = InMemoryConnection()
+    reports = [
+        {"object": f"ZTF{i}", "solved": False, "observation": "SN", "source": "web", "owner": "u", "report_type": "X"}
+        for i in range(5)
+    ]
+    asyncio.run(connection.connect())
+    asyncio.run(connection.create_documents(Report, reports))
+    params = {"order_by": "object", "direction": 1, "page_size": 2}
+
+    page = utils.client.get(endpoint, params={**params, "cursor": ""}).json()
+    response = utils.client.get(
+        endpoint, params={**params, "cursor": page["next_cursor"]}, headers={"accept": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    assert [json.loads(line)["object"] for line in response.text.splitlines()] == ["ZTF2", "ZTF3"]
+
+    response = utils.client.get(endpoint, params={"cursor": "invalid"}, headers={"accept": "application/x-ndjson"})
+    assert response.status_code == 400
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_list_fails_if_cursor_comes_from_another_sorting(mock_connection):
+    connection = mock_connection.return_value = InMemoryConnection()
+    report = {"object": "ZTF0", "solved": False, "observation": "SN", "source": "web", "owner": "u", "report_type": "X"}
+    asyncio.run(connection.connect())
+    asyncio.run(connection.create_documents(Report, [report, {**report, "object": "ZTF1"}]))
+    params = {"order_by": "object", "direction": 1, "page_size": 1}
+
+    cursor = utils.client.get(endpoint, params={**params, "cursor": ""}).json()["next_cursor"]
+    assert utils.client.get(endpoint, params={**params, "cursor": cursor}).status_code == 200
+    assert utils.client.get(endpoint, params={**params, "direction": -1, "cursor": cursor}).status_code == 400
+    assert utils.client.get(endpoint, params={**params, "order_by": "date", "cursor": cursor}).status_code == 400
+
+
+def test_query_pipeline_projects_selected_fields_and_sorting_field():
+    pipeline = QueryByReport(fields=[ReportFields.object], order_by=ReportFields.date).pipeline()
+
+    assert {"$project": {"date": 1, "object": 1}} in pipeline
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_list_with_fields_returns_only_those_fields(mock_connection):
+    report = utils.report_factory()
+    paginate = mock.AsyncMock()
+    mock_connection.return_value.read_paginated_documents = paginate
+    paginate.return_value = {
+        "count": 1,
+        "count_is_exact": True,
+        "previous": None,
+        "next": None,
+        "next_cursor": None,
+        "results": [{"_id": report["_id"], "date": report["date"], "object": report["object"]}]
+    }
+
+    response = utils.client.get(endpoint, params={"fields": ["object"]})
+    assert response.status_code == 200
+    assert response.json()["results"] == utils.create_jsons(paginate.return_value["results"])
+    assert paginate.await_args.args[1].fields == [ReportFields.object]
+
+
+def test_read_report_list_fails_if_field_is_unknown():
+    response = utils.client.get(endpoint, params={"fields": ["unknown"]})
+    assert response.status_code == 422
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_list_reads_raw_documents(mock_connection):
+    # Dates in BSON have millisecond resolution
+    reports = [utils.report_factory(date=datetime(2023, 1, 1, 12, 30)) for _ in range(2)]
+    paginate = mock.AsyncMock()
+    mock_connection.return_value.read_paginated_documents = paginate
+    paginate.return_value = {
+        "count": 2,
+        "count_is_exact": True,
+        "previous": None,
+        "next": None,
+        "next_cursor": None,
+        "results": [RawBSONDocument(bson.encode(report)) for report in reports]
+    }
+
+    response = utils.client.get(endpoint)
+    assert response.status_code == 200
+    assert response.json()["results"] == utils.create_jsons(reports)
+    assert paginate.await_args.kwargs["raw"] is True
+
+
+def test_query_pipeline_filters_object_prefix_as_range():
+    assert QueryByReport(object_prefix="ZTF21").pipeline()[0] == {"$match": {"object": {"$gte": "ZTF21", "$lt": "ZTF22"}}}
+    assert QueryByReport(object="^ZTF21").pipeline()[0] == {"$match": {"object": {"$gte": "ZTF21", "$lt": "ZTF22"}}}
+    assert QueryByReport(object=r"^ZTF\.1").pipeline()[0] == {"$match": {"object": {"$gte": "ZTF.1", "$lt": "ZTF.2"}}}
+
+
+def test_query_pipeline_keeps_regex_unless_it_is_a_literal_prefix():
+    for pattern in ["ZTF21", "^ZTF.1", r"^ZTF\d", "^ZTF$", "(?i)^ztf"]:
+        q = QueryByReport(object=pattern)
+        assert q.pipeline()[0] == {"$match": {"object": {"$regex": q.object}}}
+
+
+def test_query_pipeline_filters_object_in_list():
+    q = QueryByReport(object_in=["ZTF1", "ZTF2"], object_prefix="ZTF")
+
+    assert q.pipeline()[0] == {"$match": {"object": {"$gte": "ZTF", "$lt": "ZTG", "$in": ["ZTF1", "ZTF2"]}}}
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_list_filters_by_object_prefix_and_list(mock_connection):
+    connection = mock_connection.return_value = InMemoryConnection()
+    objects = ["ZTF1", "ZTF12", "ZTF2", "ZTG1", "ATF1"]
+    reports = [
+        {"object": o, "solved": False, "observation": "SN", "source": "web", "owner": "u", "report_type": "X"} for o in objects
+    ]
+    asyncio.run(connection.connect())
+    asyncio.run(connection.create_documents(Report, reports))
+
+    def objects_for(**params) -> list[str]:
+        response = utils.client.get(endpoint, params={"order_by": "object", "direction": 1, **params})
+        assert response.status_code == 200
+        return [report["object"] for report in response.json()["results"]]
+
+    assert objects_for(object_prefix="ZTF1") == ["ZTF1", "ZTF12"]
+    assert objects_for(object="^ZTF") == objects_for(object="ZTF") == ["ZTF1", "ZTF12", "ZTF2"]
+    assert objects_for(object_in=["ZTF2", "ATF1", "other"]) == ["ATF1", "ZTF2"]
@@ -1,8 +1,16 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
 from unittest import mock
 
 from pymongo.errors import ServerSelectionTimeoutError
+from pymongo.read_preferences import SecondaryPreferred
 
+from db_handler import InMemoryConnection
+
+from reports.database import models
 from reports.filters import QueryByDay
+from reports.settings import ServiceSettings
 from .. import utils
 
 
@@ -28,7 +36,7 @@ def test_read_report_by_day_empty_list(mock_connection):
     mock_connection.return_value.read_multiple_documents = paginate
     paginate.return_value = []
 
-    response = utils.client.get(endpoint)
+    response = utils.client.get(endpoint, params={"object": "^ZTF"})
     assert response.status_code == 200
     assert response.json() == paginate.return_value
 
@@ -49,5 +57,148 @@ def test_read_report_by_day_list_fails_if_database_is_down(mock_connection):
     mock_connection.return_value.read_multiple_documents = paginate
     paginate.side_effect = ServerSelectionTimeoutError()
 
-    response = utils.client.get(endpoint)
+    response = utils.client.get(endpoint, params={"object": "^ZTF"})
+    assert response.status_code == 503
+
+
+def mock_stream(mock_connection, documents=None, side_effect=None):
+    async def stream(*args, **kwargs):
+        if side_effect:
+            raise side_effect
+        for document in documents:
+            yield document
+
+    mock_connection.return_value.stream_documents = mock.MagicMock(side_effect=stream)
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_day_streams_ndjson_if_requested(mock_connection):
+    days = [{"_id": datetime(2023, 1, 1), "day": datetime(2023, 1, 1), "count": 2}, {"day": datetime(2023, 1, 2), "count": 1}]
+    mock_stream(mock_connection, days)
+
+    response = utils.client.get(endpoint, headers={"accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["count"] for line in lines] == [2, 1]
+    assert all(set(line) == {"day", "count"} for line in lines)
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_day_streams_empty_ndjson(mock_connection):
+    mock_stream(mock_connection, [])
+
+    response = utils.client.get(endpoint, headers={"accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.text == ""
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_day_streaming_fails_if_database_is_down(mock_connection):
+    mock_stream(mock_connection, side_effect=ServerSelectionTimeoutError())
+
+    response = utils.client.get(endpoint, headers={"accept": "application/x-ndjson"})
     assert response.status_code == 503
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_day_prefers_secondaries(mock_connection):
+    paginate = mock.AsyncMock()
+    mock_connection.return_value.read_multiple_documents = paginate
+    paginate.return_value = []
+
+    response = utils.client.get(endpoint, params={"object": "^ZTF"})
+    assert response.status_code == 200
+    assert paginate.await_args.kwargs["read_preference"] == SecondaryPreferred(max_staleness=90)
+
+
+def test_rollup_pipeline_without_filters_counts_every_day():
+    pipeline = QueryByDay().rollup_pipeline(models.daily_counts)
+
+    assert pipeline == models.daily_counts.pipeline({}) + [{"$sort": {"day": -1}}]
+
+
+def test_rollup_pipeline_with_whole_days_matches_days():
+    q = QueryByDay(date_after=datetime(2023, 1, 1), date_before=datetime(2023, 1, 31, 23, 59, 59, 999999))
+    pipeline = q.rollup_pipeline(models.daily_counts)
+
+    assert pipeline[0] == {"$match": {"_id.day": {"$gte": datetime(2023, 1, 1), "$lte": datetime(2023, 1, 31)}}}
+
+
+def test_rollup_pipeline_converts_dates_to_utc():
+    after = datetime(2023, 1, 1, 3, tzinfo=timezone(timedelta(hours=3)))
+    pipeline = QueryByDay(date_after=after).rollup_pipeline(models.daily_counts)
+
+    assert pipeline[0] == {"$match": {"_id.day": {"$gte": datetime(2023, 1, 1)}}}
+
+
+def test_rollup_pipeline_is_not_used_for_partial_days():
+    assert QueryByDay(date_after=datetime(2023, 1, 1, 12)).rollup_pipeline(models.daily_counts) is None
+    assert QueryByDay(date_before=datetime(2023, 1, 2)).rollup_pipeline(models.daily_counts) is None
+
+
+def test_rollup_pipeline_is_not_used_with_object_filter():
+    assert QueryByDay(object="^ZTF").rollup_pipeline(models.daily_counts) is None
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_day_uses_rollup_if_filters_allow(mock_connection):
+    rollup = mock.AsyncMock(return_value=[{"day": datetime(2023, 1, 1), "count": 2}])
+    mock_connection.return_value.read_rollup = rollup
+
+    response = utils.client.get(endpoint, params={"date_after": "2023-01-01T00:00:00"})
+    assert response.status_code == 200
+    assert response.json() == [{"day": "2023-01-01", "count": 2}]
+    assert rollup.await_args.args[0] is models.daily_counts
+    assert rollup.await_args.kwargs["read_preference"] == SecondaryPreferred(max_staleness=90)
+    mock_connection.return_value.read_multiple_documents.assert_not_called()
+
+
+@mock.patch('reports.routes.get_service_settings')
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_day_does_not_use_rollup_if_disabled(mock_connection, mock_settings):
+    mock_settings.return_value = ServiceSettings(daily_rollup=False)
+    paginate = mock.AsyncMock(return_value=[])
+    mock_connection.return_value.read_multiple_documents = paginate
+
+    response = utils.client.get(endpoint)
+    assert response.status_code == 200
+    paginate.assert_awaited_once()
+    mock_connection.return_value.read_rollup.assert_not_called()
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_day_does_not_use_rollup_until_built(mock_connection):
+    mock_connection.return_value.rollup_ready.return_value = False
+    paginate = mock.AsyncMock(return_value=[])
+    mock_connection.return_value.read_multiple_documents = paginate
+
+    response = utils.client.get(endpoint)
+    assert response.status_code == 200
+    paginate.assert_awaited_once()
+    mock_connection.return_value.rollup_ready.assert_called_once_with(models.daily_counts)
+    mock_connection.return_value.read_rollup.assert_not_called()
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_day_from_rollup_matches_reports(mock_connection):
+    connection = mock_connection.return_value = InMemoryConnection()
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+    async def populate():
+        await connection.connect()
+        for i in range(20):
+            report = {"object": f"ZTF{i}", "date": start + timedelta(hours=7 * i), "solved": False, "observation": "SN"}
+            report.update(source="web", report_type="X", owner="a")
+            report = await connection.create_document(models.Report, report)
+        await connection.update_document(models.Report, str(report["_id"]), {"date": start + timedelta(days=2)})
+        await connection.delete_document(models.Report, str(report["_id"]))
+
+    asyncio.run(populate())
+
+    params = {"date_after": "2023-01-02T00:00:00Z", "date_before": "2023-01-04T23:59:59.999Z"}
+    rollup = utils.client.get(endpoint, params=params)
+    raw = utils.client.get(endpoint, params={**params, "object": "^ZTF"})
+    assert rollup.status_code == raw.status_code == 200
+    assert rollup.json() == raw.json()
+    assert [day["count"] for day in rollup.json()] == [3, 4, 3]
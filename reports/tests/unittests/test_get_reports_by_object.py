@@ -1,8 +1,13 @@
+import asyncio
+from datetime import datetime, timedelta
 from unittest import mock
 
-from pymongo.errors import ServerSelectionTimeoutError
+from db_handler import InMemoryConnection
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
 
-from reports.filters import QueryByObject
+from reports.database import get_connection, models
+from reports.filters import QueryByObject, QuerySummaryByObject
+from reports.settings import ServiceSettings
 from .. import utils
 
 
@@ -36,14 +41,18 @@ def test_read_report_by_object_empty_list(mock_connection):
     mock_connection.return_value.read_paginated_documents = paginate
     paginate.return_value = {
         "count": 0,
+        "count_is_exact": True,
         "previous": None,
         "next": None,
+        "next_cursor": None,
         "results": []
     }
 
-    response = utils.client.get(endpoint)
+    response = utils.client.get(endpoint, params={"date_after": "2023-01-01T00:00:00"})
     assert response.status_code == 200
     assert response.json() == paginate.return_value
+    assert paginate.await_args.args[0] is models.Report
+    assert paginate.await_args.kwargs["facet"]
 
 
 def test_read_report_by_object_list_fails_if_order_by_is_unknown():
@@ -74,3 +83,196 @@ def test_read_report_by_object_list_fails_if_database_is_down(mock_connection):
 
     response = utils.client.get(endpoint)
     assert response.status_code == 503
+
+
+def test_summary_pipeline_does_not_group():
+    q = QueryByObject(object="^ZTF", page=2).summary()
+
+    assert isinstance(q, QuerySummaryByObject)
+    assert q.pipeline() == [
+        {"$match": {"object": {"$gte": "ZTF", "$lt": "ZTG"}}},
+        {"$sort": {"last_date": -1}},
+        {"$skip": 10},
+        {"$limit": 10},
+    ]
+
+
+def test_summary_pipeline_bounds_sets_after_sorting_with_indexes():
+    q = QueryByObject(order_by="count", set_size=2).summary()
+
+    # Only a sort at the start of the pipeline can use the indexes
+    assert [next(iter(stage)) for stage in q.pipeline()] == ["$sort", "$limit", "$set", "$set"]
+    assert [next(iter(stage)) for stage in q.keyset_pipeline()] == ["$sort", "$limit", "$set", "$set"]
+    # Sorting by a set needs the bounded set
+    q = QueryByObject(order_by="users", distinct_counts=True).summary()
+    assert [next(iter(stage)) for stage in q.pipeline()] == ["$set", "$unset", "$sort", "$limit"]
+
+
+def test_summary_is_not_used_with_date_filters():
+    assert QueryByObject(date_after=datetime(2023, 1, 1)).summary() is None
+    assert QueryByObject(date_before=datetime(2023, 1, 1)).summary() is None
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_object_uses_summaries_if_filters_allow(mock_connection):
+    paginate = mock.AsyncMock()
+    mock_connection.return_value.read_paginated_documents = paginate
+    paginate.return_value = {"count": 0, "count_is_exact": True, "previous": None, "next": None, "results": []}
+
+    response = utils.client.get(endpoint, params={"order_by": "count"})
+    assert response.status_code == 200
+    assert paginate.await_args.args[0] is models.object_summaries
+    assert isinstance(paginate.await_args.args[1], QuerySummaryByObject)
+    assert not paginate.await_args.kwargs.get("facet")
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_object_does_not_use_summaries_until_built(mock_connection):
+    mock_connection.return_value.rollup_ready.return_value = False
+    paginate = mock.AsyncMock()
+    mock_connection.return_value.read_paginated_documents = paginate
+    paginate.return_value = {"count": 0, "count_is_exact": True, "previous": None, "next": None, "results": []}
+
+    response = utils.client.get(endpoint, params={"order_by": "count"})
+    assert response.status_code == 200
+    mock_connection.return_value.rollup_ready.assert_called_once_with(models.object_summaries)
+    assert paginate.await_args.args[0] is models.Report
+    assert paginate.await_args.kwargs["facet"]
+
+
+@mock.patch('reports.database._getters.get_service_settings')
+def test_changes_to_reports_discard_cached_summaries(mock_settings):
+    mock_settings.return_value = ServiceSettings(query_cache_size=64, watch_changes=True)
+    connection = get_connection.__wrapped__()  # Avoids cache
+    key = connection._cache.key(models.object_summaries.__tablename__, [])
+    connection._cache.set(key, [], 0)
+
+    async def events():
+        yield {"operationType": "insert"}
+        raise OperationFailure("not supported", code=40573)
+
+    stream = mock.MagicMock()
+    stream.__aenter__ = mock.AsyncMock(return_value=events())  # Ends as if not supported after an event
+    stream.__aexit__ = mock.AsyncMock(return_value=False)
+    connection._client = mock.MagicMock()
+    connection.db.__getitem__.return_value.watch.return_value = stream
+
+    asyncio.run(connection.watch_changes(models.Report, retry_after=0))
+    assert connection._cache.get(key) is None
+
+
+@mock.patch('reports.routes.get_service_settings')
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_object_from_summaries_matches_reports(mock_connection, mock_settings):
+    connection = mock_connection.return_value = InMemoryConnection()
+    start = datetime(2023, 1, 1)
+    reports = [
+        {"object": f"ZTF{i % 4}", "date": start + timedelta(hours=i), "solved": False, "observation": "SN", "source": "web"}
+        for i in range(12)
+    ]
+
+    async def populate():
+        await connection.connect()
+        created = [{**report, "owner": f"u{i}", "report_type": "X"} for i, report in enumerate(reports)]
+        await connection.create_documents(models.Report, created)
+        report = await connection.create_document(models.Report, {**reports[0], "owner": "v", "report_type": "Y"})
+        update = {"object": "ZTF9", "source": "other", "date": start + timedelta(days=1)}
+        await connection.update_document(models.Report, str(report["_id"]), update)
+        ids = [r["_id"] async for r in connection.db[models.Report.__tablename__].find({"object": "ZTF1"})]
+        await connection.delete_documents(models.Report, [str(oid) for oid in ids])
+
+    asyncio.run(populate())
+
+    def results(summary: bool) -> list[dict]:
+        mock_settings.return_value = ServiceSettings(object_summary=summary)
+        response = utils.client.get(endpoint, params={"order_by": "first_date", "direction": 1})
+        assert response.status_code == 200
+        return [{**r, "users": sorted(r["users"]), "source": sorted(r["source"])} for r in response.json()["results"]]
+
+    assert results(True) == results(False)
+    assert [r["object"] for r in results(True)] == ["ZTF0", "ZTF2", "ZTF3", "ZTF9"]
+    assert results(True)[-1]["source"] == ["other"]
+
+
+def test_bounded_query_pipeline_groups_by_user_first():
+    groups = [stage["$group"] for stage in QueryByObject(set_size=5).pipeline() if "$group" in stage]
+
+    assert [group["_id"] for group in groups] == [{"object": "$object", "user": "$owner"}, "$_id.object"]
+    assert groups[1]["users"] == {"$topN": {"n": 5, "sortBy": {"_id.user": 1}, "output": "$_id.user"}}
+
+
+def test_distinct_counts_pipeline_removes_sets():
+    pipeline = QueryByObject(distinct_counts=True).pipeline()
+
+    assert all("users" not in stage["$group"] for stage in pipeline if "$group" in stage)
+    assert {"$unset": ["users", "source", "report_type"]} in pipeline
+
+
+def test_read_report_by_object_fails_if_set_size_is_less_than_one():
+    response = utils.client.get(endpoint, params={"set_size": 0})
+    assert response.status_code == 422
+
+
+@mock.patch('reports.routes.get_service_settings')
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_object_with_bounded_sets(mock_connection, mock_settings):
+    connection = mock_connection.return_value = InMemoryConnection()
+    start = datetime(2023, 1, 1)
+    reports = [
+        {"object": "ZTF0", "date": start + timedelta(hours=i), "owner": f"user{-i % 5}", "source": f"s{-i % 3}"}
+        for i in range(15)
+    ] + [{"object": "ZTF1", "date": start, "owner": "user0", "source": "s0"}]
+    reports = [{**r, "solved": False, "observation": "SN", "report_type": f"t{i}"} for i, r in enumerate(reports)]
+    asyncio.run(connection.connect())
+    asyncio.run(connection.create_documents(models.Report, reports))
+
+    def results(summary: bool, **params) -> list[dict]:
+        mock_settings.return_value = ServiceSettings(object_summary=summary)
+        response = utils.client.get(endpoint, params={"order_by": "count", **params})
+        assert response.status_code == 200
+        return response.json()["results"]
+
+    popular, single = results(True, set_size=2)
+    assert results(False, set_size=2) == [popular, single]
+    assert popular["users"] == ["user0", "user1"] and popular["source"] == ["s0", "s1"]
+    assert (popular["users_count"], popular["source_count"], popular["report_type_count"]) == (5, 3, 15)
+    assert popular["truncated"] and not single["truncated"]
+
+    popular, single = results(True, distinct_counts=True)
+    assert results(False, distinct_counts=True) == [popular, single]
+    assert set(popular) == {"object", "first_date", "last_date", "count", "users_count", "source_count", "report_type_count"}
+    assert popular["count"] == 15 and popular["users_count"] == 5
+
+
+def test_keyset_pipeline_filters_objects_before_grouping():
+    q = QueryByObject(order_by="object", direction=1, cursor="cursor")
+
+    pipeline = q.keyset_pipeline(("ZTF1", "ZTF1"))
+    assert pipeline[0] == {"$match": {"object": {"$gte": "ZTF1"}, "$or": [{"object": {"$gt": "ZTF1"}}] * 2}}
+    assert "$group" in pipeline[1]
+    assert all("$set" not in stage for stage in q.count_pipeline())
+
+
+@mock.patch('reports.routes.get_service_settings')
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_by_object_by_keyset_returns_every_object_once(mock_connection, mock_settings):
+    connection = mock_connection.return_value = InMemoryConnection()
+    start = datetime(2023, 1, 1)
+    reports = [
+        {"object": f"ZTF{i % 7}", "date": start + timedelta(hours=i), "owner": f"u{i}", "solved": False, "observation": "SN"}
+        for i in range(20)
+    ]
+    asyncio.run(connection.connect())
+    asyncio.run(connection.create_documents(models.Report, [{**r, "source": "web", "report_type": "X"} for r in reports]))
+
+    def objects(summary: bool) -> list[str]:
+        mock_settings.return_value = ServiceSettings(object_summary=summary)
+        params, result = {"order_by": "object", "direction": 1, "page_size": 3, "cursor": ""}, []
+        while params["cursor"] is not None:
+            response = utils.client.get(endpoint, params=params)
+            assert response.status_code == 200
+            result += [r["object"] for r in response.json()["results"]]
+            params["cursor"] = response.json()["next_cursor"]
+        return result
+
+    assert objects(False) == objects(True) == [f"ZTF{i}" for i in range(7)]
@@ -1,7 +1,7 @@
 from unittest import mock
 
-from db_handler import DocumentNotFound
-from pymongo.errors import ServerSelectionTimeoutError
+from db_handler import CircuitOpen, DocumentNotFound
+from pymongo.errors import AutoReconnect, ServerSelectionTimeoutError
 
 from reports.database.models import Report
 from .. import utils
@@ -40,3 +40,24 @@ def test_read_report_fails_if_database_is_down(mock_connection):
 
     response = utils.client.get(endpoint)
     assert response.status_code == 503
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_fails_if_connection_is_lost(mock_connection):
+    read_document = mock.AsyncMock()
+    read_document.side_effect = AutoReconnect()
+    mock_connection.return_value.read_document = read_document
+
+    response = utils.client.get(endpoint)
+    assert response.status_code == 503
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_read_report_fails_fast_if_circuit_is_open(mock_connection):
+    read_document = mock.AsyncMock()
+    read_document.side_effect = CircuitOpen(12.3)
+    mock_connection.return_value.read_document = read_document
+
+    response = utils.client.get(endpoint)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "12"
@@ -1,6 +1,19 @@
+import asyncio
 from unittest import mock
 
-from reports.database import get_settings, get_connection
+from db_handler import (
+    ApproximateCount,
+    CircuitBreaker,
+    ExactCount,
+    InMemoryConnection,
+    QueryCache,
+    QueryProfiler,
+    ReadCoalescer,
+    RetryPolicy,
+)
+
+from reports.database import get_settings, get_service_settings, get_connection, models
+from reports.settings import ServiceSettings
 
 from .. import utils
 
@@ -37,3 +50,235 @@ def test_mongo_connection_initialization():
     assert connection._config["port"] == 27017
     assert connection._config["username"] == "user"
     assert connection._config["password"] == "password"
+
+
+def test_service_settings_initializes_with_defaults():
+    settings = get_service_settings()
+    assert settings.approximate_count is False
+    assert settings.count_cache_ttl == 30
+
+
+def test_mongo_connection_uses_exact_count_by_default():
+    connection = get_connection()
+    assert type(connection._counter) is ExactCount
+
+
+@mock.patch('reports.database._getters.get_service_settings')
+def test_mongo_connection_uses_approximate_count_if_enabled(mock_settings):
+    mock_settings.return_value = ServiceSettings(approximate_count=True, count_cache_ttl=10)
+    connection = get_connection.__wrapped__()  # Avoids cache
+    assert isinstance(connection._counter, ApproximateCount)
+    assert connection._counter.ttl == 10
+
+
+def test_mongo_connection_initialization_includes_pool_settings():
+    connection = get_connection()
+    assert connection._config["maxPoolSize"] == 100
+    assert connection._config["minPoolSize"] == 0
+    assert "waitQueueTimeoutMs" not in connection._config
+
+
+def test_pool_state_is_exported_in_metrics():
+    monitor = get_connection().pool_monitor
+    monitor.connection_check_out_started(mock.MagicMock())
+    monitor.connection_checked_out(mock.MagicMock())
+    try:
+        response = utils.client.get("/metrics")
+    finally:
+        monitor.connection_checked_in(mock.MagicMock())
+
+    assert response.status_code == 200
+    assert "mongodb_pool_checked_out_connections 1.0" in response.text
+    assert "mongodb_pool_checkout_seconds_count 1.0" in response.text
+
+
+def test_mongo_connection_has_no_query_cache_by_default():
+    connection = get_connection()
+    assert connection._cache is None
+
+
+@mock.patch('reports.database._getters.get_service_settings')
+def test_mongo_connection_uses_query_cache_if_enabled(mock_settings):
+    mock_settings.return_value = ServiceSettings(query_cache_size=64, query_cache_ttl=5)
+    connection = get_connection.__wrapped__()  # Avoids cache
+    assert isinstance(connection._cache, QueryCache)
+    assert (connection._cache.maxsize, connection._cache.ttl) == (64, 5)
+
+
+@mock.patch('reports.main.get_service_settings')
+@mock.patch('reports.main.get_connection')
+def test_startup_watches_changes_if_enabled(mock_connection, mock_settings):
+    mock_settings.return_value.watch_changes = True
+    mock_connection.return_value.connect = mock.AsyncMock()
+    mock_connection.return_value.create_db = mock.AsyncMock()
+    mock_connection.return_value.close = mock.AsyncMock()
+    mock_connection.return_value.watch_changes = mock.AsyncMock()
+
+    with utils.client:
+        pass
+
+    mock_connection.return_value.watch_changes.assert_called_once_with(models.Report)
+
+
+def test_mongo_connection_has_no_profiler_by_default():
+    connection = get_connection()
+    assert connection._profiler is None
+
+
+@mock.patch('reports.database._getters.get_service_settings')
+def test_mongo_connection_uses_profiler_if_threshold_is_set(mock_settings):
+    mock_settings.return_value = ServiceSettings(slow_query_threshold=0.5, slow_query_explain_rate=0.1)
+    connection = get_connection.__wrapped__()  # Avoids cache
+    assert isinstance(connection._profiler, QueryProfiler)
+    assert (connection._profiler.threshold, connection._profiler.explain_rate) == (0.5, 0.1)
+
+
+def test_database_operations_are_exported_in_metrics():
+    get_connection().operation_monitor.record("read", "reports", "", 0.25, 1)
+    response = utils.client.get("/metrics")
+
+    assert response.status_code == 200
+    assert 'mongodb_operation_seconds_count{collection="reports",operation="read",query=""} 1.0' in response.text
+    assert 'mongodb_operation_documents_total{collection="reports",operation="read",query=""} 1.0' in response.text
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_responses_include_server_timing(mock_connection):
+    async def read_document(*args):
+        get_connection().operation_monitor.record("read", "reports", "", 0.25, 1)
+        return utils.report_factory()
+
+    mock_connection.return_value.read_document = read_document
+    response = utils.client.get(f"/{utils.random_oid()}")
+
+    assert response.status_code == 200
+    timings = response.headers["Server-Timing"].split(", ")
+    assert timings[0] == "db-read;dur=250.0"
+    assert timings[1].startswith("app;dur=")
+
+
+def test_mongo_connection_retries_and_uses_circuit_breaker_by_default():
+    connection = get_connection()
+    assert isinstance(connection._retry, RetryPolicy)
+    assert (connection._retry.attempts, connection._retry.deadline) == (3, 10)
+    assert isinstance(connection.breaker, CircuitBreaker)
+    assert (connection.breaker.failure_threshold, connection.breaker.reset_timeout) == (5, 30)
+
+
+def test_mongo_connection_selects_server_within_retry_deadline():
+    connection = get_connection.__wrapped__()  # Avoids cache
+    assert connection._config["serverSelectionTimeoutMs"] == 3333  # Each of the 3 attempts fails within 10 seconds
+
+
+@mock.patch('reports.database._getters.get_service_settings')
+def test_mongo_connection_uses_server_selection_timeout_without_retries(mock_settings):
+    mock_settings.return_value = ServiceSettings(retry_attempts=1)
+    connection = get_connection.__wrapped__()  # Avoids cache
+    assert connection._config["serverSelectionTimeoutMs"] == 30000
+
+
+def test_circuit_breaker_state_is_exported_in_metrics():
+    response = utils.client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "mongodb_circuit_breaker_state 0.0" in response.text
+
+
+def test_mongo_connection_coalesces_reads_by_default():
+    connection = get_connection()
+    assert isinstance(connection.coalescer, ReadCoalescer)
+
+
+def test_coalesced_reads_are_exported_in_metrics():
+    response = utils.client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "mongodb_coalescer_ratio" in response.text
+
+
+@mock.patch('reports.main.get_service_settings')
+@mock.patch('reports.main.get_connection')
+def test_startup_builds_indexes_in_background_if_enabled(mock_connection, mock_settings):
+    mock_settings.return_value.background_indexes = True
+    mock_settings.return_value.watch_changes = False
+    mock_connection.return_value.connect = mock.AsyncMock()
+    mock_connection.return_value.create_db = mock.AsyncMock()
+    mock_connection.return_value.close = mock.AsyncMock()
+
+    with utils.client:
+        pass
+
+    mock_connection.return_value.create_db.assert_called_once_with()
+
+
+def test_liveness_does_not_check_database():
+    response = utils.client.get("/health/live")
+    assert response.status_code == 200
+
+
+@mock.patch('reports.main.get_connection')
+def test_readiness_succeeds_if_database_answers(mock_connection):
+    mock_connection.return_value.ping = mock.AsyncMock(return_value=True)
+
+    response = utils.client.get("/health/ready")
+    assert response.status_code == 200
+
+
+@mock.patch('reports.main.get_connection')
+def test_readiness_fails_if_database_does_not_answer(mock_connection):
+    mock_connection.return_value.ping = mock.AsyncMock(return_value=False)
+
+    response = utils.client.get("/health/ready")
+    assert response.status_code == 503
+
+
+@mock.patch('reports.database._getters.get_service_settings')
+def test_in_memory_connection_is_used_if_selected(mock_settings):
+    mock_settings.return_value = ServiceSettings(database_backend="memory")
+    connection = get_connection.__wrapped__()  # Avoids cache
+    assert isinstance(connection, InMemoryConnection)
+    assert isinstance(connection.coalescer, ReadCoalescer)
+
+
+@mock.patch('reports.database._getters.get_service_settings')
+def test_daily_counts_are_not_kept_if_disabled(mock_settings):
+    mock_settings.return_value = ServiceSettings(database_backend="memory", daily_rollup=False)
+    connection = get_connection.__wrapped__()  # Avoids cache
+    report = {"object": "ZTF0", "solved": False, "observation": "SN", "source": "web", "owner": "u", "report_type": "X"}
+
+    async def write() -> list[int]:
+        await connection.connect()
+        await connection.create_documents(models.Report, [report])
+        return [await connection.db[rollup.__tablename__].count_documents({}) for rollup in models.Report.__rollups__]
+
+    assert asyncio.run(write()) == [0, 1]
+    assert not connection.rollup_ready(models.daily_counts)
+
+
+@mock.patch('reports.database._getters.get_service_settings')
+def test_object_summaries_are_not_kept_if_disabled(mock_settings):
+    mock_settings.return_value = ServiceSettings(database_backend="memory", object_summary=False)
+    connection = get_connection.__wrapped__()  # Avoids cache
+    report = {"object": "ZTF0", "solved": False, "observation": "SN", "source": "web", "owner": "u", "report_type": "X"}
+
+    async def write() -> list[int]:
+        await connection.connect()
+        await connection.create_documents(models.Report, [report])
+        return [await connection.db[rollup.__tablename__].count_documents({}) for rollup in models.Report.__rollups__]
+
+    assert asyncio.run(write()) == [1, 0]
+    assert not connection.rollup_ready(models.object_summaries)
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_routes_work_with_in_memory_connection(mock_connection):
+    mock_connection.return_value = InMemoryConnection()
+    asyncio.run(mock_connection.return_value.connect())
+    report = {k: v for k, v in utils.report_factory().items() if k not in ("_id", "date")}
+
+    assert utils.client.post("/", json=report).status_code == 201
+    response = utils.client.get("/", params={"object": "^obj"})
+
+    assert response.status_code == 200
+    assert response.json()["count"] == 1
+    assert response.json()["results"][0]["owner"] == report["owner"]
@@ -0,0 +1,48 @@
+import json
+from unittest import mock
+
+from db_handler import BulkStatus
+from pymongo.errors import ServerSelectionTimeoutError
+
+from reports.database import models
+from .. import utils
+
+endpoint = "/bulk"
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_patch_bulk_reports_applies_same_update_to_all(mock_connection):
+    oid = utils.random_oid()
+    update_documents = mock.AsyncMock()
+    mock_connection.return_value.update_documents = update_documents
+    update_documents.return_value = [
+        {"index": 0, "status": BulkStatus.updated, "id": oid, "detail": None},
+        {"index": 1, "status": BulkStatus.not_found, "id": "missing", "detail": None},
+    ]
+
+    body = {"ids": [str(oid), "missing"], "update": {"solved": True}}
+    response = utils.client.patch(endpoint, content=json.dumps(body))
+    assert response.status_code == 200
+
+    updates = [(str(oid), {"solved": True}), ("missing", {"solved": True})]
+    update_documents.assert_awaited_once_with(models.Report, updates)
+    assert response.json() == [
+        {"index": 0, "status": "updated", "id": str(oid), "detail": None},
+        {"index": 1, "status": "not_found", "id": "missing", "detail": None},
+    ]
+
+
+def test_patch_bulk_reports_fails_if_update_is_missing():
+    response = utils.client.patch(endpoint, content=json.dumps({"ids": ["id"]}))
+    assert response.status_code == 422
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_patch_bulk_reports_fails_if_database_is_down(mock_connection):
+    update_documents = mock.AsyncMock()
+    update_documents.side_effect = ServerSelectionTimeoutError()
+    mock_connection.return_value.update_documents = update_documents
+
+    body = {"ids": ["id"], "update": {"solved": True}}
+    response = utils.client.patch(endpoint, content=json.dumps(body))
+    assert response.status_code == 503
@@ -0,0 +1,79 @@
+import json
+from unittest import mock
+
+from db_handler import BulkStatus
+from pymongo.errors import ServerSelectionTimeoutError
+
+from reports.database import models
+from .. import utils
+
+reports = [utils.report_factory(), utils.report_factory(object="other")]
+endpoint = "/bulk"
+
+
+def mock_create_documents(mock_connection):
+    create_documents = mock.AsyncMock()
+    mock_connection.return_value.create_documents = create_documents
+    create_documents.return_value = [
+        {"index": 0, "status": BulkStatus.inserted, "id": utils.random_oid(), "detail": None},
+        {"index": 1, "status": BulkStatus.duplicate, "id": None, "detail": "duplicate"},
+    ]
+    return create_documents
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_post_bulk_reports_from_json_array_ignores_fields_not_defined_in_schema(mock_connection):
+    create_documents = mock_create_documents(mock_connection)
+
+    response = utils.client.post(endpoint, content=json.dumps(utils.create_jsons(reports)))
+    assert response.status_code == 200
+
+    expected = [{k: v for k, v in report.items() if k not in {"_id", "date"}} for report in reports]
+    create_documents.assert_awaited_once_with(models.Report, expected, ordered=False)
+
+    json_response = response.json()
+    assert json_response[0]["status"] == "inserted"
+    assert json_response[0]["id"] == str(create_documents.return_value[0]["id"])
+    assert json_response[1] == {"index": 1, "status": "duplicate", "id": None, "detail": "duplicate"}
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_post_bulk_reports_from_ndjson(mock_connection):
+    create_documents = mock_create_documents(mock_connection)
+
+    content = "\n".join(json.dumps(report) for report in utils.create_jsons(reports))
+    response = utils.client.post(endpoint, content=content, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+
+    expected = [{k: v for k, v in report.items() if k not in {"_id", "date"}} for report in reports]
+    create_documents.assert_awaited_once_with(models.Report, expected, ordered=False)
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_post_bulk_reports_passes_along_ordered_and_invalid_entries(mock_connection):
+    create_documents = mock_create_documents(mock_connection)
+
+    response = utils.client.post(endpoint, params={"ordered": True}, content=json.dumps(["invalid", {}]))
+    assert response.status_code == 200
+
+    create_documents.assert_awaited_once_with(models.Report, ["invalid", {}], ordered=True)
+
+
+def test_post_bulk_reports_fails_if_body_is_not_a_list():
+    response = utils.client.post(endpoint, content=json.dumps(utils.json_converter(reports[0])))
+    assert response.status_code == 400
+
+
+def test_post_bulk_reports_fails_if_body_is_malformed():
+    response = utils.client.post(endpoint, content="[{")
+    assert response.status_code == 400
+
+
+@mock.patch('reports.routes.database.get_connection')
+def test_post_bulk_reports_fails_if_database_is_down(mock_connection):
+    create_documents = mock.AsyncMock()
+    create_documents.side_effect = ServerSelectionTimeoutError()
+    mock_connection.return_value.create_documents = create_documents
+
+    response = utils.client.post(endpoint, content=json.dumps(utils.create_jsons(reports)))
+    assert response.status_code == 503